@@ -0,0 +1,202 @@
+"""
+Ingest pipeline throughput benchmark.
+
+Drives DocumentProcessor -> split_documents_into_pages ->
+KnowledgeGraphBuilder.build_graph_from_documents over a synthetic corpus,
+using the offline stand-ins from ``core.offline`` instead of OpenAI and
+Neo4j, and reports docs/s, chunks/s, per-stage wall time and peak RSS.
+The build stage is broken down into embedding, LLM extraction and graph
+write time read from the ``core.metrics`` spans.
+
+    python -m benchmarks.ingest_benchmark --docs 20 --pages 10 --llm-latency 0.05
+
+With ``--baseline`` the run fails (exit code 1) if docs/s dropped by more
+than ``--max-regression`` compared with a previous ``--output`` file.
+"""
+import argparse
+import asyncio
+import io
+import json
+import random
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+from llama_index.core.graph_stores.types import ChunkNode, EntityNode
+from starlette.datastructures import UploadFile
+
+from config.settings import ComponentsConfig
+from core.document_processor import DocumentProcessor
+from core.embeddings import BatchedEmbedding, EmbeddingManager
+from core.knowledge_graph import KnowledgeGraphBuilder
+from core.metrics import stage_seconds
+from core.offline import FakeLLM, HashEmbedding, create_offline_graph_store
+
+# Spans recorded inside the build stage
+BUILD_STAGES = ("embed", "llm_extract", "graph_write")
+
+_SYLLABLES = ["ka", "lo", "mi", "nu", "ra", "te", "vo", "zen", "dor", "pix", "qua", "sil"]
+
+
+def make_vocabulary(size: int, rng: random.Random) -> List[str]:
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(_SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def make_corpus(docs: int, pages: int, words_per_page: int, vocabulary_size: int, seed: int) -> List[Dict[str, str]]:
+    """Generate markdown files whose pages are separated the way LlamaParse separates them."""
+    rng = random.Random(seed)
+    vocabulary = make_vocabulary(vocabulary_size, rng)
+    corpus = []
+    for doc_number in range(docs):
+        page_texts = []
+        for _ in range(pages):
+            sentences = []
+            remaining = words_per_page
+            while remaining > 0:
+                length = min(remaining, rng.randint(6, 18))
+                sentences.append(" ".join(rng.choice(vocabulary) for _ in range(length)).capitalize() + ".")
+                remaining -= length
+            page_texts.append(" ".join(sentences))
+        corpus.append({"filename": f"doc-{doc_number:05d}.md", "text": "\n---\n".join(page_texts)})
+    return corpus
+
+
+def peak_rss_bytes() -> int:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and kilobytes elsewhere
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+async def load_corpus(processor: DocumentProcessor, corpus: List[Dict[str, str]]):
+    uploads = [
+        UploadFile(file=io.BytesIO(item["text"].encode("utf-8")), filename=item["filename"])
+        for item in corpus
+    ]
+    loaded = await processor.load_documents_from_files(uploads, use_llama_parse=False)
+    return [document for documents in loaded for document in documents]
+
+
+def run_once(corpus: List[Dict[str, str]], config: ComponentsConfig, args: argparse.Namespace) -> Dict[str, Any]:
+    llm = FakeLLM(latency=args.llm_latency, max_triplets=config.max_paths_per_chunk)
+    embed_model = EmbeddingManager(config).with_cache(
+        BatchedEmbedding(
+            HashEmbedding(dimensions=args.dimensions, latency=args.embed_latency),
+            max_batch_tokens=config.embed_batch_max_tokens,
+            min_batch_tokens=config.embed_batch_min_tokens,
+            max_concurrency=config.embed_max_concurrency,
+            max_retries=config.embed_max_retries,
+        )
+    )
+    graph_store = create_offline_graph_store()
+    processor = DocumentProcessor(config)
+    builder = KnowledgeGraphBuilder(config, graph_store=graph_store, llm=llm, embed_model=embed_model)
+
+    stages: Dict[str, float] = {}
+    start = time.perf_counter()
+    documents = asyncio.run(load_corpus(processor, corpus))
+    stages["load"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    pages = processor.split_documents_into_pages(documents)
+    stages["split"] = time.perf_counter() - start
+
+    spans_before = stage_seconds()
+    start = time.perf_counter()
+    builder.build_graph_from_documents(pages, show_progress=False)
+    stages["build"] = time.perf_counter() - start
+    spans_after = stage_seconds()
+    # Span time, not wall time: concurrent spans of a stage add up
+    build_stages = {
+        name: round(spans_after.get(name, 0.0) - spans_before.get(name, 0.0), 4) for name in BUILD_STAGES
+    }
+
+    nodes = list(graph_store.graph.nodes.values())
+    chunks = sum(isinstance(node, ChunkNode) for node in nodes)
+    total = sum(stages.values())
+    return {
+        "docs": len(corpus),
+        "pages": len(pages),
+        "chunks": chunks,
+        "entities": sum(isinstance(node, EntityNode) for node in nodes),
+        "relations": len(graph_store.graph.relations),
+        "stages_seconds": {name: round(seconds, 4) for name, seconds in stages.items()},
+        "build_stages_seconds": build_stages,
+        "total_seconds": round(total, 4),
+        "docs_per_second": round(len(corpus) / total, 3) if total else None,
+        "chunks_per_second": round(chunks / stages["build"], 3) if stages["build"] else None,
+    }
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--docs", type=int, default=10, help="Number of synthetic documents")
+    parser.add_argument("--pages", type=int, default=5, help="Pages per document")
+    parser.add_argument("--words-per-page", type=int, default=400)
+    parser.add_argument("--vocabulary", type=int, default=2000, help="Distinct words in the corpus")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Seconds per fake LLM call")
+    parser.add_argument("--embed-latency", type=float, default=0.0, help="Seconds per fake embedding request")
+    parser.add_argument("--dimensions", type=int, default=256, help="Fake embedding dimensionality")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent LLM extraction workers")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs over the same corpus; later runs hit the caches")
+    parser.add_argument("--cache", action="store_true", help="Enable the embedding and triplet caches")
+    parser.add_argument("--output", type=Path, help="Write the results as JSON")
+    parser.add_argument("--baseline", type=Path, help="Previous --output to compare docs/s against")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="Allowed fractional drop in docs/s")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    corpus = make_corpus(args.docs, args.pages, args.words_per_page, args.vocabulary, args.seed)
+
+    with tempfile.TemporaryDirectory() as storage_dir:
+        config = ComponentsConfig(
+            _env_file=None,
+            storage_dir=Path(storage_dir),
+            cache_enabled=args.cache,
+            show_progress=False,
+            num_workers=args.workers,
+        )
+        runs = []
+        for run_number in range(args.repeat):
+            result = run_once(corpus, config, args)
+            runs.append(result)
+            print(
+                f"Run {run_number + 1}: {result['docs_per_second']} docs/s, "
+                f"{result['chunks_per_second']} chunks/s, stages {result['stages_seconds']}, "
+                f"build stages {result['build_stages_seconds']}"
+            )
+
+    report = {
+        "parameters": {key: str(value) if isinstance(value, Path) else value for key, value in vars(args).items()},
+        "runs": runs,
+        "docs_per_second": runs[0]["docs_per_second"],
+        "chunks_per_second": runs[0]["chunks_per_second"],
+        "peak_rss_bytes": peak_rss_bytes(),
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text())
+        floor = baseline["docs_per_second"] * (1 - args.max_regression)
+        if report["docs_per_second"] < floor:
+            print(
+                f"Regression: {report['docs_per_second']} docs/s is below "
+                f"{floor:.3f} ({baseline['docs_per_second']} baseline)"
+            )
+            return 1
+        print(f"OK: {report['docs_per_second']} docs/s vs {baseline['docs_per_second']} baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
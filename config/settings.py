@@ -23,11 +23,30 @@ class ComponentsConfig(BaseSettings):
     embedding_model: str = Field(default="text-embedding-3-small", env="EMBEDDING_MODEL")
     llm_temperature: float = Field(default=0.3, env="LLM_TEMPERATURE")
 
+    # Embedding Execution Settings
+    embed_batch_max_tokens: int = Field(default=100_000, env="EMBED_BATCH_MAX_TOKENS")
+    embed_batch_min_tokens: int = Field(default=2_000, env="EMBED_BATCH_MIN_TOKENS")
+    embed_max_concurrency: int = Field(default=4, env="EMBED_MAX_CONCURRENCY")
+    embed_max_retries: int = Field(default=8, env="EMBED_MAX_RETRIES")
+
+    # Provider Rate Limits (0 disables a limit)
+    llm_requests_per_minute: float = Field(default=0, env="LLM_REQUESTS_PER_MINUTE")
+    llm_tokens_per_minute: float = Field(default=0, env="LLM_TOKENS_PER_MINUTE")
+    llm_expected_output_tokens: int = Field(default=512, env="LLM_EXPECTED_OUTPUT_TOKENS")
+    embed_requests_per_minute: float = Field(default=0, env="EMBED_REQUESTS_PER_MINUTE")
+    embed_tokens_per_minute: float = Field(default=0, env="EMBED_TOKENS_PER_MINUTE")
+    rate_limit_burst_seconds: float = Field(default=1.0, env="RATE_LIMIT_BURST_SECONDS")
+    rate_limit_shared: bool = Field(default=False, env="RATE_LIMIT_SHARED")
+
     # Neo4j Database Settings
     neo4j_url: str = Field(default="bolt://localhost:7687", validation_alias=AliasChoices("NEO4J_URL", "neo4j_url"))
     neo4j_username: str = Field(default="neo4j", validation_alias=AliasChoices("NEO4J_USERNAME", "neo4j_db_user", "neo4j_username"))
     neo4j_password: str = Field(default="llamaindex", validation_alias=AliasChoices("NEO4J_PASSWORD", "neo4j_db_password", "neo4j_password"))
     neo4j_database: str = Field(default="neo4j", validation_alias=AliasChoices("NEO4J_DATABASE", "neo4j_database"))
+    neo4j_write_batch_size: int = Field(default=2000, env="NEO4J_WRITE_BATCH_SIZE")
+    neo4j_write_parallelism: int = Field(default=2, env="NEO4J_WRITE_PARALLELISM")
+    neo4j_write_max_retries: int = Field(default=3, env="NEO4J_WRITE_MAX_RETRIES")
+    neo4j_read_parallelism: int = Field(default=32, env="NEO4J_READ_PARALLELISM")
 
     # Knowledge Graph Settings
     kg_extractors: List[str] = Field(
@@ -41,19 +60,66 @@ class ComponentsConfig(BaseSettings):
     similarity_top_k: int = Field(default=2, env="SIMILARITY_TOP_K")
     path_depth: int = Field(default=1, env="PATH_DEPTH")
     include_text: bool = Field(default=True, env="INCLUDE_TEXT")
+    local_vector_index: bool = Field(default=False, env="LOCAL_VECTOR_INDEX")
+    vector_index_dtype: str = Field(default="float32", env="VECTOR_INDEX_DTYPE")
+    vector_index_rebuild_every: int = Field(default=100, env="VECTOR_INDEX_REBUILD_EVERY")
+    adjacency_snapshot: bool = Field(default=False, env="ADJACENCY_SNAPSHOT")
+    adjacency_max_fanout: int = Field(default=50, env="ADJACENCY_MAX_FANOUT")
+    adjacency_hot_entities: int = Field(default=1000, env="ADJACENCY_HOT_ENTITIES")
+    adjacency_rebuild_interval: float = Field(default=300.0, env="ADJACENCY_REBUILD_INTERVAL")
+    retrieval_strategy: str = Field(default="vector", env="RETRIEVAL_STRATEGY")
+    keyword_index: bool = Field(default=False, env="KEYWORD_INDEX")
+    keyword_top_k: int = Field(default=10, env="KEYWORD_TOP_K")
+    hybrid_top_n: int = Field(default=10, env="HYBRID_TOP_N")
+    rrf_k: int = Field(default=60, env="RRF_K")
+    query_cache_enabled: bool = Field(default=True, env="QUERY_CACHE_ENABLED")
+    query_cache_max_entries: int = Field(default=1000, env="QUERY_CACHE_MAX_ENTRIES")
+    query_cache_ttl_seconds: float = Field(default=300.0, env="QUERY_CACHE_TTL_SECONDS")
+    query_cache_semantic_threshold: float = Field(default=0.0, env="QUERY_CACHE_SEMANTIC_THRESHOLD")
+    graph_generation_check_interval: float = Field(default=1.0, env="GRAPH_GENERATION_CHECK_INTERVAL")
+    query_max_concurrency: int = Field(default=256, env="QUERY_MAX_CONCURRENCY")
+    query_timeout_seconds: float = Field(default=15.0, env="QUERY_TIMEOUT_SECONDS")
 
     # Document Processing Settings
     chunk_size: int = Field(default=1024, env="CHUNK_SIZE")
     chunk_overlap: int = Field(default=20, env="CHUNK_OVERLAP")
+    near_duplicate_detection: bool = Field(default=True, env="NEAR_DUPLICATE_DETECTION")
+    near_duplicate_threshold: float = Field(default=0.9, env="NEAR_DUPLICATE_THRESHOLD")
+    near_duplicate_num_perm: int = Field(default=128, env="NEAR_DUPLICATE_NUM_PERM")
+    near_duplicate_min_words: int = Field(default=20, env="NEAR_DUPLICATE_MIN_WORDS")
+
+    # Ingestion Job Settings
+    ingest_max_queue_depth: int = Field(default=1000, env="INGEST_MAX_QUEUE_DEPTH")
+    ingest_max_token_backlog: int = Field(default=50_000_000, env="INGEST_MAX_TOKEN_BACKLOG")
+    ingest_defer_queue_depth: int = Field(default=200, env="INGEST_DEFER_QUEUE_DEPTH")
+    ingest_defer_token_backlog: int = Field(default=10_000_000, env="INGEST_DEFER_TOKEN_BACKLOG")
+    ingest_interactive_tokens: int = Field(default=20_000, env="INGEST_INTERACTIVE_TOKENS")
+    ingest_bulk_tokens: int = Field(default=500_000, env="INGEST_BULK_TOKENS")
+    ingest_priority_aging_seconds: float = Field(default=600.0, env="INGEST_PRIORITY_AGING_SECONDS")
+    ingest_job_lease_seconds: float = Field(default=300.0, env="INGEST_JOB_LEASE_SECONDS")
+    ingest_max_attempts: int = Field(default=2, env="INGEST_MAX_ATTEMPTS")
+    ingest_retry_after_seconds: int = Field(default=60, env="INGEST_RETRY_AFTER_SECONDS")
+    ingest_metrics_port: int = Field(default=9100, env="INGEST_METRICS_PORT")
+    ingest_worker_processes: int = Field(default=0, env="INGEST_WORKER_PROCESSES")
+    ingest_drain_timeout_seconds: float = Field(default=600.0, env="INGEST_DRAIN_TIMEOUT_SECONDS")
 
     # LlamaParse Settings
     result_type: str = Field(default="text", env="LLAMAPARSE_RESULT_TYPE")
     verbose: bool = Field(default=True, env="VERBOSE")
+    llama_parse_max_concurrency: int = Field(default=4, env="LLAMA_PARSE_MAX_CONCURRENCY")
+    pdf_parser_workers: Optional[int] = Field(default=None, env="PDF_PARSER_WORKERS")
     show_progress: bool = Field(default=True, env="SHOW_PROGRESS")
 
     # Storage Settings
     storage_dir: Path = Field(default=Path("./storage"), env="STORAGE_DIR")
+    # full: rewrite the LlamaIndex JSON snapshot, sharded: one file per document, none: Neo4j only
+    local_persist_mode: str = Field(default="sharded", env="LOCAL_PERSIST_MODE")
+    persist_compact_shards: int = Field(default=256, env="PERSIST_COMPACT_SHARDS")
     cache_enabled: bool = Field(default=True, env="CACHE_ENABLED")
+    embedding_cache_memory_entries: int = Field(default=10000, env="EMBEDDING_CACHE_MEMORY_ENTRIES")
+    embedding_cache_max_bytes: int = Field(default=512 * 1024 * 1024, env="EMBEDDING_CACHE_MAX_BYTES")
+    llm_cache_memory_entries: int = Field(default=5000, env="LLM_CACHE_MEMORY_ENTRIES")
+    llm_cache_max_bytes: int = Field(default=256 * 1024 * 1024, env="LLM_CACHE_MAX_BYTES")
 
     # Agent Settings
     agent_memory_enabled: bool = Field(default=True, env="AGENT_MEMORY_ENABLED")
@@ -66,6 +132,10 @@ class ComponentsConfig(BaseSettings):
             "username": self.neo4j_username,
             "password": self.neo4j_password,
             "database": self.neo4j_database,
+            "write_batch_size": self.neo4j_write_batch_size,
+            "write_parallelism": self.neo4j_write_parallelism,
+            "write_max_retries": self.neo4j_write_max_retries,
+            "read_parallelism": self.neo4j_read_parallelism,
         }
 
 _config: Optional[ComponentsConfig] = None
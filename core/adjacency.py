@@ -0,0 +1,542 @@
+"""
+Compact, memory-mapped adjacency snapshot of the entity graph.
+
+Build or refresh a snapshot from the configured Neo4j database with::
+
+    python -m core.adjacency
+"""
+
+import argparse
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from llama_index.core.graph_stores import SimplePropertyGraphStore
+from llama_index.core.graph_stores.types import (
+    EntityNode,
+    PropertyGraphStore,
+    Relation,
+    Triplet,
+    TRIPLET_SOURCE_KEY,
+)
+from llama_index.graph_stores.neo4j import Neo4jPGStore
+from llama_index.graph_stores.neo4j.neo4j_property_graph import BASE_ENTITY_LABEL, BASE_NODE_LABEL
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+# (source id, source label, source triplet_source_id, relation type, target id, target label, target triplet_source_id)
+EdgeRow = Tuple[str, Optional[str], Optional[str], str, str, Optional[str], Optional[str]]
+
+# Entity-to-entity relationships, streamed in one pass; MENTIONS links chunks and is never expanded
+NEO4J_EDGES_QUERY = f"""
+MATCH (s:`{BASE_ENTITY_LABEL}`)-[r]->(t:`{BASE_ENTITY_LABEL}`)
+WHERE type(r) <> 'MENTIONS'
+RETURN s.id AS source_id,
+    [l in labels(s) WHERE NOT l IN ['{BASE_ENTITY_LABEL}', '{BASE_NODE_LABEL}'] | l][0] AS source_label,
+    s.{TRIPLET_SOURCE_KEY} AS source_source_id,
+    type(r) AS type,
+    t.id AS target_id,
+    [l in labels(t) WHERE NOT l IN ['{BASE_ENTITY_LABEL}', '{BASE_NODE_LABEL}'] | l][0] AS target_label,
+    t.{TRIPLET_SOURCE_KEY} AS target_source_id
+"""
+
+# Superseded versions younger than this are kept for readers that just resolved CURRENT
+VERSION_GRACE_SECONDS = 60.0
+# Times a reader re-resolves CURRENT when a writer removed the version it was loading
+LOAD_ATTEMPTS = 3
+
+# Encoded edge: (source node, relation type, target node)
+_Edge = Tuple[int, int, int]
+
+
+class _Version(NamedTuple):
+    """One loaded snapshot version; swapped as a whole so readers never mix versions."""
+
+    name: str
+    indptr: np.ndarray
+    neighbors: np.ndarray
+    rel_types: np.ndarray
+    outgoing: np.ndarray
+    ids: List[str]
+    index: Dict[str, int]
+    labels: List[Optional[str]]
+    sources: List[Optional[str]]
+    type_names: List[str]
+    hot: Set[int]
+    hot_cache: Dict[Tuple[int, int, int, frozenset], List[_Edge]]
+
+
+class AdjacencySnapshot:
+    """
+    CSR adjacency snapshot of the entity graph for in-process path expansion.
+
+    Entities are numbered 0..n-1 and every relationship is stored in both
+    endpoints' rows, so ``indptr[i]:indptr[i + 1]`` slices ``neighbors``,
+    ``rel_types`` and ``outgoing`` for all edges touching entity ``i`` —
+    expansion is undirected, like ``Neo4jPGStore.get_rel_map``. The arrays
+    are memory-mapped read-only; ids, labels and relation type names live in
+    a small JSON table. Only the ``triplet_source_id`` property is kept,
+    which is what retrievers need to attach source text.
+
+    Storage mirrors ``LocalVectorIndex``: each build writes a new version
+    directory and atomically swaps the ``CURRENT`` pointer, and readers in
+    other processes pick it up on their next expansion.
+
+    Each hop takes at most ``max_fanout`` edges per node, which bounds the
+    cost of expanding through hub entities. Neighborhoods of the
+    ``hot_entities`` highest-degree entities are memoized per version;
+    ``warm`` computes them up front and has every later version precomputed
+    in the background as soon as it is loaded.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        max_fanout: int = 50,
+        hot_entities: int = 1000,
+        reload_interval: float = 1.0,
+    ):
+        self.directory = Path(directory)
+        self.max_fanout = max_fanout
+        self.hot_entities = hot_entities
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._current: Optional[_Version] = None
+        self._checked_at = 0.0
+        self._warm_params: Set[Tuple[int, int, Tuple[str, ...]]] = set()
+
+    @property
+    def size(self) -> int:
+        current = self._load()
+        return len(current.ids) if current is not None else 0
+
+    @property
+    def version(self) -> Optional[str]:
+        current = self._load()
+        return current.name if current is not None else None
+
+    def exists(self) -> bool:
+        return (self.directory / "CURRENT").exists()
+
+    def __contains__(self, node_id: str) -> bool:
+        current = self._load()
+        return current is not None and node_id in current.index
+
+    def expand(
+        self,
+        ids: Sequence[str],
+        depth: int = 2,
+        limit: int = 30,
+        ignore_rels: Optional[List[str]] = None,
+    ) -> Dict[str, List[Triplet]]:
+        """
+        Expand entities up to ``depth`` hops.
+
+        Args:
+            ids: Entity ids to start from; ids not in the snapshot are skipped
+            depth: Maximum number of hops
+            limit: Maximum number of triplets per start entity
+            ignore_rels: Relation types never followed
+
+        Returns:
+            Per start id found in the snapshot, up to ``limit`` distinct
+            triplets, nearest hops first
+        """
+        current = self._load()
+        if current is None:
+            return {}
+        ignored = _type_ids(current, ignore_rels)
+        rel_maps: Dict[str, List[Triplet]] = {}
+        for node_id in ids:
+            start = current.index.get(node_id)
+            if start is not None:
+                edges = self._expand_node(current, start, depth, limit, ignored)
+                rel_maps[node_id] = [_triplet(current, edge) for edge in edges]
+        return rel_maps
+
+    def warm(self, depth: int, limit: int = 30, ignore_rels: Optional[List[str]] = None) -> int:
+        """
+        Precompute neighborhoods of the hottest entities for one set of expansion parameters.
+
+        Returns:
+            Number of neighborhoods computed
+        """
+        with self._lock:
+            self._warm_params.add((depth, limit, tuple(ignore_rels or ())))
+        current = self._load()
+        if current is None:
+            return 0
+        return self._warm(current, depth, limit, ignore_rels)
+
+    def _warm(self, current: _Version, depth: int, limit: int, ignore_rels: Optional[Sequence[str]]) -> int:
+        ignored = _type_ids(current, ignore_rels)
+        for node in current.hot:
+            self._expand_node(current, node, depth, limit, ignored)
+        return len(current.hot)
+
+    def build(self, rows: Iterable[EdgeRow]) -> int:
+        """
+        Write a new snapshot version from relationship rows.
+
+        Returns:
+            Number of relationships written
+        """
+        ids: List[str] = []
+        index: Dict[str, int] = {}
+        labels: List[Optional[str]] = []
+        sources: List[Optional[str]] = []
+        type_names: List[str] = []
+        type_index: Dict[str, int] = {}
+        edge_sources: List[int] = []
+        edge_targets: List[int] = []
+        edge_types: List[int] = []
+        seen: Set[_Edge] = set()
+
+        def node(node_id: str, label: Optional[str], source_id: Optional[str]) -> int:
+            position = index.get(node_id)
+            if position is None:
+                position = index[node_id] = len(ids)
+                ids.append(node_id)
+                labels.append(label)
+                sources.append(source_id)
+            return position
+
+        for source_id, source_label, source_source, rel_type, target_id, target_label, target_source in rows:
+            source = node(source_id, source_label, source_source)
+            target = node(target_id, target_label, target_source)
+            if rel_type not in type_index:
+                type_index[rel_type] = len(type_names)
+                type_names.append(rel_type)
+            edge = (source, type_index[rel_type], target)
+            if edge in seen:
+                continue
+            seen.add(edge)
+            edge_sources.append(source)
+            edge_types.append(edge[1])
+            edge_targets.append(target)
+
+        sources_arr = np.asarray(edge_sources, dtype=np.int32)
+        targets_arr = np.asarray(edge_targets, dtype=np.int32)
+        types_arr = np.asarray(edge_types, dtype=np.int32)
+        # Each relationship appears once in its source's row (outgoing) and once in its target's row
+        rows_arr = np.concatenate([sources_arr, targets_arr])
+        order = np.argsort(rows_arr, kind="stable")
+        neighbors = np.concatenate([targets_arr, sources_arr])[order]
+        rel_types = np.concatenate([types_arr, types_arr])[order]
+        outgoing = np.concatenate([np.ones(len(sources_arr), bool), np.zeros(len(targets_arr), bool)])[order]
+        indptr = np.zeros(len(ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows_arr, minlength=len(ids)), out=indptr[1:])
+
+        with self._write_lock():
+            self.directory.mkdir(parents=True, exist_ok=True)
+            version = f"v{time.time_ns()}-{uuid.uuid4().hex[:8]}"
+            version_dir = self.directory / version
+            version_dir.mkdir()
+            np.save(version_dir / "indptr.npy", indptr)
+            np.save(version_dir / "neighbors.npy", neighbors)
+            np.save(version_dir / "rel_types.npy", rel_types)
+            np.save(version_dir / "outgoing.npy", outgoing)
+            with open(version_dir / "nodes.json", "w") as f:
+                json.dump({"ids": ids, "labels": labels, "sources": sources, "rel_types": type_names}, f)
+
+            try:
+                previous = (self.directory / "CURRENT").read_text().strip()
+            except FileNotFoundError:
+                previous = None
+            pointer = self.directory / f"CURRENT.{version}"
+            pointer.write_text(version)
+            os.replace(pointer, self.directory / "CURRENT")
+            self._remove_old_versions(keep={version, previous})
+        self._load(force=True)
+        print(f"Adjacency snapshot version {version}: {len(ids)} entities, {len(edge_sources)} relationships")
+        return len(edge_sources)
+
+    def _expand_node(self, current: _Version, start: int, depth: int, limit: int, ignored: frozenset) -> List[_Edge]:
+        hot = start in current.hot
+        cache_key = (start, depth, limit, ignored)
+        if hot:
+            cached = current.hot_cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        indptr, neighbors, rel_types, outgoing = current.indptr, current.neighbors, current.rel_types, current.outgoing
+        edges: List[_Edge] = []
+        seen: Set[_Edge] = set()
+        visited = {start}
+        frontier = [start]
+        # Breadth-first: the edges on paths of length <= depth are exactly the edges
+        # touching nodes fewer than depth hops away
+        for _ in range(depth):
+            next_frontier = []
+            for node in frontier:
+                lo, hi = int(indptr[node]), int(indptr[node + 1])
+                taken = 0
+                for other, rel_type, is_outgoing in zip(
+                    neighbors[lo:hi].tolist(), rel_types[lo:hi].tolist(), outgoing[lo:hi].tolist()
+                ):
+                    if taken >= self.max_fanout or len(edges) >= limit:
+                        break
+                    if rel_type in ignored:
+                        continue
+                    edge = (node, rel_type, other) if is_outgoing else (other, rel_type, node)
+                    if edge in seen:
+                        continue
+                    seen.add(edge)
+                    edges.append(edge)
+                    taken += 1
+                    if other not in visited:
+                        visited.add(other)
+                        next_frontier.append(other)
+                if len(edges) >= limit:
+                    break
+            if len(edges) >= limit or not next_frontier:
+                break
+            frontier = next_frontier
+
+        if hot:
+            current.hot_cache[cache_key] = edges
+        return edges
+
+    def _load(self, force: bool = False) -> Optional[_Version]:
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.reload_interval:
+            return self._current
+        self._checked_at = now
+        for attempt in range(LOAD_ATTEMPTS):
+            try:
+                version = (self.directory / "CURRENT").read_text().strip()
+            except FileNotFoundError:
+                return self._current
+            if self._current is not None and version == self._current.name:
+                return self._current
+            version_dir = self.directory / version
+            try:
+                with open(version_dir / "nodes.json") as f:
+                    nodes = json.load(f)
+                indptr = np.load(version_dir / "indptr.npy", mmap_mode="r")
+                neighbors = np.load(version_dir / "neighbors.npy", mmap_mode="r")
+                rel_types = np.load(version_dir / "rel_types.npy", mmap_mode="r")
+                outgoing = np.load(version_dir / "outgoing.npy", mmap_mode="r")
+                break
+            except FileNotFoundError:
+                # Removed by a writer since CURRENT was read; the pointer has moved on
+                if attempt == LOAD_ATTEMPTS - 1:
+                    raise
+
+        degrees = np.diff(indptr)
+        hot_count = min(self.hot_entities, len(degrees))
+        hot = set(np.argpartition(-degrees, hot_count - 1)[:hot_count].tolist()) if hot_count > 0 else set()
+
+        current = _Version(
+            name=version,
+            indptr=indptr,
+            neighbors=neighbors,
+            rel_types=rel_types,
+            outgoing=outgoing,
+            ids=nodes["ids"],
+            index={node_id: position for position, node_id in enumerate(nodes["ids"])},
+            labels=nodes["labels"],
+            sources=nodes["sources"],
+            type_names=nodes["rel_types"],
+            hot=hot,
+            hot_cache={},
+        )
+        with self._lock:
+            self._current = current
+            warm_params = list(self._warm_params)
+        if warm_params:
+            threading.Thread(
+                target=lambda: [self._warm(current, *params) for params in warm_params],
+                name="adjacency-warm",
+                daemon=True,
+            ).start()
+        return current
+
+    def _remove_old_versions(self, keep: Set[Optional[str]]) -> None:
+        # Readers still holding an older mapping keep it alive until they reload; recent
+        # versions stay for readers in other processes that have just resolved CURRENT
+        cutoff = time.time() - VERSION_GRACE_SECONDS
+        for path in self.directory.glob("v*"):
+            if path.is_dir() and path.name not in keep and not _modified_after(path, cutoff):
+                shutil.rmtree(path, ignore_errors=True)
+
+    @contextmanager
+    def _write_lock(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with open(self.directory / "lock", "w") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _modified_after(path: Path, cutoff: float) -> bool:
+    try:
+        return path.stat().st_mtime > cutoff
+    except FileNotFoundError:
+        return False
+
+
+def _type_ids(current: _Version, names: Optional[Sequence[str]]) -> frozenset:
+    return frozenset(current.type_names.index(name) for name in (names or []) if name in current.type_names)
+
+
+def _triplet(current: _Version, edge: _Edge) -> Triplet:
+    source, rel_type, target = edge
+    source_node = _entity(current, source)
+    target_node = _entity(current, target)
+    relation = Relation(source_id=source_node.id, target_id=target_node.id, label=current.type_names[rel_type])
+    return [source_node, relation, target_node]
+
+
+def _entity(current: _Version, position: int) -> EntityNode:
+    source_id = current.sources[position]
+    return EntityNode(
+        name=current.ids[position],
+        label=current.labels[position] or "entity",
+        properties={TRIPLET_SOURCE_KEY: source_id} if source_id is not None else {},
+    )
+
+
+def iter_graph_edges(graph_store: PropertyGraphStore) -> Iterator[EdgeRow]:
+    """
+    Stream the entity-to-entity relationships of a graph.
+
+    For Neo4j the rows come from a single streamed query, so the client holds
+    one fetch batch at a time rather than the whole graph.
+    """
+    if isinstance(graph_store, Neo4jPGStore):
+        with graph_store.client.session(database=graph_store._database) as session:
+            for record in session.run(NEO4J_EDGES_QUERY):
+                yield (
+                    record["source_id"],
+                    record["source_label"],
+                    record["source_source_id"],
+                    record["type"],
+                    record["target_id"],
+                    record["target_label"],
+                    record["target_source_id"],
+                )
+        return
+
+    if isinstance(graph_store, SimplePropertyGraphStore):
+        for source, relation, target in graph_store.graph.get_triplets():
+            if isinstance(source, EntityNode) and isinstance(target, EntityNode):
+                yield (
+                    source.id,
+                    source.label,
+                    source.properties.get(TRIPLET_SOURCE_KEY),
+                    relation.label,
+                    target.id,
+                    target.label,
+                    target.properties.get(TRIPLET_SOURCE_KEY),
+                )
+        return
+
+    raise ValueError(f"Cannot export an adjacency snapshot from {type(graph_store).__name__}")
+
+
+def build_adjacency_snapshot(graph_store: PropertyGraphStore, snapshot: AdjacencySnapshot) -> int:
+    """Rebuild ``snapshot`` from the current contents of ``graph_store``."""
+    start = time.perf_counter()
+    written = snapshot.build(iter_graph_edges(graph_store))
+    print(f"Built adjacency snapshot in {time.perf_counter() - start:.2f}s")
+    return written
+
+
+class AdjacencyRefresher:
+    """
+    Rebuilds an ``AdjacencySnapshot`` on a background thread after graph writes.
+
+    Writes only mark the snapshot stale. A rebuild starts once no write has
+    arrived for ``settle_seconds`` (so a whole ingest lands in one version)
+    and at most once every ``min_interval`` seconds. Entities created since
+    the last build are expanded against the graph store by the retriever
+    until the next version is published.
+    """
+
+    def __init__(
+        self,
+        snapshot: AdjacencySnapshot,
+        graph_store: PropertyGraphStore,
+        min_interval: float = 300.0,
+        settle_seconds: float = 5.0,
+    ):
+        self.snapshot = snapshot
+        self.graph_store = graph_store
+        self.min_interval = min_interval
+        self.settle_seconds = settle_seconds
+        self._stale = threading.Event()
+        self._stopped = threading.Event()
+        self._last_write = 0.0
+        self._last_build = 0.0
+        self._thread = threading.Thread(target=self._run, name="adjacency-snapshot", daemon=True)
+        self._thread.start()
+        if not snapshot.exists():
+            self._stale.set()
+
+    def mark_stale(self) -> None:
+        self._last_write = time.monotonic()
+        self._stale.set()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        self._stopped.set()
+        self._stale.set()
+        self._thread.join(timeout=timeout)
+
+    def _run(self) -> None:
+        while True:
+            self._stale.wait()
+            if self._stopped.is_set():
+                return
+            due = max(self._last_build + self.min_interval, self._last_write + self.settle_seconds)
+            if not self.snapshot.exists():
+                due = self._last_write + self.settle_seconds
+            delay = due - time.monotonic()
+            if delay > 0:
+                self._stopped.wait(delay)
+                if self._stopped.is_set():
+                    return
+                continue
+            self._stale.clear()
+            self._last_build = time.monotonic()
+            try:
+                build_adjacency_snapshot(self.graph_store, self.snapshot)
+            except Exception as e:
+                print(f"Adjacency snapshot rebuild failed: {e}")
+
+
+def main(argv=None) -> None:
+    from config.settings import get_config
+    from core.registry import get_registry
+
+    parser = argparse.ArgumentParser(description="Export an adjacency snapshot of the knowledge graph.")
+    parser.add_argument("--output", type=Path, default=None, help="Snapshot directory (default: <storage_dir>/adjacency)")
+    args = parser.parse_args(argv)
+
+    config = get_config()
+    registry = get_registry(config)
+    snapshot = AdjacencySnapshot(args.output) if args.output else registry.adjacency
+    if snapshot is None:
+        snapshot = AdjacencySnapshot(Path(config.storage_dir) / "adjacency")
+    try:
+        build_adjacency_snapshot(registry.graph_store, snapshot)
+    finally:
+        registry.close()
+
+
+if __name__ == "__main__":
+    main()
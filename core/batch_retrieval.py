@@ -0,0 +1,221 @@
+import asyncio
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from llama_index.core.async_utils import asyncio_run
+from llama_index.core.graph_stores.types import ChunkNode, KG_SOURCE_REL, PropertyGraphStore, Triplet
+from llama_index.core.indices.property_graph import VectorContextRetriever
+from llama_index.core.schema import NodeWithScore, QueryBundle
+from llama_index.core.vector_stores.types import VectorStoreQuery
+
+from core.adjacency import AdjacencySnapshot
+from core.graph_store import BulkNeo4jPGStore
+
+
+class BatchVectorContextRetriever(VectorContextRetriever):
+    """
+    ``VectorContextRetriever`` that can answer many queries at once.
+
+    A batch embeds every query in one embedding request, runs the vector
+    searches in one Neo4j round trip (``BulkNeo4jPGStore.batch_vector_query``),
+    expands each distinct entity once no matter how many queries hit it, and
+    fetches source text for the whole batch in one call. Stores without the
+    batch methods fall back to concurrent per-query calls.
+
+    With an ``AdjacencySnapshot``, graph expansion runs in-process for every
+    entity in the snapshot; only entities added since it was built are
+    expanded by the graph store.
+    """
+
+    def __init__(
+        self,
+        graph_store: PropertyGraphStore,
+        adjacency: Optional[AdjacencySnapshot] = None,
+        **kwargs: Any,
+    ):
+        super().__init__(graph_store, **kwargs)
+        self._adjacency = adjacency
+        if adjacency is not None:
+            # Precompute hub neighborhoods for this retriever's expansion parameters off the request path
+            threading.Thread(
+                target=adjacency.warm,
+                args=(self._path_depth, self._limit, [KG_SOURCE_REL]),
+                name="adjacency-warm",
+                daemon=True,
+            ).start()
+
+    def retrieve_from_graph(self, query_bundle: QueryBundle, limit: Optional[int] = None) -> List[NodeWithScore]:
+        query = self._get_vector_store_query(query_bundle)
+        matches = self._vector_search(query.query_embedding)
+        triplets = self._expand([node_id for node_id, _ in matches], limit or self._limit)
+        return self._score_triplets(triplets, dict(matches))
+
+    async def aretrieve_from_graph(self, query_bundle: QueryBundle, limit: Optional[int] = None) -> List[NodeWithScore]:
+        query = await self._aget_vector_store_query(query_bundle)
+        matches = await self._avector_search(query.query_embedding)
+        triplets = await self._aexpand_merged([node_id for node_id, _ in matches], limit or self._limit)
+        return self._score_triplets(triplets, dict(matches))
+
+    def batch_retrieve(self, query_bundles: Sequence[QueryBundle]) -> List[List[NodeWithScore]]:
+        return asyncio_run(self.abatch_retrieve(query_bundles))
+
+    async def abatch_retrieve(self, query_bundles: Sequence[QueryBundle]) -> List[List[NodeWithScore]]:
+        """
+        Retrieve nodes for several queries.
+
+        Returns:
+            One result list per query bundle, in order
+        """
+        if not query_bundles:
+            return []
+        await self.aembed_queries(query_bundles)
+        matches = await self._abatch_vector_search([bundle.embedding for bundle in query_bundles])
+
+        unique_ids = list(dict.fromkeys(node_id for query_matches in matches for node_id, _ in query_matches))
+        rel_maps = await self._aexpand(unique_ids)
+
+        results = []
+        for query_matches in matches:
+            triplets = _merge_rel_maps([node_id for node_id, _ in query_matches], rel_maps, self._limit)
+            results.append(self._score_triplets(triplets, dict(query_matches)))
+
+        if self.include_text and any(results):
+            ref_doc_ids = {
+                node.node.ref_doc_id for nodes in results for node in nodes if node.node.ref_doc_id is not None
+            }
+            og_nodes = await self._graph_store.aget_llama_nodes(list(ref_doc_ids))
+            og_node_map = {node.node_id: node for node in og_nodes}
+            results = [self._add_source_text(nodes, og_node_map) if nodes else nodes for nodes in results]
+        # Same post-processing as ``aretrieve``, which drops triplets that mapped to the same source chunk
+        return [
+            await self._ahandle_recursive_retrieval(bundle, nodes)
+            for bundle, nodes in zip(query_bundles, results)
+        ]
+
+    async def aembed_queries(self, query_bundles: Sequence[QueryBundle]) -> None:
+        """Embed every bundle that has no embedding yet in a single request."""
+        missing = [bundle for bundle in query_bundles if bundle.embedding is None]
+        if not missing:
+            return
+        # Queries and documents share one embedding space for the OpenAI models used here
+        embeddings = await self._embed_model.aget_text_embedding_batch([bundle.query_str for bundle in missing])
+        for bundle, embedding in zip(missing, embeddings):
+            bundle.embedding = embedding
+
+    async def _abatch_vector_search(self, embeddings: List[List[float]]) -> List[List[Tuple[str, float]]]:
+        if isinstance(self._graph_store, BulkNeo4jPGStore) and not self._filters:
+            return await self._graph_store.abatch_vector_query(embeddings, self._similarity_top_k)
+        return list(await asyncio.gather(*(self._avector_search(embedding) for embedding in embeddings)))
+
+    def _vector_store_query(self, embedding: List[float]) -> VectorStoreQuery:
+        return VectorStoreQuery(
+            query_embedding=embedding,
+            similarity_top_k=self._similarity_top_k,
+            filters=self._filters,
+            **self._retriever_kwargs,
+        )
+
+    def _vector_search(self, embedding: List[float]) -> List[Tuple[str, float]]:
+        query = self._vector_store_query(embedding)
+        if self._graph_store.supports_vector_queries:
+            kg_nodes, scores = self._graph_store.vector_query(query)
+            return [(node.id, score) for node, score in zip(kg_nodes, scores)]
+        if self._vector_store is not None:
+            result = self._vector_store.query(query)
+            if result.nodes is not None and result.similarities is not None:
+                return list(zip(self._get_kg_ids(result.nodes), result.similarities))
+            if result.ids is not None and result.similarities is not None:
+                return list(zip(result.ids, result.similarities))
+        return []
+
+    async def _avector_search(self, embedding: List[float]) -> List[Tuple[str, float]]:
+        query = self._vector_store_query(embedding)
+        if self._graph_store.supports_vector_queries:
+            kg_nodes, scores = await self._graph_store.avector_query(query)
+            return [(node.id, score) for node, score in zip(kg_nodes, scores)]
+        if self._vector_store is not None:
+            result = await self._vector_store.aquery(query)
+            if result.nodes is not None and result.similarities is not None:
+                return list(zip(self._get_kg_ids(result.nodes), result.similarities))
+            if result.ids is not None and result.similarities is not None:
+                return list(zip(result.ids, result.similarities))
+        return []
+
+    def _expand_snapshot(self, ids: List[str], limit: int) -> Tuple[Dict[str, List[Triplet]], List[str]]:
+        """Expand what the adjacency snapshot knows; returns the rel maps and the ids left for the store."""
+        if self._adjacency is None or not ids:
+            return {}, ids
+        rel_maps = self._adjacency.expand(ids, depth=self._path_depth, limit=limit, ignore_rels=[KG_SOURCE_REL])
+        return rel_maps, [node_id for node_id in ids if node_id not in rel_maps]
+
+    def _expand(self, ids: List[str], limit: int) -> List[Triplet]:
+        """Triplets around the matched entities, up to ``limit`` in total."""
+        rel_maps, remaining = self._expand_snapshot(ids, limit)
+        if remaining:
+            # One store call for the rest, limited overall as get_rel_map is
+            rel_maps[remaining[0]] = self._graph_store.get_rel_map(
+                stub_nodes(remaining), depth=self._path_depth, limit=limit, ignore_rels=[KG_SOURCE_REL]
+            )
+        return _merge_rel_maps(ids, rel_maps, limit)
+
+    async def _aexpand_merged(self, ids: List[str], limit: int) -> List[Triplet]:
+        rel_maps, remaining = self._expand_snapshot(ids, limit)
+        if remaining:
+            rel_maps[remaining[0]] = await self._graph_store.aget_rel_map(
+                stub_nodes(remaining), depth=self._path_depth, limit=limit, ignore_rels=[KG_SOURCE_REL]
+            )
+        return _merge_rel_maps(ids, rel_maps, limit)
+
+    async def _aexpand(self, ids: List[str]) -> Dict[str, List[Triplet]]:
+        """Expand each entity separately so that queries sharing an entity share its triplets."""
+        rel_maps, remaining = self._expand_snapshot(ids, self._limit)
+        if not remaining:
+            return rel_maps
+        if isinstance(self._graph_store, BulkNeo4jPGStore):
+            rel_maps.update(
+                await self._graph_store.aget_rel_maps(
+                    remaining, depth=self._path_depth, limit=self._limit, ignore_rels=[KG_SOURCE_REL]
+                )
+            )
+            return rel_maps
+        store_maps = await asyncio.gather(
+            *(
+                self._graph_store.aget_rel_map(
+                    stub_nodes([node_id]), depth=self._path_depth, limit=self._limit, ignore_rels=[KG_SOURCE_REL]
+                )
+                for node_id in remaining
+            )
+        )
+        rel_maps.update(zip(remaining, store_maps))
+        return rel_maps
+
+    def _score_triplets(self, triplets: List[Triplet], scores: Dict[str, float]) -> List[NodeWithScore]:
+        """Score triplets by their best-matching endpoint and order them, as ``VectorContextRetriever`` does."""
+        scored = [
+            (triplet, max(scores.get(triplet[0].id, 0.0), scores.get(triplet[2].id, 0.0)))
+            for triplet in triplets
+        ]
+        if self._similarity_score:
+            scored = [(triplet, score) for triplet, score in scored if score >= self._similarity_score]
+        scored.sort(key=lambda item: item[1], reverse=True)
+        return self._get_nodes_with_score([triplet for triplet, _ in scored], [score for _, score in scored])
+
+
+def _merge_rel_maps(ids: Sequence[str], rel_maps: Dict[str, List[Triplet]], limit: int) -> List[Triplet]:
+    """Concatenate per-entity triplets in match order, dropping duplicates, up to ``limit``."""
+    triplets: List[Triplet] = []
+    seen = set()
+    for node_id in ids:
+        for triplet in rel_maps.get(node_id, []):
+            key = (triplet[0].id, triplet[1].id, triplet[2].id)
+            if key not in seen:
+                seen.add(key)
+                triplets.append(triplet)
+                if len(triplets) >= limit:
+                    return triplets
+    return triplets
+
+
+def stub_nodes(ids: Sequence[str]) -> List[ChunkNode]:
+    """Placeholder nodes for ``get_rel_map``, which only reads node ids."""
+    return [ChunkNode(text="", id_=node_id) for node_id in ids]
@@ -0,0 +1,257 @@
+import hashlib
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Union
+
+
+def normalize_text(text: str) -> str:
+    """Normalize text so that trivially different inputs share a cache key."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def content_hash(*parts: Any) -> str:
+    """Return a stable sha256 hex digest over the given key parts."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\x1f")
+    return digest.hexdigest()
+
+
+class LRUCache:
+    """Thread-safe in-memory LRU cache bounded by entry count."""
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key: str, value: Any) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SQLiteCache:
+    """
+    Disk-backed key/value cache stored in a single SQLite table.
+
+    Values are raw bytes. The table is bounded by total payload size and
+    evicts least recently accessed rows once ``max_bytes`` is exceeded.
+    """
+
+    def __init__(self, db_path: Union[str, Path], table: str = "cache", max_bytes: int = 512 * 1024 * 1024):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.table = table
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.table} ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, "
+            "nbytes INTEGER NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute(
+            f"CREATE INDEX IF NOT EXISTS {self.table}_accessed ON {self.table}(accessed)"
+        )
+        self._conn.commit()
+        row = self._conn.execute(f"SELECT COALESCE(SUM(nbytes), 0) FROM {self.table}").fetchone()
+        self._total_bytes = int(row[0])
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, bytes]:
+        keys = list(keys)
+        found: Dict[str, bytes] = {}
+        if not keys:
+            return found
+
+        with self._lock:
+            # SQLite caps bound parameters, so look keys up in slices.
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, value FROM {self.table} WHERE key IN ({placeholders})",
+                    batch,
+                ).fetchall()
+                found.update(rows)
+
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    f"UPDATE {self.table} SET accessed = ? WHERE key = ?",
+                    [(now, key) for key in found],
+                )
+                self._conn.commit()
+        return found
+
+    def put_many(self, items: Dict[str, bytes]) -> None:
+        if not items:
+            return
+
+        with self._lock:
+            now = time.time()
+            existing = self._sizes(list(items))
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, nbytes, accessed) VALUES (?, ?, ?, ?)",
+                [(key, value, len(value), now) for key, value in items.items()],
+            )
+            self._total_bytes += sum(len(value) for value in items.values())
+            self._total_bytes -= sum(existing.values())
+            self._evict()
+            self._conn.commit()
+
+    def delete_many(self, keys: Iterable[str]) -> None:
+        keys = list(keys)
+        if not keys:
+            return
+
+        with self._lock:
+            existing = self._sizes(keys)
+            self._conn.executemany(
+                f"DELETE FROM {self.table} WHERE key = ?", [(key,) for key in existing]
+            )
+            self._total_bytes -= sum(existing.values())
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _sizes(self, keys: List[str]) -> Dict[str, int]:
+        sizes: Dict[str, int] = {}
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            sizes.update(self._conn.execute(
+                f"SELECT key, nbytes FROM {self.table} WHERE key IN ({placeholders})",
+                batch,
+            ).fetchall())
+        return sizes
+
+    def _evict(self) -> None:
+        """Drop least recently accessed rows until the table is back under 90% of max_bytes."""
+        if self.max_bytes <= 0 or self._total_bytes <= self.max_bytes:
+            return
+
+        target = int(self.max_bytes * 0.9)
+        cursor = self._conn.execute(
+            f"SELECT key, nbytes FROM {self.table} ORDER BY accessed ASC"
+        )
+        victims = []
+        freed = 0
+        for key, nbytes in cursor:
+            if self._total_bytes - freed <= target:
+                break
+            victims.append((key,))
+            freed += nbytes
+        self._conn.executemany(f"DELETE FROM {self.table} WHERE key = ?", victims)
+        self._total_bytes -= freed
+
+
+class TieredCache:
+    """
+    Two-tier cache: an in-memory LRU in front of a size-bounded SQLite store.
+
+    Values are kept decoded in memory and encoded to bytes on disk using
+    the supplied ``encode``/``decode`` callables.
+    """
+
+    def __init__(
+        self,
+        disk: Optional[SQLiteCache],
+        encode: Callable[[Any], bytes],
+        decode: Callable[[bytes], Any],
+        max_memory_entries: int = 10000,
+    ):
+        self.memory = LRUCache(max_memory_entries)
+        self.disk = disk
+        self._encode = encode
+        self._decode = decode
+        self._stats_lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        found: Dict[str, Any] = {}
+        pending: List[str] = []
+        for key in keys:
+            value = self.memory.get(key)
+            if value is None:
+                pending.append(key)
+            else:
+                found[key] = value
+        memory_hits = len(found)
+
+        disk_hits = 0
+        if pending and self.disk is not None:
+            for key, raw in self.disk.get_many(pending).items():
+                value = self._decode(raw)
+                self.memory.put(key, value)
+                found[key] = value
+                disk_hits += 1
+
+        with self._stats_lock:
+            self.memory_hits += memory_hits
+            self.disk_hits += disk_hits
+            self.misses += len(pending) - disk_hits
+        return found
+
+    def get(self, key: str) -> Optional[Any]:
+        return self.get_many([key]).get(key)
+
+    def put_many(self, items: Dict[str, Any]) -> None:
+        for key, value in items.items():
+            self.memory.put(key, value)
+        if self.disk is not None:
+            self.disk.put_many({key: self._encode(value) for key, value in items.items()})
+
+    def put(self, key: str, value: Any) -> None:
+        self.put_many({key: value})
+
+    def stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters and tier sizes."""
+        hits = self.memory_hits + self.disk_hits
+        lookups = hits + self.misses
+        return {
+            "hits": hits,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": hits / lookups if lookups > 0 else 0.0,
+            "memory_entries": len(self.memory),
+            "disk_bytes": self.disk.total_bytes if self.disk is not None else 0,
+        }
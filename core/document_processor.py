@@ -1,14 +1,56 @@
 from llama_index.core.node_parser import SentenceSplitter
 from config.settings import get_config, ComponentsConfig
 from llama_parse import LlamaParse
+from core.metrics import span
+from core.pdf_parser import extract_pdf_pages, get_parse_slots, local_pdf_parsing_available
 from typing import Optional
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable, Iterator
 from llama_index.core import Document
+from llama_index.core.schema import BaseNode
 from pathlib import Path
-from copy import deepcopy
+import asyncio
+import hashlib
 import tempfile
 import os
 
+
+PAGE_SEPARATOR = "\n---\n"
+
+
+def iter_page_texts(text: str, separator: str = PAGE_SEPARATOR) -> Iterator[str]:
+    """
+    Yield the non-empty, stripped pages of a text.
+
+    Scans separator offsets with ``str.find`` rather than splitting the
+    whole text up front, so one page slice is alive at a time.
+    """
+    start = 0
+    while True:
+        end = text.find(separator, start)
+        page = text[start:] if end == -1 else text[start:end]
+        page = page.strip()
+        if page:
+            yield page
+        if end == -1:
+            return
+        start = end + len(separator)
+
+
+def page_id(filename: str, page_number: int) -> str:
+    """
+    Initial document id for a page of a file.
+
+    ``IncrementalUpdater.plan`` keeps the stored id of a page whose content
+    moved, so ids only follow the ordinal for pages seen for the first time.
+    """
+    return f"{filename}::page-{page_number}"
+
+
+def page_fingerprint(text: str) -> str:
+    """Content fingerprint used to detect changed pages on re-ingest."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
 class DocumentProcessor:
     def __init__(self, config: Optional[ComponentsConfig] = None):
         self.config = config or get_config()
@@ -49,7 +91,15 @@ class DocumentProcessor:
         Returns:
             List of Document objects
         """
+        with span("parse") as parse_span:
+            documents = await self._load_documents_from_file(file_object, use_llama_parse)
+            size = getattr(file_object, "size", None)
+            if size is not None:
+                parse_span.add("bytes", size)
+            parse_span.add("documents", len(documents))
+        return documents
 
+    async def _load_documents_from_file(self, file_object, use_llama_parse: bool) -> List[Document]:
         filename = getattr(file_object, 'filename', 'unknown')
         file_extension = Path(filename).suffix.lower()
 
@@ -63,7 +113,9 @@ class DocumentProcessor:
                 tmp_file_path = tmp_file.name
 
             try:
-                result = self._load_with_llama_parse(Path(tmp_file_path))
+                result = await self._load_with_llama_parse(Path(tmp_file_path))
+                for document in result:
+                    document.metadata.setdefault("filename", filename)
                 return result
             finally:
                 os.unlink(tmp_file_path)
@@ -74,24 +126,72 @@ class DocumentProcessor:
                 content = content.decode('utf-8', errors='ignore')
             return self._load_with_simple_loader_from_content(content, filename)
 
+    async def load_documents_from_files(
+        self,
+        file_objects: Iterable[Any],
+        use_llama_parse: bool = True
+    ) -> List[List[Document]]:
+        """
+        Load several uploaded files concurrently.
+
+        Remote parses share the process-wide LlamaParse limit and local PDF
+        extraction shares one process pool, so parsing of many files
+        overlaps instead of running one file after another.
+
+        Returns:
+            One list of documents per file object, in order
+        """
+        return list(await asyncio.gather(
+            *(self.load_documents_from_file(file_object, use_llama_parse) for file_object in file_objects)
+        ))
+
     def _load_with_simple_loader_from_content(self, content: str, filename: str) -> List[Document]:
         """Load documents from content string."""
         from llama_index.core import Document
         return [Document(text=content, metadata={"filename": filename})]
 
-    def _load_with_llama_parse(self, file_path: Path) -> List[Document]:
-        """Load documents using LlamaParse."""
+    async def _load_with_llama_parse(self, file_path: Path) -> List[Document]:
+        """Load documents using LlamaParse, falling back to local extraction."""
         try:
-            documents = self.llama_parse.load_data(str(file_path))
-            return documents
+            parser = self.llama_parse
+            async with get_parse_slots(self.config.llama_parse_max_concurrency):
+                documents = await parser.aload_data(str(file_path))
+            # LlamaParse logs job errors and returns nothing rather than raising
+            if documents:
+                return documents
+            print(f"LlamaParse returned no content for {file_path}")
         except Exception as e:
             print(f"LlamaParse failed for {file_path}: {str(e)}")
+        return await self._load_with_local_parser(file_path)
+
+    async def _load_with_local_parser(self, file_path: Path) -> List[Document]:
+        """Extract PDF text locally, pages split across the shared process pool."""
+        if file_path.suffix.lower() != '.pdf' or not local_pdf_parsing_available():
+            return self._load_with_simple_loader(file_path)
+        try:
+            pages = await extract_pdf_pages(file_path, self.config.pdf_parser_workers)
+        except Exception as e:
+            print(f"Local PDF extraction failed for {file_path}: {str(e)}")
             return self._load_with_simple_loader(file_path)
 
+        # Same page separator as LlamaParse text output, so page splitting is unchanged
+        document = Document(
+            text=PAGE_SEPARATOR.join(pages),
+            metadata={
+                "file_path": str(file_path),
+                "file_name": file_path.name,
+                "file_type": file_path.suffix,
+                "file_size": file_path.stat().st_size,
+                "parser": "pypdf",
+            }
+        )
+        print(f"Extracted {len(pages)} pages from {file_path.name} locally")
+        return [document]
+
     def _load_with_simple_loader(self, file_path: Path) -> List[Document]:
         """Load documents using simple text loader."""
         try:
-            # Handle PDF files differently when LlamaParse is not available
+            # Handle PDF files differently when neither LlamaParse nor pypdf is available
             if file_path.suffix.lower() == '.pdf':
                 print(f"Warning: PDF file {file_path.name} requires LlamaParse or a PDF library for proper text extraction.")
                 print("Returning empty document with metadata only.")
@@ -138,36 +238,81 @@ class DocumentProcessor:
             print(f"Simple loader failed for {file_path}: {str(e)}")
             raise
 
+    def iter_pages(self, documents: Iterable[Document]) -> Iterator[Document]:
+        """
+        Lazily split documents into pages based on LlamaParse page separators.
+
+        Each page gets a stable id (``<filename>::page-<n>``) and a
+        ``page_hash`` fingerprint of its text so re-ingests can tell
+        which pages changed. Pages are numbered consecutively across
+        all documents of the same file. Page metadata is a shallow copy
+        of the parent's, so nested metadata values are shared between
+        pages and must be treated as read-only.
+
+        Args:
+            documents: Documents to split
+
+        Yields:
+            One document per non-empty page
+        """
+        page_counters: Dict[str, int] = {}
+
+        for doc in documents:
+            filename = doc.metadata.get("filename")
+            total_pages = doc.text.count(PAGE_SEPARATOR) + 1
+
+            for text in iter_page_texts(doc.text):
+                page_number = page_counters.get(filename, 0) + 1
+                page_counters[filename] = page_number
+                page = Document(
+                    text=text,
+                    metadata={
+                        **doc.metadata,
+                        "page_number": page_number,
+                        "total_pages": total_pages,
+                        "is_sub_document": True,
+                        "page_hash": page_fingerprint(text),
+                    },
+                    excluded_embed_metadata_keys=["page_hash"],
+                    excluded_llm_metadata_keys=["page_hash"],
+                )
+                if filename:
+                    page.id_ = page_id(filename, page_number)
+                yield page
+
     def split_documents_into_pages(self, documents: List[Document]) -> List[Document]:
-                """
-                Split documents into pages based on LlamaParse page separators.
-
-                Args:
-                    documents: List of documents to split
-
-                Returns:
-                    List of split documents
-                """
-                sub_docs = []
-
-                for doc in documents:
-                    doc_chunks = doc.text.split("\n---\n")
-
-                    for i, doc_chunk in enumerate(doc_chunks):
-                        if doc_chunk.strip():
-                            sub_doc = Document(
-                                text=doc_chunk.strip(),
-                                metadata={
-                                    **deepcopy(doc.metadata),
-                                    "page_number": i + 1,
-                                    "total_pages": len(doc_chunks),
-                                    "is_sub_document": True,
-                                }
-                            )
-                            sub_docs.append(sub_doc)
-
-                print(f"Split {len(documents)} documents into {len(sub_docs)} pages")
-                return sub_docs
+        """
+        Split documents into pages based on LlamaParse page separators.
+
+        Eager form of ``iter_pages``.
+
+        Args:
+            documents: List of documents to split
+
+        Returns:
+            List of split documents
+        """
+        with span("split") as split_span:
+            sub_docs = list(self.iter_pages(documents))
+            split_span.add("pages", len(sub_docs))
+        print(f"Split {len(documents)} documents into {len(sub_docs)} pages")
+        return sub_docs
+
+    def iter_nodes(self, pages: Iterable[Document]) -> Iterator[BaseNode]:
+        """
+        Lazily chunk pages with the configured sentence splitter.
+
+        Pages are parsed one at a time, so only the current page's chunks
+        are held in memory.
+
+        Args:
+            pages: Pages, typically from ``iter_pages``
+
+        Yields:
+            Chunk nodes, each linked to its source page
+        """
+        for page in pages:
+            yield from self._node_parser.get_nodes_from_documents([page])
 
     def get_document_stats(self, documents: List[Document]) -> Dict[str, Any]:
         """
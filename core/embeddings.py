@@ -1,13 +1,25 @@
+import asyncio
 import os
+import random
+from array import array
 from typing import List, Optional, Dict, Any, Union
 from abc import ABC, abstractmethod
+from pathlib import Path
 
+import openai
+from pydantic import Field, PrivateAttr
+from llama_index.core.async_utils import asyncio_run
 from llama_index.core.embeddings import BaseEmbedding
 from llama_index.embeddings.openai import OpenAIEmbedding
 from llama_index.core import Settings
 from llama_index.core.schema import TextNode, Document
 
 from config.settings import get_config, ComponentsConfig
+from core.cache import SQLiteCache, TieredCache, content_hash, normalize_text
+from core.metrics import span
+from core.rate_limit import RateLimiter, get_rate_limiter
+
+_embedding_caches: Dict[str, TieredCache] = {}
 
 class EmbeddingProvider(ABC):
     """Abstract base class for embedding providers."""
@@ -41,6 +53,312 @@ class OpenAIEmbeddingProvider(EmbeddingProvider):
         """Get the model name."""
         return self.model_name
 
+def _encode_vector(vector: List[float]) -> bytes:
+    return array("f", vector).tobytes()
+
+
+def _decode_vector(raw: bytes) -> List[float]:
+    vector = array("f")
+    vector.frombytes(raw)
+    return vector.tolist()
+
+
+def get_embedding_cache(config: Optional[ComponentsConfig] = None) -> TieredCache:
+    """Get the process-wide embedding cache for the configured storage directory."""
+    config = config or get_config()
+    db_path = Path(config.storage_dir) / "cache" / "embeddings.sqlite3"
+    cache_key = str(db_path.resolve())
+    if cache_key not in _embedding_caches:
+        _embedding_caches[cache_key] = TieredCache(
+            SQLiteCache(db_path, table="embeddings", max_bytes=config.embedding_cache_max_bytes),
+            encode=_encode_vector,
+            decode=_decode_vector,
+            max_memory_entries=config.embedding_cache_memory_entries,
+        )
+    return _embedding_caches[cache_key]
+
+
+class CachedEmbedding(BaseEmbedding):
+    """
+    Content-addressed caching wrapper around another embedding model.
+
+    Embeddings are keyed by (model name, embedding kind, normalized text hash)
+    and looked up in a memory LRU and a SQLite store before the wrapped model
+    is called. Only cache misses are sent to the wrapped model, in one batch.
+    """
+
+    _embed_model: BaseEmbedding = PrivateAttr()
+    _cache: TieredCache = PrivateAttr()
+
+    def __init__(self, embed_model: BaseEmbedding, cache: TieredCache, **kwargs: Any):
+        super().__init__(
+            model_name=embed_model.model_name,
+            embed_batch_size=2048,
+            callback_manager=embed_model.callback_manager,
+            **kwargs,
+        )
+        self._embed_model = embed_model
+        self._cache = cache
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CachedEmbedding"
+
+    @property
+    def embed_model(self) -> BaseEmbedding:
+        """The wrapped embedding model."""
+        return self._embed_model
+
+    @property
+    def cache(self) -> TieredCache:
+        return self._cache
+
+    def _key(self, kind: str, text: str) -> str:
+        return content_hash(self.model_name, kind, normalize_text(text))
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        key = self._key("query", query)
+        embedding = self._cache.get(key)
+        if embedding is None:
+            embedding = self._embed_model.get_query_embedding(query)
+            self._cache.put(key, embedding)
+        return embedding
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        key = self._key("query", query)
+        embedding = self._cache.get(key)
+        if embedding is None:
+            embedding = await self._embed_model.aget_query_embedding(query)
+            self._cache.put(key, embedding)
+        return embedding
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._get_text_embeddings([text])[0]
+
+    async def _aget_text_embedding(self, text: str) -> List[float]:
+        return (await self._aget_text_embeddings([text]))[0]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        keys, found, missing = self._lookup(texts)
+        if missing:
+            embeddings = self._embed_model.get_text_embedding_batch(list(missing.values()))
+            self._store(found, missing, embeddings)
+        return [found[key] for key in keys]
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        keys, found, missing = self._lookup(texts)
+        if missing:
+            embeddings = await self._embed_model.aget_text_embedding_batch(list(missing.values()))
+            self._store(found, missing, embeddings)
+        return [found[key] for key in keys]
+
+    def _lookup(self, texts: List[str]):
+        """Split texts into cached embeddings and de-duplicated misses."""
+        keys = [self._key("text", text) for text in texts]
+        found = self._cache.get_many(keys)
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+        return keys, found, missing
+
+    def _store(self, found: Dict[str, List[float]], missing: Dict[str, str], embeddings: List[List[float]]) -> None:
+        computed = dict(zip(missing.keys(), embeddings))
+        self._cache.put_many(computed)
+        found.update(computed)
+
+
+class BatchedEmbedding(BaseEmbedding):
+    """
+    Adaptive, concurrent embedding executor around another embedding model.
+
+    Texts are packed into batches bounded by a token budget and sent with at
+    most ``max_concurrency`` requests in flight. The budget is halved when the
+    provider answers 429 (rate limited) or 413 (payload too large) and grows
+    back additively after successful requests. Dropped connections are retried
+    with the same backoff but leave the budget alone. With a ``rate_limiter``, every
+    request first reserves its tokens with it, and a 429 pauses all of the
+    limiter's callers rather than just the batch that hit it.
+    """
+
+    max_batch_tokens: int = Field(default=100_000, description="Upper bound on tokens per request.", gt=0)
+    min_batch_tokens: int = Field(default=2_000, description="Lower bound the budget shrinks to.", gt=0)
+    max_batch_size: int = Field(default=2048, description="Maximum number of inputs per request.", gt=0)
+    max_concurrency: int = Field(default=4, description="Maximum number of requests in flight.", gt=0)
+    max_retries: int = Field(default=8, description="Retries per batch before giving up.", ge=0)
+
+    _embed_model: BaseEmbedding = PrivateAttr()
+    _batch_tokens: int = PrivateAttr()
+    _encoding: Any = PrivateAttr(default=None)
+    _rate_limiter: Optional[RateLimiter] = PrivateAttr(default=None)
+
+    def __init__(self, embed_model: BaseEmbedding, rate_limiter: Optional[RateLimiter] = None, **kwargs: Any):
+        super().__init__(
+            model_name=embed_model.model_name,
+            embed_batch_size=2048,
+            callback_manager=embed_model.callback_manager,
+            **kwargs,
+        )
+        self._embed_model = embed_model
+        self._batch_tokens = self.max_batch_tokens
+        self._rate_limiter = rate_limiter
+        try:
+            import tiktoken
+
+            try:
+                self._encoding = tiktoken.encoding_for_model(self.model_name)
+            except KeyError:
+                self._encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            # tiktoken missing or unable to fetch its encodings; fall back to a length heuristic.
+            self._encoding = None
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "BatchedEmbedding"
+
+    @property
+    def embed_model(self) -> BaseEmbedding:
+        """The wrapped embedding model."""
+        return self._embed_model
+
+    @property
+    def batch_tokens(self) -> int:
+        """Current adaptive per-request token budget."""
+        return self._batch_tokens
+
+    def count_tokens(self, text: str) -> int:
+        if self._encoding is None:
+            return len(text) // 4 + 1
+        return len(self._encoding.encode(text, disallowed_special=()))
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return asyncio_run(self._aget_query_embedding(query))
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        # The inner model has SDK retries disabled, so queries back off here like batches do
+        attempt = 0
+        while True:
+            if self._rate_limiter is not None:
+                # Also where a backoff ``pause`` takes effect
+                await self._rate_limiter.acquire()
+            try:
+                return await self._embed_model.aget_query_embedding(query)
+            except Exception as e:
+                attempt += 1
+                if not _is_retryable(e) or attempt > self.max_retries:
+                    raise
+                await self._backoff(e, attempt)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._get_text_embeddings([text])[0]
+
+    async def _aget_text_embedding(self, text: str) -> List[float]:
+        return (await self._aget_text_embeddings([text]))[0]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return asyncio_run(self._aget_text_embeddings(texts))
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+
+        token_counts = [self.count_tokens(text) for text in texts]
+        with span("embed", texts=len(texts), tokens=sum(token_counts)):
+            return await self._aembed(texts, token_counts)
+
+    async def _aembed(self, texts: List[str], token_counts: List[int]) -> List[List[float]]:
+        results: List[Optional[List[float]]] = [None] * len(texts)
+        pending = list(range(len(texts)))
+        pending.reverse()
+        attempts: Dict[int, int] = {}
+
+        async def worker() -> None:
+            while pending:
+                batch = self._next_batch(pending, token_counts)
+                if self._rate_limiter is not None:
+                    await self._rate_limiter.acquire(sum(token_counts[i] for i in batch))
+                try:
+                    embeddings = await self._embed_model._aget_text_embeddings(
+                        [texts[i] for i in batch]
+                    )
+                except Exception as e:
+                    status = _status_code(e)
+                    attempt = attempts.get(batch[0], 0) + 1
+                    if not (status == 413 or _is_retryable(e)) or attempt > self.max_retries:
+                        raise
+                    if status == 413 and len(batch) == 1:
+                        raise
+                    for i in batch:
+                        attempts[i] = attempt
+                    if status in (413, 429):
+                        self._batch_tokens = max(self.min_batch_tokens, self._batch_tokens // 2)
+                    pending.extend(reversed(batch))
+                    if status != 413:
+                        await self._backoff(e, attempt)
+                    continue
+
+                for i, embedding in zip(batch, embeddings):
+                    results[i] = embedding
+                self._batch_tokens = min(
+                    self.max_batch_tokens,
+                    self._batch_tokens + max(self.min_batch_tokens, self.max_batch_tokens // 8),
+                )
+
+        tasks = [
+            asyncio.ensure_future(worker())
+            for _ in range(min(self.max_concurrency, len(texts)))
+        ]
+        try:
+            await asyncio.gather(*tasks)
+        except Exception:
+            for task in tasks:
+                task.cancel()
+            raise
+        return results
+
+    async def _backoff(self, error: Exception, attempt: int) -> None:
+        delay = _retry_delay(error, attempt)
+        if self._rate_limiter is not None:
+            # The retry waits for the limiter along with every other caller
+            self._rate_limiter.pause(delay)
+        else:
+            await asyncio.sleep(delay)
+
+    def _next_batch(self, pending: List[int], token_counts: List[int]) -> List[int]:
+        """Pop the next token-budgeted batch of indices off the pending stack."""
+        batch = [pending.pop()]
+        tokens = token_counts[batch[0]]
+        while pending and len(batch) < self.max_batch_size:
+            next_tokens = token_counts[pending[-1]]
+            if tokens + next_tokens > self._batch_tokens:
+                break
+            batch.append(pending.pop())
+            tokens += next_tokens
+        return batch
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status
+
+
+def _is_retryable(error: Exception) -> bool:
+    """Rate limited, or the request never got an answer (connection reset, timeout)."""
+    return _status_code(error) == 429 or isinstance(error, (openai.APIConnectionError, asyncio.TimeoutError))
+
+
+def _retry_delay(error: Exception, attempt: int) -> float:
+    """Honour Retry-After when the provider sends it, otherwise back off exponentially."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return min(30.0, 0.5 * 2 ** attempt) * (0.5 + random.random())
+
+
 class EmbeddingManager:
     """
     Manager for handling embeddings across different providers and models.
@@ -63,9 +381,29 @@ class EmbeddingManager:
     def embedding_model(self) -> BaseEmbedding:
         """Get or create embedding model instance."""
         if self._embedding_model is None:
-            self._embedding_model = self._create_embedding_model()
+            self._embedding_model = self.with_cache(self._create_embedding_model())
         return self._embedding_model
 
+    def with_cache(self, embed_model: BaseEmbedding) -> BaseEmbedding:
+        """
+        Wrap an embedding model with the shared embedding cache.
+
+        Args:
+            embed_model: Embedding model to wrap
+
+        Returns:
+            The cached model, or the model unchanged if caching is disabled
+        """
+        if not self.config.cache_enabled or isinstance(embed_model, CachedEmbedding):
+            return embed_model
+        return CachedEmbedding(embed_model, get_embedding_cache(self.config))
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Get hit/miss statistics for the embedding cache."""
+        if not self.config.cache_enabled:
+            return {}
+        return get_embedding_cache(self.config).stats()
+
     def _create_embedding_model(self) -> BaseEmbedding:
         """Create embedding model based on configuration."""
         if not self.config.openai_api_key:
@@ -79,7 +417,17 @@ class EmbeddingManager:
         )
 
         self._provider = provider
-        model = provider.get_embedding_model()
+        # Rate limits are handled by BatchedEmbedding, which needs to see 429s.
+        # Its sync paths run each call on a fresh event loop, so the inner model
+        # must not keep an async client (and its pooled connections) across calls.
+        model = BatchedEmbedding(
+            provider.get_embedding_model(max_retries=0, reuse_client=False),
+            max_batch_tokens=self.config.embed_batch_max_tokens,
+            min_batch_tokens=self.config.embed_batch_min_tokens,
+            max_concurrency=self.config.embed_max_concurrency,
+            max_retries=self.config.embed_max_retries,
+            rate_limiter=get_rate_limiter("embedding", self.config),
+        )
 
         print(f"Created embedding model: {provider.get_model_name()}")
         return model
@@ -0,0 +1,272 @@
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+from pydantic import PrivateAttr
+from llama_index.core.async_utils import asyncio_run, run_jobs
+from llama_index.core.graph_stores.types import (
+    EntityNode,
+    KG_NODES_KEY,
+    KG_RELATIONS_KEY,
+    Relation,
+)
+from llama_index.core.schema import BaseNode, MetadataMode, TransformComponent
+
+from config.settings import get_config, ComponentsConfig
+from core.cache import SQLiteCache, TieredCache, content_hash
+from core.metrics import Span, span
+from core.rate_limit import RateLimiter, estimate_tokens, get_rate_limiter
+
+_triplet_caches: Dict[str, TieredCache] = {}
+
+
+def get_triplet_cache(config: Optional[ComponentsConfig] = None) -> TieredCache:
+    """Get the process-wide triplet extraction cache for the configured storage directory."""
+    config = config or get_config()
+    db_path = Path(config.storage_dir) / "cache" / "triplets.sqlite3"
+    cache_key = str(db_path.resolve())
+    if cache_key not in _triplet_caches:
+        _triplet_caches[cache_key] = TieredCache(
+            SQLiteCache(db_path, table="triplets", max_bytes=config.llm_cache_max_bytes),
+            encode=lambda value: json.dumps(value).encode("utf-8"),
+            decode=lambda raw: json.loads(raw.decode("utf-8")),
+            max_memory_entries=config.llm_cache_memory_entries,
+        )
+    return _triplet_caches[cache_key]
+
+
+class CachedPathExtractor(TransformComponent):
+    """
+    Memoizing wrapper around an LLM path extractor.
+
+    Extracted entities and relations are cached per chunk, keyed by the hash
+    of the chunk text together with the LLM model, temperature, extraction
+    prompt and ``max_paths_per_chunk``. Only chunks missing from the cache
+    are sent to the wrapped extractor. Chunk metadata is not part of the key,
+    so repeated boilerplate on different pages is extracted once; cached
+    entities and relations pick up the metadata of the chunk they land on.
+    Extractions that yield nothing are not cached, since the wrapped
+    extractor also returns nothing when it cannot parse the LLM response.
+    LLM calls for the misses are paced by the process-wide LLM rate limiter
+    when one is configured.
+    """
+
+    extractor: TransformComponent
+
+    _cache: TieredCache = PrivateAttr()
+    _rate_limiter: Optional[RateLimiter] = PrivateAttr(default=None)
+    _expected_output_tokens: int = PrivateAttr(default=512)
+
+    def __init__(
+        self,
+        extractor: TransformComponent,
+        cache: TieredCache,
+        rate_limiter: Optional[RateLimiter] = None,
+        expected_output_tokens: int = 512,
+        **kwargs: Any,
+    ):
+        super().__init__(extractor=extractor, **kwargs)
+        self._cache = cache
+        self._rate_limiter = rate_limiter
+        self._expected_output_tokens = expected_output_tokens
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CachedPathExtractor"
+
+    @property
+    def cache(self) -> TieredCache:
+        return self._cache
+
+    def __call__(self, nodes: Sequence[BaseNode], show_progress: bool = False, **kwargs: Any) -> Sequence[BaseNode]:
+        return asyncio_run(self.acall(nodes, show_progress=show_progress, **kwargs))
+
+    async def acall(self, nodes: Sequence[BaseNode], show_progress: bool = False, **kwargs: Any) -> Sequence[BaseNode]:
+        with span("llm_extract", chunks=len(nodes)) as extract_span:
+            return await self._acall(nodes, extract_span, show_progress=show_progress)
+
+    async def _acall(
+        self, nodes: Sequence[BaseNode], extract_span: Span, show_progress: bool = False
+    ) -> Sequence[BaseNode]:
+        keys = [self._key(node) for node in nodes]
+        cached = self._cache.get_many(keys)
+
+        # Identical chunks within the batch are extracted once and shared
+        misses: Dict[str, BaseNode] = {}
+        duplicates = []
+        for node, key in zip(nodes, keys):
+            if key in cached:
+                self._apply(node, cached[key])
+            elif key in misses:
+                duplicates.append((node, key))
+            else:
+                misses[key] = node
+
+        if misses:
+            results = await run_jobs(
+                [self._aextract(node, key) for key, node in misses.items()],
+                workers=getattr(self.extractor, "num_workers", 4),
+                show_progress=show_progress,
+                desc="Extracting paths from text",
+            )
+            extracted = {key: paths for key, paths in results if paths is not None}
+            extract_span.add("extractions", len(misses))
+            extract_span.add("triplets", sum(len(paths["relations"]) for paths in extracted.values()))
+            # An empty result may be a response the extractor failed to parse; let it be retried
+            self._cache.put_many({key: paths for key, paths in extracted.items() if paths["nodes"] or paths["relations"]})
+            for node, key in duplicates:
+                if key in extracted:
+                    self._apply(node, extracted[key])
+                else:
+                    await self._acall_extractor(node)
+
+        print(
+            f"Triplet cache: {len(misses)} LLM extractions for {len(nodes)} chunks, "
+            f"lifetime hit rate {self._cache.stats()['hit_rate']:.1%}"
+        )
+        return nodes
+
+    def _key(self, node: BaseNode) -> str:
+        llm = getattr(self.extractor, "llm", None)
+        prompt = getattr(self.extractor, "extract_prompt", None)
+        return content_hash(
+            content_hash(node.get_content(metadata_mode=MetadataMode.NONE)),
+            llm.metadata.model_name if llm is not None else None,
+            getattr(llm, "temperature", None),
+            prompt.get_template() if prompt is not None else None,
+            getattr(self.extractor, "max_paths_per_chunk", None),
+        )
+
+    async def _aextract(self, node: BaseNode, key: str):
+        """Run the wrapped extractor and capture the entities and relations it adds."""
+        nodes_before = len(node.metadata.get(KG_NODES_KEY, []))
+        relations_before = len(node.metadata.get(KG_RELATIONS_KEY, []))
+        [node] = await self._acall_extractor(node)
+
+        new_nodes = node.metadata.get(KG_NODES_KEY, [])[nodes_before:]
+        new_relations = node.metadata.get(KG_RELATIONS_KEY, [])[relations_before:]
+        if not all(isinstance(kg_node, EntityNode) for kg_node in new_nodes):
+            # Only plain entity/relation output can be rebuilt from the cache
+            return key, None
+        return key, {
+            "nodes": [[kg_node.name, kg_node.label] for kg_node in new_nodes],
+            "relations": [[rel.label, rel.source_id, rel.target_id] for rel in new_relations],
+        }
+
+    async def _acall_extractor(self, node: BaseNode) -> Sequence[BaseNode]:
+        return await _paced_acall(self.extractor, node, self._rate_limiter, self._expected_output_tokens)
+
+    def _apply(self, node: BaseNode, paths: Dict[str, List[List[str]]]) -> None:
+        """Rebuild cached entities and relations onto a node, as the wrapped extractor would."""
+        existing_nodes = node.metadata.pop(KG_NODES_KEY, [])
+        existing_relations = node.metadata.pop(KG_RELATIONS_KEY, [])
+
+        metadata = node.metadata.copy()
+        for name, label in paths["nodes"]:
+            existing_nodes.append(EntityNode(name=name, label=label, properties=metadata))
+        for label, source_id, target_id in paths["relations"]:
+            existing_relations.append(
+                Relation(label=label, source_id=source_id, target_id=target_id, properties=metadata)
+            )
+
+        node.metadata[KG_NODES_KEY] = existing_nodes
+        node.metadata[KG_RELATIONS_KEY] = existing_relations
+
+
+class PacedPathExtractor(TransformComponent):
+    """
+    Rate-limited wrapper around an LLM path extractor, used when caching is off.
+
+    Chunks are extracted one LLM call at a time on ``num_workers`` workers,
+    each call paced by the process-wide LLM rate limiter when one is
+    configured, and the batch is timed as an ``llm_extract`` span.
+    """
+
+    extractor: TransformComponent
+
+    _rate_limiter: Optional[RateLimiter] = PrivateAttr(default=None)
+    _expected_output_tokens: int = PrivateAttr(default=512)
+
+    def __init__(
+        self,
+        extractor: TransformComponent,
+        rate_limiter: Optional[RateLimiter] = None,
+        expected_output_tokens: int = 512,
+        **kwargs: Any,
+    ):
+        super().__init__(extractor=extractor, **kwargs)
+        self._rate_limiter = rate_limiter
+        self._expected_output_tokens = expected_output_tokens
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "PacedPathExtractor"
+
+    def __call__(self, nodes: Sequence[BaseNode], show_progress: bool = False, **kwargs: Any) -> Sequence[BaseNode]:
+        return asyncio_run(self.acall(nodes, show_progress=show_progress, **kwargs))
+
+    async def acall(self, nodes: Sequence[BaseNode], show_progress: bool = False, **kwargs: Any) -> Sequence[BaseNode]:
+        with span("llm_extract", chunks=len(nodes)) as extract_span:
+            relations_before = sum(len(node.metadata.get(KG_RELATIONS_KEY, [])) for node in nodes)
+            results = await run_jobs(
+                [
+                    _paced_acall(self.extractor, node, self._rate_limiter, self._expected_output_tokens)
+                    for node in nodes
+                ],
+                workers=getattr(self.extractor, "num_workers", 4),
+                show_progress=show_progress,
+                desc="Extracting paths from text",
+            )
+            extracted = [node for batch in results for node in batch]
+            extract_span.add("extractions", len(nodes))
+            extract_span.add(
+                "triplets",
+                sum(len(node.metadata.get(KG_RELATIONS_KEY, [])) for node in extracted) - relations_before,
+            )
+        return extracted
+
+
+async def _paced_acall(
+    extractor: TransformComponent,
+    node: BaseNode,
+    rate_limiter: Optional[RateLimiter],
+    expected_output_tokens: int,
+) -> Sequence[BaseNode]:
+    """One LLM extraction, paced by the shared rate limiter when there is one."""
+    if rate_limiter is not None:
+        prompt = getattr(extractor, "extract_prompt", None)
+        prompt_text = prompt.get_template() if prompt is not None else ""
+        await rate_limiter.acquire(
+            estimate_tokens(prompt_text + node.get_content(metadata_mode=MetadataMode.LLM)) + expected_output_tokens
+        )
+    return await extractor.acall([node])
+
+
+def with_extraction_cache(
+    extractor: TransformComponent, config: Optional[ComponentsConfig] = None
+) -> TransformComponent:
+    """
+    Wrap an LLM extractor with the shared triplet cache and LLM rate limiter.
+
+    Args:
+        extractor: Extractor to wrap
+        config: Configuration instance. If None, uses global config.
+
+    Returns:
+        The cached extractor, or a paced one if caching is disabled; LLM calls
+        go through the LLM rate limiter either way
+    """
+    config = config or get_config()
+    if isinstance(extractor, (CachedPathExtractor, PacedPathExtractor)):
+        return extractor
+    rate_limiter = get_rate_limiter("llm", config)
+    if not config.cache_enabled:
+        return PacedPathExtractor(
+            extractor, rate_limiter=rate_limiter, expected_output_tokens=config.llm_expected_output_tokens
+        )
+    return CachedPathExtractor(
+        extractor,
+        get_triplet_cache(config),
+        rate_limiter=rate_limiter,
+        expected_output_tokens=config.llm_expected_output_tokens,
+    )
@@ -0,0 +1,437 @@
+import asyncio
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import neo4j
+from llama_index.core.graph_stores.types import ChunkNode, EntityNode, LabelledNode, Relation, Triplet
+from llama_index.core.schema import BaseNode
+from llama_index.core.vector_stores.types import VectorStoreQuery
+from llama_index.graph_stores.neo4j import Neo4jPGStore
+from llama_index.graph_stores.neo4j.neo4j_property_graph import (
+    BASE_ENTITY_LABEL,
+    BASE_NODE_LABEL,
+    VECTOR_INDEX_NAME,
+    remove_empty_values,
+)
+
+from core.metrics import span
+
+UPSERT_CHUNKS_QUERY = f"""
+UNWIND $data AS row
+MERGE (c:{BASE_NODE_LABEL} {{id: row.id}})
+SET c.text = row.text, c:Chunk
+WITH c, row
+SET c += row.properties
+WITH c, row.embedding AS embedding
+WHERE embedding IS NOT NULL
+CALL db.create.setNodeVectorProperty(c, 'embedding', embedding)
+RETURN count(*)
+"""
+
+UPSERT_ENTITIES_QUERY = f"""
+UNWIND $data AS row
+MERGE (e:{BASE_NODE_LABEL} {{id: row.id}})
+SET e += apoc.map.clean(row.properties, [], [])
+SET e.name = row.name, e:`{BASE_ENTITY_LABEL}`
+WITH e, row
+CALL apoc.create.addLabels(e, [row.label])
+YIELD node
+WITH e, row
+CALL (e, row) {{
+    WITH e, row
+    WHERE row.embedding IS NOT NULL
+    CALL db.create.setNodeVectorProperty(e, 'embedding', row.embedding)
+    RETURN count(*) AS count
+}}
+WITH e, row WHERE row.properties.triplet_source_id IS NOT NULL
+MERGE (c:{BASE_NODE_LABEL} {{id: row.properties.triplet_source_id}})
+MERGE (e)<-[:MENTIONS]-(c)
+"""
+
+UPSERT_RELATIONS_QUERY = f"""
+UNWIND $data AS row
+MERGE (source: {BASE_NODE_LABEL} {{id: row.source_id}})
+ON CREATE SET source:Chunk
+MERGE (target: {BASE_NODE_LABEL} {{id: row.target_id}})
+ON CREATE SET target:Chunk
+WITH source, target, row
+CALL apoc.merge.relationship(source, row.label, {{}}, row.properties, target) YIELD rel
+RETURN count(*)
+"""
+
+BATCH_VECTOR_QUERY = f"""
+UNWIND range(0, size($embeddings) - 1) AS idx
+CALL db.index.vector.queryNodes('{VECTOR_INDEX_NAME}', $limit, $embeddings[idx])
+YIELD node, score
+RETURN idx, node.id AS id, score
+"""
+
+# Importing-WITH subquery rather than CALL (idx), so it also runs on the
+# versions that have no vector index
+BATCH_VECTOR_SCAN_QUERY = f"""
+UNWIND range(0, size($embeddings) - 1) AS idx
+CALL {{
+    WITH idx
+    MATCH (e:`{BASE_ENTITY_LABEL}`)
+    WHERE e.embedding IS NOT NULL AND size(e.embedding) = $dimension
+    WITH e, vector.similarity.cosine(e.embedding, $embeddings[idx]) AS score
+    ORDER BY score DESC LIMIT toInteger($limit)
+    RETURN e.id AS id, score
+}}
+RETURN idx, id, score
+"""
+
+# Same expansion as Neo4jPGStore.get_rel_map, but limited and returned per start entity
+BATCH_REL_MAP_QUERY = """
+UNWIND $ids AS start_id
+MATCH (e:`{entity}`) WHERE e.id = start_id
+CALL (e) {{
+    MATCH p=(e)-[r*1..{depth}]-(other)
+    WHERE ALL(rel in relationships(p) WHERE type(rel) <> 'MENTIONS')
+    UNWIND relationships(p) AS rel
+    WITH DISTINCT rel
+    LIMIT toInteger($limit)
+    RETURN rel
+}}
+WITH start_id, startNode(rel) AS source, type(rel) AS type, rel{{.*}} AS rel_properties, endNode(rel) AS endNode
+RETURN start_id,
+    source.id AS source_id, [l in labels(source)
+       WHERE NOT l IN ['{entity}', '{node}'] | l][0] AS source_type,
+    source{{.* , embedding: Null, id: Null}} AS source_properties,
+    type,
+    rel_properties,
+    endNode.id AS target_id, [l in labels(endNode)
+       WHERE NOT l IN ['{entity}', '{node}'] | l][0] AS target_type,
+    endNode{{.* , embedding: Null, id: Null}} AS target_properties
+"""
+
+RETRYABLE_ERRORS = (
+    neo4j.exceptions.TransientError,
+    neo4j.exceptions.ServiceUnavailable,
+    neo4j.exceptions.SessionExpired,
+)
+
+
+class BulkNeo4jPGStore(Neo4jPGStore):
+    """
+    Neo4j property graph store with bulk, retrying writes.
+
+    Upserts are written as parameterized ``UNWIND`` statements in explicit
+    write transactions of ``write_batch_size`` rows, optionally several
+    batches at a time. Inside ``buffered()`` nothing is written until the
+    block exits: chunk nodes, entity nodes and relations from every upsert
+    call are accumulated, de-duplicated and flushed together, and schema
+    refreshes requested in the meantime are collapsed into one.
+
+    The async read methods used by retrieval run the blocking driver calls on
+    a dedicated pool of ``read_parallelism`` threads instead of on the event
+    loop, which the parent class would otherwise block.
+    """
+
+    def __init__(
+        self,
+        *args: Any,
+        write_batch_size: int = 2000,
+        write_parallelism: int = 2,
+        write_max_retries: int = 3,
+        read_parallelism: int = 32,
+        **kwargs: Any,
+    ):
+        super().__init__(*args, **kwargs)
+        self.write_batch_size = write_batch_size
+        self.write_parallelism = write_parallelism
+        self.write_max_retries = write_max_retries
+        self._read_executor = ThreadPoolExecutor(max_workers=read_parallelism, thread_name_prefix="neo4j-read")
+        # Each ingest job buffers on its own thread
+        self._local = threading.local()
+        self._write_listeners: List[Callable[[List[dict], List[dict]], None]] = []
+        self._delete_listeners: List[Callable[[List[str]], None]] = []
+        self._has_vector_index = False
+
+    def add_write_listener(self, listener: Callable[[List[dict], List[dict]], None]) -> None:
+        """Call ``listener(chunk_rows, entity_rows)`` after node rows have been written."""
+        self._write_listeners.append(listener)
+
+    def add_delete_listener(self, listener: Callable[[List[str]], None]) -> None:
+        """Call ``listener(node_ids)`` after nodes have been deleted through ``notify_deleted``."""
+        self._delete_listeners.append(listener)
+
+    def notify_deleted(self, node_ids: List[str]) -> None:
+        """Tell the delete listeners that nodes were deleted with a structured query."""
+        if not node_ids:
+            return
+        for listener in self._delete_listeners:
+            try:
+                listener(node_ids)
+            except Exception as e:
+                print(f"Graph delete listener failed: {e}")
+
+    @property
+    def _buffer(self):
+        if not hasattr(self._local, "depth"):
+            self._local.depth = 0
+            self._reset_buffer()
+        return self._local
+
+    def _reset_buffer(self) -> None:
+        self._local.chunks = {}
+        self._local.entities = {}
+        self._local.relations = {}
+        self._local.schema_stale = False
+
+    @contextmanager
+    def buffered(self):
+        """Accumulate upserts on this thread and flush them in bulk when the block exits."""
+        buffer = self._buffer
+        buffer.depth += 1
+        try:
+            yield self
+        except BaseException:
+            if buffer.depth == 1:
+                self._reset_buffer()
+            raise
+        finally:
+            buffer.depth -= 1
+        if buffer.depth == 0:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write everything buffered on this thread."""
+        buffer = self._buffer
+        chunks = list(buffer.chunks.values())
+        entities = list(buffer.entities.values())
+        relations = list(buffer.relations.values())
+        schema_stale = buffer.schema_stale
+        self._reset_buffer()
+
+        if not chunks and not entities and not relations:
+            if schema_stale:
+                self.refresh_schema()
+            return
+
+        start = time.perf_counter()
+        with span("graph_write", chunks=len(chunks), entities=len(entities), triplets=len(relations)):
+            # Relations MERGE their endpoints, so nodes must land first
+            self._write(UPSERT_CHUNKS_QUERY, chunks)
+            self._write(UPSERT_ENTITIES_QUERY, entities)
+            self._write(UPSERT_RELATIONS_QUERY, relations)
+        self._notify(chunks, entities)
+        print(
+            f"Flushed {len(chunks)} chunks, {len(entities)} entities and "
+            f"{len(relations)} relations to Neo4j in {time.perf_counter() - start:.2f}s"
+        )
+        if schema_stale:
+            self.refresh_schema()
+
+    def upsert_nodes(self, nodes: List[LabelledNode]) -> None:
+        chunk_rows: Dict[str, dict] = {}
+        entity_rows: Dict[tuple, dict] = {}
+        for item in nodes:
+            if isinstance(item, EntityNode):
+                row = {**item.dict(), "id": item.id}
+                # An entity is mentioned once per source chunk; keep each MENTIONS edge
+                entity_rows[(item.id, item.properties.get("triplet_source_id"))] = row
+            elif isinstance(item, ChunkNode):
+                chunk_rows[item.id] = {**item.dict(), "id": item.id}
+
+        buffer = self._buffer
+        if buffer.depth > 0:
+            buffer.chunks.update(chunk_rows)
+            buffer.entities.update(entity_rows)
+            return
+        with span("graph_write", chunks=len(chunk_rows), entities=len(entity_rows)):
+            self._write(UPSERT_CHUNKS_QUERY, list(chunk_rows.values()))
+            self._write(UPSERT_ENTITIES_QUERY, list(entity_rows.values()))
+        self._notify(list(chunk_rows.values()), list(entity_rows.values()))
+
+    def upsert_relations(self, relations: List[Relation]) -> None:
+        rows: Dict[tuple, dict] = {}
+        for relation in relations:
+            # apoc.merge.relationship only applies properties on create, so the first one wins
+            rows.setdefault((relation.source_id, relation.label, relation.target_id), relation.dict())
+
+        buffer = self._buffer
+        if buffer.depth > 0:
+            for key, row in rows.items():
+                buffer.relations.setdefault(key, row)
+            return
+        with span("graph_write", triplets=len(rows)):
+            self._write(UPSERT_RELATIONS_QUERY, list(rows.values()))
+
+    def get_schema(self, refresh: bool = False) -> Any:
+        buffer = self._buffer
+        if refresh and buffer.depth > 0:
+            buffer.schema_stale = True
+            return self.structured_schema
+        # Stores built with refresh_schema=False load the schema on first use
+        return super().get_schema(refresh=refresh or not self.structured_schema)
+
+    def batch_vector_query(self, embeddings: List[List[float]], top_k: int) -> List[List[Tuple[str, float]]]:
+        """
+        Run the entity vector search for several query embeddings in one round trip.
+
+        Returns:
+            Per embedding, a list of (entity id, score) pairs, best first
+        """
+        if not embeddings:
+            return []
+        query = BATCH_VECTOR_QUERY if self._vector_index_online() else BATCH_VECTOR_SCAN_QUERY
+        rows = self.structured_query(
+            query,
+            param_map={"embeddings": embeddings, "limit": top_k, "dimension": len(embeddings[0])},
+        )
+        results: List[List[Tuple[str, float]]] = [[] for _ in embeddings]
+        for row in rows or []:
+            results[row["idx"]].append((row["id"], row["score"]))
+        for matches in results:
+            matches.sort(key=lambda match: match[1], reverse=True)
+        return results
+
+    def _vector_index_online(self) -> bool:
+        """Whether the entity vector index exists and is online; only a positive answer is cached."""
+        if not self._has_vector_index:
+            rows = self.structured_query(
+                "SHOW INDEXES YIELD name, type, state "
+                "WHERE name = $name AND type = 'VECTOR' AND state = 'ONLINE' RETURN count(*) AS count",
+                param_map={"name": VECTOR_INDEX_NAME},
+            )
+            self._has_vector_index = bool(rows and rows[0]["count"])
+        return self._has_vector_index
+
+    def get_rel_maps(
+        self,
+        ids: List[str],
+        depth: int = 2,
+        limit: int = 30,
+        ignore_rels: Optional[List[str]] = None,
+    ) -> Dict[str, List[Triplet]]:
+        """
+        Expand several entities in one round trip.
+
+        Returns:
+            Per entity id, up to ``limit`` triplets as ``get_rel_map`` would return them
+        """
+        if not ids:
+            return {}
+        rows = self.structured_query(
+            BATCH_REL_MAP_QUERY.format(entity=BASE_ENTITY_LABEL, node=BASE_NODE_LABEL, depth=depth),
+            param_map={"ids": list(ids), "limit": limit},
+        )
+        ignore_rels = ignore_rels or []
+        rel_maps: Dict[str, List[Triplet]] = {node_id: [] for node_id in ids}
+        for record in rows or []:
+            if record["type"] in ignore_rels:
+                continue
+            source = EntityNode(
+                name=record["source_id"],
+                label=record["source_type"],
+                properties=remove_empty_values(record["source_properties"]),
+            )
+            target = EntityNode(
+                name=record["target_id"],
+                label=record["target_type"],
+                properties=remove_empty_values(record["target_properties"]),
+            )
+            rel = Relation(
+                source_id=record["source_id"],
+                target_id=record["target_id"],
+                label=record["type"],
+                properties=remove_empty_values(record["rel_properties"]),
+            )
+            rel_maps[record["start_id"]].append([source, rel, target])
+        return rel_maps
+
+    async def abatch_vector_query(self, embeddings: List[List[float]], top_k: int) -> List[List[Tuple[str, float]]]:
+        return await self._run_read(self.batch_vector_query, embeddings, top_k)
+
+    async def aget_rel_maps(
+        self,
+        ids: List[str],
+        depth: int = 2,
+        limit: int = 30,
+        ignore_rels: Optional[List[str]] = None,
+    ) -> Dict[str, List[Triplet]]:
+        return await self._run_read(self.get_rel_maps, ids, depth, limit, ignore_rels)
+
+    async def aget(self, properties: Optional[dict] = None, ids: Optional[List[str]] = None) -> List[LabelledNode]:
+        return await self._run_read(self.get, properties, ids)
+
+    async def aget_triplets(self, *args: Any, **kwargs: Any) -> List[Triplet]:
+        return await self._run_read(self.get_triplets, *args, **kwargs)
+
+    async def aget_rel_map(
+        self,
+        graph_nodes: List[LabelledNode],
+        depth: int = 2,
+        limit: int = 30,
+        ignore_rels: Optional[List[str]] = None,
+    ) -> List[Triplet]:
+        return await self._run_read(self.get_rel_map, graph_nodes, depth, limit, ignore_rels)
+
+    async def aget_llama_nodes(self, node_ids: List[str]) -> List[BaseNode]:
+        return await self._run_read(self.get_llama_nodes, node_ids)
+
+    async def avector_query(self, query: VectorStoreQuery, **kwargs: Any) -> Tuple[List[LabelledNode], List[float]]:
+        return await self._run_read(self.vector_query, query, **kwargs)
+
+    async def astructured_query(self, query: str, param_map: Optional[Dict[str, Any]] = None) -> Any:
+        return await self._run_read(self.structured_query, query, param_map)
+
+    async def _run_read(self, fn: Callable, *args: Any, **kwargs: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._read_executor, functools.partial(fn, *args, **kwargs))
+
+    def close(self) -> None:
+        self._read_executor.shutdown(wait=False)
+        super().close()
+
+    def _notify(self, chunk_rows: List[dict], entity_rows: List[dict]) -> None:
+        if not chunk_rows and not entity_rows:
+            return
+        for listener in self._write_listeners:
+            try:
+                listener(chunk_rows, entity_rows)
+            except Exception as e:
+                # Listeners maintain derived data; never fail a committed write over them
+                print(f"Graph write listener failed: {e}")
+
+    def _write(self, query: str, rows: List[dict]) -> None:
+        if not rows:
+            return
+        batches = [
+            rows[index:index + self.write_batch_size]
+            for index in range(0, len(rows), self.write_batch_size)
+        ]
+        if len(batches) == 1 or self.write_parallelism <= 1:
+            for batch in batches:
+                self._write_batch(query, batch)
+            return
+        with ThreadPoolExecutor(max_workers=self.write_parallelism) as executor:
+            # list() re-raises the first failed batch
+            list(executor.map(lambda batch: self._write_batch(query, batch), batches))
+
+    def _write_batch(self, query: str, batch: List[dict]) -> None:
+        for attempt in range(self.write_max_retries + 1):
+            try:
+                with self._driver.session(database=self._database) as session:
+                    session.execute_write(
+                        lambda tx: tx.run(neo4j.Query(text=query, timeout=self._timeout), data=batch).consume()
+                    )
+                return
+            except RETRYABLE_ERRORS as e:
+                if attempt == self.write_max_retries:
+                    raise
+                delay = 0.5 * 2 ** attempt
+                print(f"Transient Neo4j error on write ({e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+
+def buffered_writes(graph_store: Any):
+    """Context manager that batches graph writes when the store supports it."""
+    if isinstance(graph_store, BulkNeo4jPGStore):
+        return graph_store.buffered()
+    return nullcontext(graph_store)
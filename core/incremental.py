@@ -0,0 +1,276 @@
+from typing import Dict, List, Optional, Set, Tuple
+
+from llama_index.core.graph_stores.types import ChunkNode, PropertyGraphStore
+from llama_index.core.schema import Document
+from llama_index.graph_stores.neo4j import Neo4jPGStore
+
+from core.graph_store import BulkNeo4jPGStore
+from core.keyword_index import KeywordIndex
+from core.near_duplicates import NearDuplicateIndex
+
+# Properties link_duplicates adds to a duplicate page's metadata
+_DUPLICATE_NODE_KEYS = {"id", "text", "embedding", "ref_doc_id", "duplicate_of", "duplicate_similarity"}
+
+
+class IncrementalUpdater:
+    """
+    Plans page-level re-ingestion against an existing property graph.
+
+    Pages produced by ``DocumentProcessor.split_documents_into_pages`` carry an
+    ordinal id and a ``page_hash`` fingerprint. Incoming pages are matched to
+    the chunk nodes already in the graph by fingerprint first, so a page that
+    only moved keeps its stored id and is skipped; inserting or removing a
+    page does not mark every later page as changed. Unmatched pages are new
+    or changed, and unmatched stored pages were removed from the file.
+    Deleted pages are dropped from ``keyword_index`` and ``duplicate_index``
+    too, when they are given. Near-duplicate pages hold no extracted data of
+    their own, so when their canonical page is changed or removed they are
+    extracted in the same ingest, whichever file they belong to, and take
+    its place as canonical pages.
+    """
+
+    def __init__(
+        self,
+        graph_store: PropertyGraphStore,
+        keyword_index: Optional[KeywordIndex] = None,
+        duplicate_index: Optional[NearDuplicateIndex] = None,
+    ):
+        self.graph_store = graph_store
+        self.keyword_index = keyword_index
+        self.duplicate_index = duplicate_index
+
+    def get_page_fingerprints(self, filename: str) -> Dict[str, str]:
+        """
+        Get the fingerprints of the pages of a file already in the graph.
+
+        Args:
+            filename: Source filename stored in the page metadata
+
+        Returns:
+            Mapping of page id to page hash
+        """
+        if isinstance(self.graph_store, Neo4jPGStore):
+            rows = self.graph_store.structured_query(
+                """
+                MATCH (c:__Node__)
+                WHERE c.filename = $filename AND c.ref_doc_id IS NOT NULL AND c.text IS NOT NULL
+                RETURN DISTINCT c.ref_doc_id AS page_id, c.page_hash AS page_hash
+                """,
+                param_map={"filename": filename},
+            )
+            return {row["page_id"]: row["page_hash"] for row in rows or []}
+
+        fingerprints = {}
+        for node in self.graph_store.get(properties={"filename": filename}):
+            if isinstance(node, ChunkNode) and node.properties.get("ref_doc_id"):
+                fingerprints[node.properties["ref_doc_id"]] = node.properties.get("page_hash")
+        return fingerprints
+
+    def get_duplicate_pages(self, page_ids: List[str]) -> List[Document]:
+        """
+        Get the near-duplicate pages linked to the given canonical pages.
+
+        Args:
+            page_ids: Ids of canonical pages
+
+        Returns:
+            The pages stored as their duplicates, rebuilt from their chunk nodes
+        """
+        if not page_ids:
+            return []
+        if isinstance(self.graph_store, Neo4jPGStore):
+            rows = self.graph_store.structured_query(
+                """
+                MATCH (c:__Node__) WHERE c.duplicate_of IN $page_ids AND c.ref_doc_id IS NOT NULL
+                RETURN c.text AS text, c {.*, embedding: Null} AS properties
+                """,
+                param_map={"page_ids": list(page_ids)},
+            )
+            records = [(row["text"], row["properties"]) for row in rows or []]
+        else:
+            records = [
+                (node.text, node.properties)
+                for page_id in page_ids
+                for node in self.graph_store.get(properties={"duplicate_of": page_id})
+                if isinstance(node, ChunkNode) and node.properties.get("ref_doc_id")
+            ]
+
+        pages: Dict[str, Document] = {}
+        for text, properties in records:
+            metadata = {
+                key: value
+                for key, value in properties.items()
+                if key not in _DUPLICATE_NODE_KEYS and value is not None
+            }
+            pages[properties["ref_doc_id"]] = Document(
+                id_=properties["ref_doc_id"],
+                text=text or "",
+                metadata=metadata,
+                excluded_embed_metadata_keys=["page_hash"],
+                excluded_llm_metadata_keys=["page_hash"],
+            )
+        return list(pages.values())
+
+    def plan(self, pages: List[Document]) -> Tuple[List[Document], List[str]]:
+        """
+        Work out which pages need to be (re-)ingested.
+
+        Args:
+            pages: Pages of the incoming version of one or more files
+
+        Returns:
+            Tuple of (pages to ingest, ids of stale pages to delete first)
+        """
+        to_ingest: List[Document] = []
+        stale: List[str] = []
+        unchanged: Dict[str, Document] = {}
+        pages_by_file: Dict[str, List[Document]] = {}
+        for page in pages:
+            filename = page.metadata.get("filename")
+            if filename is None or page.metadata.get("page_hash") is None:
+                # No fingerprint to compare against; always ingest
+                to_ingest.append(page)
+                continue
+            pages_by_file.setdefault(filename, []).append(page)
+
+        for filename, file_pages in pages_by_file.items():
+            existing = self.get_page_fingerprints(filename)
+            claimed = self._match_pages(file_pages, existing)
+            changed = [page for page in file_pages if page.id_ not in claimed]
+            for page in file_pages:
+                if page.id_ in claimed:
+                    unchanged[page.id_] = page
+            for page in changed:
+                if page.id_ in existing:
+                    # Replaces the stored page under the same id
+                    stale.append(page.id_)
+                    claimed.add(page.id_)
+                to_ingest.append(page)
+            removed = [page_id for page_id in existing if page_id not in claimed]
+            stale.extend(removed)
+            print(
+                f"{filename}: {len(file_pages) - len(changed)} unchanged, "
+                f"{len(changed)} new or changed, {len(removed)} removed pages"
+            )
+
+        # Duplicates of stale pages lose their canonical page, so extract them in its place
+        planned = set(stale) | {page.id_ for page in to_ingest}
+        orphaned = [page for page in self.get_duplicate_pages(stale) if page.id_ not in planned]
+        for page in orphaned:
+            to_ingest.append(unchanged.get(page.id_, page))
+            stale.append(page.id_)
+        if orphaned:
+            print(f"Re-extracting {len(orphaned)} near-duplicate pages whose canonical page changed")
+
+        return to_ingest, stale
+
+    @staticmethod
+    def _match_pages(pages: List[Document], existing: Dict[str, str]) -> Set[str]:
+        """
+        Match incoming pages to stored pages by fingerprint, renaming in place.
+
+        A page whose content is already stored takes over that page's id,
+        preferring its own id when both match. A changed page whose id was
+        taken over by a moved page gets a fresh id so it cannot collide.
+
+        Args:
+            pages: Incoming pages of one file
+            existing: Mapping of stored page id to page hash
+
+        Returns:
+            Ids of the stored pages matched by an incoming page
+        """
+        by_hash: Dict[str, List[str]] = {}
+        for page_id, page_hash in existing.items():
+            by_hash.setdefault(page_hash, []).append(page_id)
+
+        claimed: Set[str] = set()
+        pending: List[Document] = []
+        for page in pages:
+            if existing.get(page.id_) == page.metadata["page_hash"]:
+                claimed.add(page.id_)
+            else:
+                pending.append(page)
+
+        changed: List[Document] = []
+        for page in pending:
+            candidates = [page_id for page_id in by_hash.get(page.metadata["page_hash"], []) if page_id not in claimed]
+            if candidates:
+                page.id_ = candidates[0]
+                claimed.add(page.id_)
+            else:
+                changed.append(page)
+
+        taken = set(claimed)
+        for page in changed:
+            if page.id_ in taken:
+                base, suffix = page.id_, 1
+                while page.id_ in taken or page.id_ in existing:
+                    page.id_ = f"{base}.{suffix}"
+                    suffix += 1
+            taken.add(page.id_)
+        return claimed
+
+    def delete_pages(self, page_ids: List[str]) -> None:
+        """
+        Delete the chunks of the given pages and the graph data extracted from them.
+
+        Relations extracted from the pages' chunks are removed, as are entities
+        no other chunk still mentions. Near-duplicates of the pages are kept;
+        ``plan`` adds them to the stale pages and re-extracts them in the
+        same ingest. The deleted node ids are reported to the graph store's
+        delete listeners, which keep derived indexes in step.
+
+        Args:
+            page_ids: Ids of the pages to delete
+        """
+        if not page_ids:
+            return
+
+        if self.keyword_index is not None:
+            self.keyword_index.remove_documents(page_ids)
+        if self.duplicate_index is not None:
+            self.duplicate_index.remove_documents(page_ids)
+
+        if not isinstance(self.graph_store, Neo4jPGStore):
+            self.graph_store.delete_llama_nodes(ref_doc_ids=page_ids)
+            return
+
+        rows = self.graph_store.structured_query(
+            """
+            MATCH (c:__Node__) WHERE c.ref_doc_id IN $page_ids
+            OPTIONAL MATCH (c)-[:MENTIONS]->(e:__Entity__)
+            RETURN collect(DISTINCT c.id) AS chunk_ids, collect(DISTINCT e.id) AS entity_ids
+            """,
+            param_map={"page_ids": page_ids},
+        )
+        chunk_ids = rows[0]["chunk_ids"] if rows else []
+        entity_ids = rows[0]["entity_ids"] if rows else []
+
+        if entity_ids:
+            self.graph_store.structured_query(
+                """
+                MATCH (e:__Entity__)-[r]-() WHERE e.id IN $entity_ids AND r.triplet_source_id IN $chunk_ids
+                DELETE r
+                """,
+                param_map={"entity_ids": entity_ids, "chunk_ids": chunk_ids},
+            )
+        self.graph_store.structured_query(
+            "MATCH (c:__Node__) WHERE c.id IN $ids DETACH DELETE c",
+            param_map={"ids": chunk_ids + list(page_ids)},
+        )
+        deleted_entity_ids = []
+        if entity_ids:
+            rows = self.graph_store.structured_query(
+                """
+                MATCH (e:__Entity__) WHERE e.id IN $entity_ids AND NOT ()-[:MENTIONS]->(e)
+                WITH e, e.id AS id
+                DETACH DELETE e
+                RETURN collect(id) AS ids
+                """,
+                param_map={"entity_ids": entity_ids},
+            )
+            deleted_entity_ids = rows[0]["ids"] if rows else []
+        if isinstance(self.graph_store, BulkNeo4jPGStore):
+            self.graph_store.notify_deleted(chunk_ids + list(page_ids) + deleted_entity_ids)
+        print(f"Deleted {len(page_ids)} stale pages ({len(chunk_ids)} chunks)")
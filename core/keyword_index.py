@@ -0,0 +1,226 @@
+import re
+import sqlite3
+import threading
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+from llama_index.core.graph_stores.types import ChunkNode, PropertyGraphStore
+from llama_index.graph_stores.neo4j import Neo4jPGStore
+
+# (chunk id, text, ref doc id)
+KeywordRow = Tuple[str, str, Optional[str]]
+
+_TERM = re.compile(r"\w+", re.UNICODE)
+
+
+class KeywordIndex:
+    """
+    On-disk BM25 index over chunk text, backed by SQLite FTS5.
+
+    The FTS5 table is contentless, so the index holds only the inverted
+    lists; each chunk's text is kept zlib-compressed next to its id so that
+    replaced or deleted chunks can be removed exactly. Writes go through one
+    shared connection; searches use a per-thread read connection, which WAL
+    mode lets run alongside writes from this or other processes.
+    """
+
+    def __init__(self, db_path: Union[str, Path]):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "rowid INTEGER PRIMARY KEY, chunk_id TEXT NOT NULL UNIQUE, "
+            "ref_doc_id TEXT, text BLOB NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS chunks_ref_doc_id ON chunks(ref_doc_id)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS chunk_fts USING fts5("
+            "text, content='', tokenize='unicode61 remove_diacritics 2')"
+        )
+        self._conn.commit()
+
+    def add(self, rows: Iterable[KeywordRow], batch_size: int = 1000) -> int:
+        """
+        Index chunks, replacing any already indexed under the same id.
+
+        Rows are written in transactions of ``batch_size``, so a long stream
+        does not have to fit in memory.
+
+        Returns:
+            Number of chunks written
+        """
+        written = 0
+        batch: List[KeywordRow] = []
+        for row in rows:
+            if row[1]:
+                batch.append(row)
+            if len(batch) >= batch_size:
+                written += self._add_batch(batch)
+                batch = []
+        if batch:
+            written += self._add_batch(batch)
+        return written
+
+    def remove(self, chunk_ids: Iterable[str]) -> None:
+        with self._lock:
+            self._delete_where("chunk_id", list(chunk_ids))
+            self._conn.commit()
+
+    def remove_documents(self, ref_doc_ids: Iterable[str]) -> None:
+        """Remove every chunk of the given pages."""
+        with self._lock:
+            self._delete_where("ref_doc_id", list(ref_doc_ids))
+            self._conn.commit()
+
+    def search(self, query: str, top_k: int = 10) -> List[Tuple[str, float]]:
+        """
+        Rank chunks against a query with BM25.
+
+        Every word of the query is matched as its own term (OR), so exact
+        identifiers such as part numbers and names score highest when they
+        appear verbatim.
+
+        Returns:
+            List of (chunk id, score) pairs, best first; higher is better
+        """
+        terms = list(dict.fromkeys(term.lower() for term in _TERM.findall(query)))
+        if not terms or top_k <= 0:
+            return []
+        match = " OR ".join('"' + term.replace('"', '""') + '"' for term in terms)
+        rows = self._reader().execute(
+            "SELECT chunks.chunk_id, bm25(chunk_fts) AS rank FROM chunk_fts "
+            "JOIN chunks ON chunks.rowid = chunk_fts.rowid "
+            "WHERE chunk_fts MATCH ? ORDER BY rank LIMIT ?",
+            (match, top_k),
+        ).fetchall()
+        # FTS5's bm25() is negated so that ascending order is best-first
+        return [(chunk_id, -rank) for chunk_id, rank in rows]
+
+    def search_many(self, queries: Sequence[str], top_k: int = 10) -> List[List[Tuple[str, float]]]:
+        return [self.search(query, top_k) for query in queries]
+
+    def rebuild(self, rows: Iterable[KeywordRow]) -> int:
+        """Replace the index contents."""
+        with self._lock:
+            self._conn.execute("DELETE FROM chunks")
+            self._conn.execute("INSERT INTO chunk_fts (chunk_fts) VALUES ('delete-all')")
+            self._conn.commit()
+        written = self.add(rows)
+        print(f"Rebuilt keyword index with {written} chunks")
+        return written
+
+    @property
+    def backfilled(self) -> bool:
+        """Whether a ``backfill`` has run to completion against this index file."""
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM meta WHERE key = 'backfilled'").fetchone() is not None
+
+    def backfill(self, rows: Iterable[KeywordRow]) -> int:
+        """
+        Index every existing chunk, then record that the index is complete.
+
+        The marker is only written once ``rows`` is exhausted, so an
+        interrupted backfill runs again from the start; re-adding a chunk
+        replaces it.
+
+        Returns:
+            Number of chunks written
+        """
+        written = self.add(rows)
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('backfilled', '1')")
+            self._conn.commit()
+        print(f"Backfilled keyword index with {written} chunks")
+        return written
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(str(self.db_path), check_same_thread=False, timeout=30)
+        return conn
+
+    def _add_batch(self, rows: List[KeywordRow]) -> int:
+        with self._lock:
+            self._delete_where("chunk_id", [chunk_id for chunk_id, _, _ in rows])
+            for chunk_id, text, ref_doc_id in rows:
+                cursor = self._conn.execute(
+                    "INSERT INTO chunks (chunk_id, ref_doc_id, text) VALUES (?, ?, ?)",
+                    (chunk_id, ref_doc_id, zlib.compress(text.encode("utf-8"))),
+                )
+                self._conn.execute("INSERT INTO chunk_fts (rowid, text) VALUES (?, ?)", (cursor.lastrowid, text))
+            self._conn.commit()
+        return len(rows)
+
+    def _delete_where(self, column: str, values: List[str]) -> None:
+        # SQLite caps bound parameters, so look rows up in slices.
+        for start in range(0, len(values), 500):
+            batch = values[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            existing = self._conn.execute(
+                f"SELECT rowid, text FROM chunks WHERE {column} IN ({placeholders})", batch
+            ).fetchall()
+            if not existing:
+                continue
+            # Contentless tables need the original text to drop its terms
+            self._conn.executemany(
+                "INSERT INTO chunk_fts (chunk_fts, rowid, text) VALUES ('delete', ?, ?)",
+                [(rowid, zlib.decompress(text).decode("utf-8")) for rowid, text in existing],
+            )
+            self._conn.executemany("DELETE FROM chunks WHERE rowid = ?", [(rowid,) for rowid, _ in existing])
+
+
+def rows_from_chunk_upserts(rows: Iterable[Dict[str, Any]]) -> List[KeywordRow]:
+    """Keyword index rows for upserted graph store chunk rows."""
+    return [
+        (row["id"], row.get("text") or "", (row.get("properties") or {}).get("ref_doc_id"))
+        for row in rows
+    ]
+
+
+def iter_graph_chunks(graph_store: PropertyGraphStore, batch_size: int = 5000) -> Iterator[KeywordRow]:
+    """
+    Stream the text chunks stored in the graph.
+
+    Args:
+        graph_store: Graph store to read from
+        batch_size: Rows fetched per Neo4j query
+
+    Yields:
+        (chunk id, text, ref doc id) rows
+    """
+    if isinstance(graph_store, Neo4jPGStore):
+        after = ""
+        while True:
+            rows = graph_store.structured_query(
+                """
+                MATCH (c:Chunk) WHERE c.text IS NOT NULL AND c.id > $after
+                RETURN c.id AS id, c.text AS text, c.ref_doc_id AS ref_doc_id
+                ORDER BY c.id LIMIT $limit
+                """,
+                param_map={"after": after, "limit": batch_size},
+            )
+            if not rows:
+                return
+            for row in rows:
+                yield row["id"], row["text"], row["ref_doc_id"]
+            after = rows[-1]["id"]
+        return
+
+    for node in graph_store.get():
+        if isinstance(node, ChunkNode) and node.text:
+            yield node.id, node.text, node.properties.get("ref_doc_id")
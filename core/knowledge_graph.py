@@ -6,8 +6,12 @@ from llama_index.core.llms import LLM
 from llama_index.core.schema import Document
 from typing import List
 from llama_index.core import PropertyGraphIndex
-from llama_index.llms.openai import OpenAI
-from core.embeddings import EmbeddingManager
+from core.extractors import with_extraction_cache
+from core.graph_store import buffered_writes
+from core.incremental import IncrementalUpdater
+from core.near_duplicates import DuplicateFilter, link_duplicates
+from core.query_cache import bump_graph_generation
+from core.registry import get_registry
 from llama_index.core.indices.property_graph import (
     ImplicitPathExtractor,
     SimpleLLMPathExtractor,
@@ -33,9 +37,9 @@ class KnowledgeGraphBuilder:
 
         Args:
             config: Configuration instance. If None, uses global config.
-            graph_store: Neo4j graph store instance. If None, creates new one.
-            llm: LLM instance for extraction. If None, creates from config.
-            embed_model: Embedding model. If None, creates from config.
+            graph_store: Neo4j graph store instance. If None, uses the shared registry.
+            llm: LLM instance for extraction. If None, uses the shared registry.
+            embed_model: Embedding model. If None, uses the shared registry.
         """
         self.config = config or get_config()
         self._graph_store = graph_store
@@ -62,8 +66,7 @@ class KnowledgeGraphBuilder:
     def embed_model(self) -> BaseEmbedding:
         """Get or create embedding model."""
         if self._embed_model is None:
-            embedding_manager = EmbeddingManager(self.config)
-            self._embed_model = embedding_manager.embedding_model
+            self._embed_model = get_registry(self.config).embed_model
         return self._embed_model
 
     @property
@@ -84,10 +87,13 @@ class KnowledgeGraphBuilder:
                 print("Added ImplicitPathExtractor")
 
             elif extractor_type == "llm":
-                extractor = SimpleLLMPathExtractor(
-                    llm=self.llm,
-                    num_workers=self.config.num_workers,
-                    max_paths_per_chunk=self.config.max_paths_per_chunk,
+                extractor = with_extraction_cache(
+                    SimpleLLMPathExtractor(
+                        llm=self.llm,
+                        num_workers=self.config.num_workers,
+                        max_paths_per_chunk=self.config.max_paths_per_chunk,
+                    ),
+                    self.config,
                 )
                 extractors.append(extractor)
                 print("Added SimpleLLMPathExtractor")
@@ -105,43 +111,18 @@ class KnowledgeGraphBuilder:
         return extractors
 
     def _create_graph_store(self) -> Neo4jPGStore:
-        """Create Neo4j graph store from configuration."""
-        neo4j_settings = self.config.get_neo4j_settings()
-
-        try:
-            graph_store = Neo4jPGStore(
-                username=neo4j_settings["username"],
-                password=neo4j_settings["password"],
-                url=neo4j_settings["url"],
-                database=neo4j_settings.get("database", "neo4j"),
-            )
-
-            print(f"Connected to Neo4j at {neo4j_settings['url']}")
-            return graph_store
-        except Exception as e:
-            print(f"Failed to connect to Neo4j: {e}")
-            raise
+        """Get the process-wide Neo4j graph store."""
+        return get_registry(self.config).graph_store
 
     def _create_llm(self) -> LLM:
-        """Create LLM instance from configuration."""
-        if not self.config.openai_api_key:
-            raise ValueError(
-                "OpenAI API key is required. Set OPENAI_API_KEY environment variable."
-            )
-
-        llm = OpenAI(
-            model=self.config.llm_model,
-            temperature=self.config.llm_temperature,
-            api_key=self.config.openai_api_key,
-        )
-
-        print(f"Created LLM: {self.config.llm_model}")
-        return llm
+        """Get the process-wide LLM instance."""
+        return get_registry(self.config).llm
 
     def build_graph_from_documents(
         self,
         documents: List[Document],
-        show_progress: Optional[bool] = None
+        show_progress: Optional[bool] = None,
+        incremental: bool = False
     ) -> PropertyGraphIndex:
         """
         Build knowledge graph from documents.
@@ -149,6 +130,12 @@ class KnowledgeGraphBuilder:
         Args:
             documents: List of documents to process
             show_progress: Whether to show progress. If None, uses config.
+            incremental: Skip pages whose fingerprint is unchanged in the graph
+                and replace the nodes of changed or removed pages.
+
+        Near-duplicates of pages already in the graph (or earlier in the
+        batch) are linked to them instead of being embedded and extracted,
+        unless near-duplicate detection is disabled.
 
         Returns:
             PropertyGraphIndex instance
@@ -156,14 +143,40 @@ class KnowledgeGraphBuilder:
         if show_progress is None:
             show_progress = self.config.show_progress
 
-        try:
-            self._index = PropertyGraphIndex.from_documents(
-                documents,
-                embed_model=self._embed_model,
-                kg_extractors=self._extractors,
-                property_graph_store=self.graph_store,
-                show_progress=show_progress,
+        registry = get_registry(self.config)
+        if incremental:
+            updater = IncrementalUpdater(
+                self.graph_store,
+                keyword_index=registry.keyword_index,
+                duplicate_index=registry.near_duplicate_index,
+            )
+            documents, stale_pages = updater.plan(documents)
+            updater.delete_pages(stale_pages)
+            if stale_pages:
+                bump_graph_generation(self.graph_store)
+
+        duplicate_filter = None
+        duplicates = []
+        if registry.near_duplicate_index is not None:
+            duplicate_filter = DuplicateFilter(
+                registry.near_duplicate_index, min_words=self.config.near_duplicate_min_words
             )
+            documents, duplicates = duplicate_filter.filter(documents)
+
+        try:
+            with buffered_writes(self.graph_store):
+                self._index = PropertyGraphIndex.from_documents(
+                    documents,
+                    embed_model=self.embed_model,
+                    kg_extractors=self.extractors,
+                    property_graph_store=self.graph_store,
+                    show_progress=show_progress,
+                )
+            # After the flush, so the canonical chunks of this batch are in the graph
+            if duplicate_filter is not None:
+                link_duplicates(self.graph_store, duplicates)
+                duplicate_filter.commit()
+            bump_graph_generation(self.graph_store)
 
             print("Successfully built knowledge graph")
             return self._index
@@ -0,0 +1,306 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+from llama_index.core import StorageContext
+from llama_index.core.storage.docstore import SimpleDocumentStore
+from llama_index.core.storage.index_store import SimpleIndexStore
+from llama_index.core.vector_stores import SimpleVectorStore
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+PERSIST_MODES = ("full", "sharded", "none")
+
+# Written by versions that kept one snapshot per document; migrated on the next write
+COMPACTED_FILE = "compacted.json"
+PACK_PREFIX = "pack-"
+SHARD_SUFFIX = ".shard.json"
+REF_DOC_INFO = "docstore/ref_doc_info"
+
+# Page id (or document key, for what belongs to no page) -> serialized stores
+Snapshot = Dict[str, Dict[str, Any]]
+
+
+class ShardedStorage:
+    """
+    Per-page snapshots of the local docstore, index store and vector stores.
+
+    An ingest's storage context only holds the pages it (re-)ingested, so it
+    is split by page and each page is written to its own shard file, named
+    after the page and replaced by an atomic rename. What belongs to no page
+    (the index structs) goes to one shard per file. Pages removed from a
+    file get an empty tombstone shard. The cost of a write depends only on
+    the pages written, and unchanged pages keep their shards.
+
+    Once ``compact_threshold`` loose shards have accumulated they are folded
+    into a new pack file, so compaction also costs only the shards since the
+    last one, whatever the corpus size. ``load`` merges the packs oldest
+    first, then the loose shards; ``compact`` folds everything into one pack
+    and drops tombstones, for maintenance off the ingest path.
+    """
+
+    def __init__(self, root: Union[str, Path], compact_threshold: int = 256):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.compact_threshold = compact_threshold
+        self._lock = threading.Lock()
+
+    def write(self, key: str, storage_context: StorageContext, removed: Iterable[str] = ()) -> Path:
+        """
+        Store the storage context of one document's ingest.
+
+        Args:
+            key: Document (file) the ingest belongs to
+            storage_context: Storage context of the ingest
+            removed: Ids of pages of the document that no longer exist
+
+        Returns:
+            Directory of the shards
+        """
+        pages, rest = _split_by_page(_serialize(storage_context))
+        removed = [page_id for page_id in removed if page_id not in pages]
+        with self._exclusive():
+            self._migrate(key, skip=set(pages) | set(removed))
+            for page_id, stores in pages.items():
+                _write_json_atomic(self._shard_path(page_id), {"key": page_id, "file": key, "stores": stores})
+            for page_id in removed:
+                _write_json_atomic(self._shard_path(page_id), {"key": page_id, "file": key, "stores": None})
+            _write_json_atomic(self._shard_path(key), {"key": key, "file": key, "stores": rest})
+            if len(self._shard_paths()) >= self.compact_threshold:
+                self._pack()
+        return self.root
+
+    def compact(self) -> int:
+        """
+        Fold every pack and shard into a single pack, dropping tombstones and superseded entries.
+
+        Returns:
+            Number of entries in the pack
+        """
+        with self._exclusive():
+            self._migrate_compacted()
+            packs, shards = self._pack_paths(), self._shard_paths()
+            entries = self._read_all()
+            self._write_pack(entries)
+            # Only after the new pack is in place, so a crash loses nothing
+            for path in packs + shards:
+                path.unlink(missing_ok=True)
+        print(f"Compacted {len(packs)} storage packs and {len(shards)} shards ({len(entries)} entries)")
+        return len(entries)
+
+    def snapshot(self) -> Snapshot:
+        """Serialized stores of every page (and per-file index stores), the latest ingest of each."""
+        with self._exclusive():
+            return self._read_all()
+
+    def load(self) -> StorageContext:
+        """A storage context holding every persisted document."""
+        docstore: Dict[str, Dict[str, Any]] = {}
+        index_store: Dict[str, Dict[str, Any]] = {}
+        vector_stores: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        for stores in self.snapshot().values():
+            _merge_collections(docstore, stores["docstore"])
+            _merge_collections(index_store, stores["index_store"])
+            for name, data in stores["vector_stores"].items():
+                _merge_collections(vector_stores.setdefault(name, {}), data)
+        return StorageContext.from_defaults(
+            docstore=SimpleDocumentStore.from_dict(docstore),
+            index_store=SimpleIndexStore.from_dict(index_store),
+            vector_stores={name: SimpleVectorStore.from_dict(data) for name, data in vector_stores.items()},
+        )
+
+    def _pack(self) -> None:
+        shards = self._shard_paths()
+        entries: Dict[str, Optional[Dict[str, Any]]] = {}
+        for path in shards:
+            payload = json.loads(path.read_text(encoding="utf-8"))
+            entries[payload["key"]] = payload["stores"]
+        self._write_pack(entries)
+        for path in shards:
+            path.unlink(missing_ok=True)
+        print(f"Packed {len(shards)} storage shards")
+
+    def _write_pack(self, entries: Dict[str, Optional[Dict[str, Any]]], name: Optional[str] = None) -> None:
+        _write_json_atomic(self.root / (name or f"{PACK_PREFIX}{time.time_ns():020d}.json"), entries)
+
+    def _migrate(self, key: str, skip: Set[str]) -> None:
+        """Split snapshots written per document before per-page shards into page entries."""
+        self._migrate_compacted()
+        path = self._shard_path(key)
+        if path.exists():
+            payload = json.loads(path.read_text(encoding="utf-8"))
+            if "file" not in payload:
+                pages, _ = _split_by_page(payload["stores"])
+                for page_id, stores in pages.items():
+                    if page_id not in skip:
+                        _write_json_atomic(self._shard_path(page_id), {"key": page_id, "file": key, "stores": stores})
+
+    def _migrate_compacted(self) -> None:
+        compacted = self.root / COMPACTED_FILE
+        if not compacted.exists():
+            return
+        entries: Dict[str, Optional[Dict[str, Any]]] = {}
+        for document, stores in json.loads(compacted.read_text(encoding="utf-8")).items():
+            pages, rest = _split_by_page(stores)
+            entries.update(pages)
+            entries[document] = rest
+        # Sorts before every pack written since
+        self._write_pack(entries, name=f"{PACK_PREFIX}{0:020d}.json")
+        compacted.unlink()
+
+    def _read_all(self) -> Snapshot:
+        entries: Dict[str, Optional[Dict[str, Any]]] = {}
+        compacted = self.root / COMPACTED_FILE
+        if compacted.exists():
+            entries.update(json.loads(compacted.read_text(encoding="utf-8")))
+        for path in self._pack_paths():
+            entries.update(json.loads(path.read_text(encoding="utf-8")))
+        for path in self._shard_paths():
+            payload = json.loads(path.read_text(encoding="utf-8"))
+            entries[payload["key"]] = payload["stores"]
+        return {key: stores for key, stores in entries.items() if stores is not None}
+
+    def _shard_path(self, key: str) -> Path:
+        return self.root / (hashlib.sha1(key.encode("utf-8")).hexdigest() + SHARD_SUFFIX)
+
+    def _shard_paths(self) -> List[Path]:
+        return sorted(self.root.glob("*" + SHARD_SUFFIX))
+
+    def _pack_paths(self) -> List[Path]:
+        return sorted(self.root.glob(PACK_PREFIX + "*.json"))
+
+    @contextmanager
+    def _exclusive(self) -> Iterator[None]:
+        """Serialize writers and compaction across threads and, through ``flock``, processes."""
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self.root / ".lock", "a") as lock_file:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def persist_storage_context(
+    storage_context: StorageContext,
+    key: str,
+    mode: str,
+    persist_dir: Union[str, Path],
+    compact_threshold: int = 256,
+    removed_pages: Iterable[str] = (),
+) -> Optional[Path]:
+    """
+    Persist an ingest's storage context according to ``mode``.
+
+    ``full`` rewrites the LlamaIndex JSON files in ``persist_dir``,
+    ``sharded`` writes one ``ShardedStorage`` shard per ingested page under
+    ``persist_dir/shards`` (and tombstones ``removed_pages``) and ``none``
+    skips local persistence, for deployments where Neo4j is the only source
+    of truth.
+
+    Returns:
+        Where the snapshot was written, or None when skipped
+    """
+    if mode not in PERSIST_MODES:
+        raise ValueError(f"Unknown persist mode {mode!r}, expected one of {', '.join(PERSIST_MODES)}")
+    persist_dir = Path(persist_dir)
+    if mode == "none":
+        return None
+    if mode == "full":
+        persist_dir.mkdir(parents=True, exist_ok=True)
+        storage_context.persist(persist_dir=str(persist_dir))
+        return persist_dir
+    return ShardedStorage(persist_dir / "shards", compact_threshold).write(key, storage_context, removed_pages)
+
+
+def _serialize(storage_context: StorageContext) -> Dict[str, Any]:
+    return {
+        "docstore": storage_context.docstore.to_dict(),
+        "index_store": storage_context.index_store.to_dict(),
+        "vector_stores": {
+            name: vector_store.to_dict()
+            for name, vector_store in storage_context.vector_stores.items()
+            if isinstance(vector_store, SimpleVectorStore)
+        },
+    }
+
+
+def _split_by_page(stores: Dict[str, Any]) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, Any]]:
+    """
+    Split serialized stores into the entries of each page and the rest.
+
+    Docstore and vector store entries are keyed by node id; nodes are
+    assigned to pages through the docstore's ref_doc_info and the vector
+    stores' ``text_id_to_ref_doc_id``.
+
+    Returns:
+        Tuple of (page id -> stores, stores of entries that belong to no page)
+    """
+    node_pages: Dict[str, str] = {}
+    for page_id, info in stores["docstore"].get(REF_DOC_INFO, {}).items():
+        for node_id in info.get("node_ids", []):
+            node_pages[node_id] = page_id
+    for data in stores["vector_stores"].values():
+        node_pages.update(data.get("text_id_to_ref_doc_id", {}))
+
+    pages: Dict[str, Dict[str, Any]] = {}
+    rest: Dict[str, Any] = {"docstore": {}, "index_store": stores["index_store"], "vector_stores": {}}
+
+    def split(source: Dict[str, Any], store: str, name: Optional[str] = None) -> None:
+        for collection, values in source.items():
+            if not isinstance(values, dict):
+                _target(rest, store, name)[collection] = values
+                continue
+            for entry_key, value in values.items():
+                page_id = entry_key if collection == REF_DOC_INFO else node_pages.get(entry_key)
+                if page_id is None:
+                    target = _target(rest, store, name)
+                else:
+                    page = pages.setdefault(page_id, {"docstore": {}, "index_store": {}, "vector_stores": {}})
+                    target = _target(page, store, name)
+                target.setdefault(collection, {})[entry_key] = value
+
+    split(stores["docstore"], "docstore")
+    for name, data in stores["vector_stores"].items():
+        split(data, "vector_stores", name)
+    return pages, rest
+
+
+def _target(stores: Dict[str, Any], store: str, name: Optional[str]) -> Dict[str, Any]:
+    if name is None:
+        return stores[store]
+    return stores[store].setdefault(name, {})
+
+
+def _merge_collections(target: Dict[str, Dict[str, Any]], source: Dict[str, Any]) -> None:
+    """Merge serialized stores, which are all dicts of collection -> {key: value}."""
+    for collection, values in source.items():
+        if isinstance(values, dict):
+            target.setdefault(collection, {}).update(values)
+        else:
+            target[collection] = values
+
+
+def _write_json_atomic(path: Path, payload: Any) -> None:
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp-", suffix=".json")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(payload, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        Path(tmp_path).unlink(missing_ok=True)
+        raise
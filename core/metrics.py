@@ -0,0 +1,198 @@
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Seconds; spans range from sub-millisecond cache hits to multi-minute ingests
+DURATION_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0,
+)
+# Per-span pages, chunks, tokens, triplets and bytes
+COUNT_BUCKETS = (1, 5, 10, 50, 100, 500, 1_000, 5_000, 10_000, 50_000, 100_000, 1_000_000, 10_000_000, 100_000_000)
+
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LabelSet = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """Cumulative-bucket histogram with one series per label set."""
+
+    def __init__(self, name: str, documentation: str, buckets: Sequence[float]):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        # labels -> (per-bucket counts with a final +Inf bucket, sum)
+        self._series: Dict[LabelSet, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][index] += 1
+            series[1][0] += value
+
+    def sums(self) -> Dict[LabelSet, float]:
+        """Sum of the observed values per label set."""
+        with self._lock:
+            return {key: total[0] for key, (_, total) in self._series.items()}
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(key, list(counts), total[0]) for key, (counts, total) in sorted(self._series.items())]
+        for key, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _format_number(bound)
+                lines.append(f"{self.name}_bucket{_labels(key + (('le', le),))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(key)} {_format_number(total)}")
+            lines.append(f"{self.name}_count{_labels(key)} {cumulative}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._lock = threading.Lock()
+        self._values: Dict[LabelSet, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        lines.extend(f"{self.name}{_labels(key)} {_format_number(value)}" for key, value in values)
+        return lines
+
+
+STAGE_DURATION = Histogram(
+    "kg_stage_duration_seconds", "Wall-clock time of pipeline stage spans.", DURATION_BUCKETS
+)
+STAGE_ITEMS = Histogram(
+    "kg_stage_items", "Items (pages, chunks, tokens, triplets, bytes) handled per stage span.", COUNT_BUCKETS
+)
+STAGE_ERRORS = Counter("kg_stage_errors_total", "Stage spans that raised.")
+RATE_LIMIT_WAIT = Histogram(
+    "kg_rate_limit_wait_seconds", "Time calls were held back by a provider rate limiter.", DURATION_BUCKETS
+)
+
+_METRICS = [STAGE_DURATION, STAGE_ITEMS, STAGE_ERRORS, RATE_LIMIT_WAIT]
+
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """A timed pipeline stage; ``add`` attaches item counts reported when the span ends."""
+
+    def __init__(self, stage: str, parent: Optional["Span"] = None):
+        self.stage = stage
+        self.parent = parent
+        self.counts: Dict[str, float] = {}
+        self.started = time.perf_counter()
+        self.duration: Optional[float] = None
+
+    def add(self, item: str, amount: float = 1) -> None:
+        self.counts[item] = self.counts.get(item, 0) + amount
+
+
+@contextmanager
+def span(stage: str, **counts: float) -> Iterator[Span]:
+    """
+    Time a pipeline stage.
+
+    The duration goes to ``kg_stage_duration_seconds`` and each count (given
+    here or added with ``Span.add``) to ``kg_stage_items``, labelled with the
+    stage. Spans nest through a context variable, so work started inside a
+    span (including in tasks and ``asyncio.to_thread`` calls) can reach it
+    with ``current_span``.
+    """
+    current = Span(stage, parent=_current_span.get())
+    for item, amount in counts.items():
+        current.add(item, amount)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        _current_span.reset(token)
+        current.duration = time.perf_counter() - current.started
+        STAGE_DURATION.observe(current.duration, stage=stage)
+        for item, amount in current.counts.items():
+            STAGE_ITEMS.observe(amount, stage=stage, item=item)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def stage_seconds() -> Dict[str, float]:
+    """Total span time per stage recorded so far in this process; concurrent spans add up."""
+    totals: Dict[str, float] = {}
+    for key, total in STAGE_DURATION.sums().items():
+        stage = dict(key)["stage"]
+        totals[stage] = totals.get(stage, 0.0) + total
+    return totals
+
+
+def render_metrics() -> str:
+    """All metrics of this process in the Prometheus text exposition format."""
+    lines = []
+    for metric in _METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        if self.path.split("?")[0].rstrip("/") not in ("/metrics", "/api/v1/metrics"):
+            self.send_error(404)
+            return
+        body = render_metrics().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", METRICS_CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        # Scrapes every few seconds would drown the service log
+        pass
+
+
+def start_metrics_server(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """Serve ``/api/v1/metrics`` from a background thread, for processes without an HTTP API."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
+
+
+def _labels(key: LabelSet) -> str:
+    if not key:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in key) + "}"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_number(value: float) -> str:
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
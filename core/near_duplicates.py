@@ -0,0 +1,328 @@
+import hashlib
+import re
+import sqlite3
+import threading
+import zlib
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+from llama_index.core.graph_stores.types import ChunkNode, PropertyGraphStore, Relation
+from llama_index.core.schema import Document
+
+from core.metrics import span
+
+# (page, id of its canonical page, estimated Jaccard similarity)
+NearDuplicate = Tuple[Document, str, float]
+
+DUPLICATE_OF = "DUPLICATE_OF"
+
+_TERM = re.compile(r"\w+", re.UNICODE)
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+# Fixed so that signatures stay comparable across processes and restarts
+_PERMUTATION_SEED = 1
+# numpy < 2 only has the old name
+_trapezoid = getattr(np, "trapezoid", None) or np.trapz
+
+
+def lsh_parameters(threshold: float, num_perm: int) -> Tuple[int, int]:
+    """
+    (bands, rows per band) for LSH over ``num_perm`` MinHash values.
+
+    Picks the split minimizing the sum of the false positive and false
+    negative probability mass around ``threshold``.
+    """
+    similarities = np.linspace(0.0, 1.0, 201)
+    below, above = similarities <= threshold, similarities >= threshold
+    best, best_error = (1, num_perm), float("inf")
+    for bands in range(1, num_perm + 1):
+        rows = num_perm // bands
+        candidate = 1.0 - (1.0 - similarities ** rows) ** bands
+        error = _trapezoid(candidate[below], similarities[below]) + _trapezoid(
+            1.0 - candidate[above], similarities[above]
+        )
+        if error < best_error:
+            best, best_error = (bands, rows), error
+    return best
+
+
+class NearDuplicateIndex:
+    """
+    Persistent MinHash/LSH index of page signatures, backed by SQLite.
+
+    Each indexed page keeps its ``num_perm`` MinHash values over word
+    shingles, plus one LSH bucket per band. Pages whose estimated Jaccard
+    similarity reaches ``threshold`` share a bucket with high probability,
+    so a lookup only compares a page against the few pages in its buckets.
+    Only canonical pages are indexed; their duplicates point at them from
+    the graph instead. The buckets are rebuilt from the stored signatures
+    when the threshold changes.
+    """
+
+    def __init__(
+        self,
+        db_path: Union[str, Path],
+        threshold: float = 0.9,
+        num_perm: int = 128,
+        shingle_size: int = 5,
+    ):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.bands, self.rows = lsh_parameters(threshold, num_perm)
+        rng = np.random.RandomState(_PERMUTATION_SEED)
+        self._a = rng.randint(1, _MAX_HASH, size=num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, _MAX_HASH, size=num_perm, dtype=np.uint64)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS signatures (page_id TEXT PRIMARY KEY, filename TEXT, signature BLOB NOT NULL)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS buckets (bucket INTEGER NOT NULL, page_id TEXT NOT NULL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS buckets_bucket ON buckets(bucket)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS buckets_page_id ON buckets(page_id)")
+        self._check_layout()
+        self._conn.commit()
+
+    def signature(self, text: str) -> np.ndarray:
+        """MinHash signature of the text's word shingles."""
+        terms = [term.lower() for term in _TERM.findall(text)]
+        size = min(self.shingle_size, len(terms)) or 1
+        shingles = {" ".join(terms[i:i + size]) for i in range(max(len(terms) - size + 1, 1))}
+        hashes = np.fromiter(
+            (zlib.crc32(shingle.encode("utf-8")) for shingle in shingles), dtype=np.uint64, count=len(shingles)
+        )
+        # a * h stays below 2**64 because both are below 2**32
+        permuted = (np.outer(hashes, self._a) + self._b) % _MERSENNE_PRIME & _MAX_HASH
+        return permuted.min(axis=0)
+
+    def query(self, signature: np.ndarray, exclude: Iterable[str] = ()) -> Optional[Tuple[str, float]]:
+        """
+        Find the indexed page most similar to a signature.
+
+        Returns:
+            (page id, estimated similarity) of the best match at or above the
+            threshold, or None
+        """
+        buckets = self.buckets(signature)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT DISTINCT s.page_id, s.signature FROM buckets b JOIN signatures s ON s.page_id = b.page_id "
+                f"WHERE b.bucket IN ({','.join('?' * len(buckets))})",
+                buckets,
+            ).fetchall()
+        excluded = set(exclude)
+        candidates = [
+            (page_id, np.frombuffer(blob, dtype=np.uint64)) for page_id, blob in rows if page_id not in excluded
+        ]
+        return self.best_match(signature, candidates)
+
+    def add(self, rows: Iterable[Tuple[str, Optional[str], np.ndarray]]) -> int:
+        """
+        Index (page id, filename, signature) rows as canonical pages.
+
+        Returns:
+            Number of pages written
+        """
+        rows = list(rows)
+        with self._lock:
+            self._delete_pages([page_id for page_id, _, _ in rows])
+            for page_id, filename, signature in rows:
+                self._insert(page_id, filename, signature)
+            self._conn.commit()
+        return len(rows)
+
+    def remove_documents(self, page_ids: Iterable[str]) -> None:
+        """Drop the signatures of the given pages."""
+        with self._lock:
+            self._delete_pages(list(page_ids))
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM signatures").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def buckets(self, signature: np.ndarray) -> List[int]:
+        """LSH bucket of each band of a signature."""
+        buckets = []
+        for band in range(self.bands):
+            digest = hashlib.blake2b(
+                band.to_bytes(2, "little") + signature[band * self.rows:(band + 1) * self.rows].tobytes(),
+                digest_size=8,
+            ).digest()
+            buckets.append(int.from_bytes(digest, "little", signed=True))
+        return buckets
+
+    def best_match(
+        self, signature: np.ndarray, candidates: List[Tuple[str, np.ndarray]]
+    ) -> Optional[Tuple[str, float]]:
+        """The most similar (page id, signature) candidate at or above the threshold."""
+        best = None
+        for page_id, other in candidates:
+            similarity = float(np.mean(signature == other))
+            if similarity >= self.threshold and (best is None or similarity > best[1]):
+                best = (page_id, similarity)
+        return best
+
+    def _insert(self, page_id: str, filename: Optional[str], signature: np.ndarray) -> None:
+        self._conn.execute(
+            "INSERT INTO signatures (page_id, filename, signature) VALUES (?, ?, ?)",
+            (page_id, filename, signature.astype(np.uint64).tobytes()),
+        )
+        self._conn.executemany(
+            "INSERT INTO buckets (bucket, page_id) VALUES (?, ?)",
+            [(bucket, page_id) for bucket in self.buckets(signature)],
+        )
+
+    def _delete_pages(self, page_ids: List[str]) -> None:
+        # SQLite caps bound parameters, so delete in slices.
+        for start in range(0, len(page_ids), 500):
+            batch = page_ids[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            self._conn.execute(f"DELETE FROM buckets WHERE page_id IN ({placeholders})", batch)
+            self._conn.execute(f"DELETE FROM signatures WHERE page_id IN ({placeholders})", batch)
+
+    def _check_layout(self) -> None:
+        """Reset signatures of a different width and re-bucket them after a threshold change."""
+        meta = dict(self._conn.execute("SELECT key, value FROM meta").fetchall())
+        if meta.get("num_perm", str(self.num_perm)) != str(self.num_perm) or meta.get(
+            "shingle_size", str(self.shingle_size)
+        ) != str(self.shingle_size):
+            print("Near-duplicate signature settings changed, clearing the signature index")
+            self._conn.execute("DELETE FROM signatures")
+            self._conn.execute("DELETE FROM buckets")
+        elif meta.get("bands", str(self.bands)) != str(self.bands):
+            rows = self._conn.execute("SELECT page_id, filename, signature FROM signatures").fetchall()
+            self._conn.execute("DELETE FROM signatures")
+            self._conn.execute("DELETE FROM buckets")
+            for page_id, filename, blob in rows:
+                self._insert(page_id, filename, np.frombuffer(blob, dtype=np.uint64))
+            print(f"Re-bucketed {len(rows)} near-duplicate signatures for threshold {self.threshold}")
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+            [
+                ("num_perm", str(self.num_perm)),
+                ("shingle_size", str(self.shingle_size)),
+                ("bands", str(self.bands)),
+            ],
+        )
+
+
+class DuplicateFilter:
+    """
+    Splits a batch of pages into canonical pages and near-duplicates.
+
+    A page is a duplicate when it matches a page already in the index or an
+    earlier page of the same batch. Canonical pages are only added to the
+    index by ``commit``, once they have been ingested, so a failed ingest
+    never leaves the index pointing at pages that are not in the graph.
+    """
+
+    def __init__(self, index: NearDuplicateIndex, min_words: int = 20):
+        self.index = index
+        self.min_words = min_words
+        self._pending: List[Tuple[str, Optional[str], np.ndarray]] = []
+
+    def filter(self, pages: List[Document]) -> Tuple[List[Document], List[NearDuplicate]]:
+        """
+        Returns:
+            Tuple of (pages to ingest, duplicates to link to their canonical page)
+        """
+        unique: List[Document] = []
+        duplicates: List[NearDuplicate] = []
+        batch_buckets: Dict[int, List[Tuple[str, np.ndarray]]] = {}
+        with span("dedupe", pages=len(pages)) as dedupe_span:
+            for page in pages:
+                # Short pages shingle poorly and are cheap to process anyway
+                if len(_TERM.findall(page.text)) < self.min_words:
+                    unique.append(page)
+                    continue
+                signature = self.index.signature(page.text)
+                buckets = self.index.buckets(signature)
+                in_batch = {
+                    page_id: other
+                    for bucket in buckets
+                    for page_id, other in batch_buckets.get(bucket, [])
+                }
+                match = self.index.best_match(signature, list(in_batch.items()))
+                if match is None:
+                    match = self.index.query(signature, exclude=[page.id_])
+                if match is not None:
+                    duplicates.append((page, match[0], match[1]))
+                    continue
+                unique.append(page)
+                self._pending.append((page.id_, page.metadata.get("filename"), signature))
+                for bucket in buckets:
+                    batch_buckets.setdefault(bucket, []).append((page.id_, signature))
+            dedupe_span.add("duplicates", len(duplicates))
+        if duplicates:
+            print(f"Skipping {len(duplicates)} near-duplicate pages of {len(pages)}")
+        return unique, duplicates
+
+    def commit(self) -> int:
+        """Index the canonical pages of the filtered batches."""
+        pending, self._pending = self._pending, []
+        return self.index.add(pending)
+
+
+def link_duplicates(graph_store: PropertyGraphStore, duplicates: List[NearDuplicate]) -> None:
+    """
+    Store near-duplicate pages without extracting them again.
+
+    Each duplicate becomes one chunk node holding its text and page metadata,
+    but no embedding, and is linked with a ``DUPLICATE_OF`` relation to
+    every chunk of its canonical page. The node carries the page's
+    ``page_hash``, so unchanged duplicates are skipped on re-ingest like any
+    other page. When the canonical page is changed or deleted,
+    ``IncrementalUpdater.plan`` re-extracts its duplicates in the same
+    ingest, whichever file they belong to, and the first of them becomes
+    canonical when its signature is committed.
+    """
+    if not duplicates:
+        return
+    canonical_chunks: Dict[str, List[str]] = {}
+    for canonical_id in {canonical_id for _, canonical_id, _ in duplicates}:
+        canonical_chunks[canonical_id] = [
+            node.id
+            for node in graph_store.get(properties={"ref_doc_id": canonical_id})
+            if isinstance(node, ChunkNode)
+        ]
+
+    nodes = []
+    relations = []
+    for page, canonical_id, similarity in duplicates:
+        chunk_id = f"{page.id_}::duplicate"
+        nodes.append(
+            ChunkNode(
+                id_=chunk_id,
+                text=page.text,
+                properties={
+                    **page.metadata,
+                    "ref_doc_id": page.id_,
+                    "duplicate_of": canonical_id,
+                    "duplicate_similarity": similarity,
+                },
+            )
+        )
+        relations.extend(
+            Relation(
+                label=DUPLICATE_OF,
+                source_id=chunk_id,
+                target_id=target_id,
+                properties={"similarity": similarity},
+            )
+            for target_id in canonical_chunks[canonical_id]
+        )
+    graph_store.upsert_nodes(nodes)
+    graph_store.upsert_relations(relations)
+    print(f"Linked {len(nodes)} near-duplicate pages to {len(canonical_chunks)} canonical pages")
@@ -0,0 +1,154 @@
+import asyncio
+import hashlib
+import math
+import re
+import time
+from typing import Any, List
+
+from pydantic import Field
+from llama_index.core.base.llms.types import (
+    CompletionResponse,
+    CompletionResponseGen,
+    LLMMetadata,
+)
+from llama_index.core.embeddings import BaseEmbedding
+from llama_index.core.graph_stores import SimplePropertyGraphStore
+from llama_index.core.graph_stores.types import LabelledNode, Relation
+from llama_index.core.llms import CustomLLM
+from llama_index.core.llms.callbacks import llm_completion_callback
+
+from core.metrics import span
+
+# Extraction prompts end with "Text: <chunk>" followed by an output marker line
+_OUTPUT_MARKER = re.compile(r"\n[^\n]*:\s*$")
+_WORD = re.compile(r"[A-Za-z][A-Za-z0-9]{2,}")
+
+_PREDICATES = ["relates to", "is part of", "depends on", "mentions", "describes"]
+
+
+class FakeLLM(CustomLLM):
+    """
+    Deterministic stand-in for the extraction LLM.
+
+    Completions are canned ``(subject, predicate, object)`` triplets built
+    from the words of the prompt's ``Text:`` section, so the same chunk
+    always yields the same triplets. ``latency`` seconds are spent per call
+    to mimic a remote model.
+    """
+
+    model_name: str = Field(default="fake-llm", description="Model name reported in metadata.")
+    latency: float = Field(default=0.0, description="Seconds to wait per completion.", ge=0)
+    max_triplets: int = Field(default=5, description="Triplets returned per completion.", gt=0)
+    context_window: int = Field(default=128_000, description="Reported context window.")
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "FakeLLM"
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        return LLMMetadata(
+            context_window=self.context_window,
+            num_output=256,
+            model_name=self.model_name,
+        )
+
+    @llm_completion_callback()
+    def complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        if self.latency:
+            time.sleep(self.latency)
+        return CompletionResponse(text=self._triplets(prompt))
+
+    @llm_completion_callback()
+    async def acomplete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return CompletionResponse(text=self._triplets(prompt))
+
+    @llm_completion_callback()
+    def stream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponseGen:
+        response = self.complete(prompt, formatted=formatted, **kwargs)
+        yield CompletionResponse(text=response.text, delta=response.text)
+
+    def _triplets(self, prompt: str) -> str:
+        sections = prompt.split("Text:")
+        text = _OUTPUT_MARKER.sub("", sections[-1]) if len(sections) > 1 else prompt
+        words = list(dict.fromkeys(word.lower() for word in _WORD.findall(text)))
+        lines = []
+        for i in range(min(self.max_triplets, len(words) - 1)):
+            subject, obj = words[i], words[-(i + 1)]
+            if subject == obj:
+                break
+            predicate = _PREDICATES[int(hashlib.md5(subject.encode("utf-8")).hexdigest(), 16) % len(_PREDICATES)]
+            lines.append(f"({subject}, {predicate}, {obj})")
+        return "\n".join(lines)
+
+
+class HashEmbedding(BaseEmbedding):
+    """
+    Deterministic stand-in for the embedding model.
+
+    Each word is hashed into one of ``dimensions`` signed buckets and the
+    result is L2-normalized, so texts sharing vocabulary land close together
+    and identical texts always get identical vectors. ``latency`` seconds are
+    spent per request (single text or batch) to mimic a remote model.
+    """
+
+    dimensions: int = Field(default=256, description="Embedding dimensionality.", gt=0)
+    latency: float = Field(default=0.0, description="Seconds to wait per request.", ge=0)
+
+    def __init__(self, **kwargs: Any):
+        kwargs.setdefault("model_name", "hash-embedding")
+        super().__init__(**kwargs)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "HashEmbedding"
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.dimensions
+        for word in _WORD.findall(text.lower()):
+            digest = hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dimensions
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+        return [value / norm for value in vector]
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._get_text_embeddings([query])[0]
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return (await self._aget_text_embeddings([query]))[0]
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._get_text_embeddings([text])[0]
+
+    async def _aget_text_embedding(self, text: str) -> List[float]:
+        return (await self._aget_text_embeddings([text]))[0]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        if self.latency:
+            time.sleep(self.latency)
+        return [self._embed(text) for text in texts]
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return [self._embed(text) for text in texts]
+
+
+class OfflineGraphStore(SimplePropertyGraphStore):
+    """SimplePropertyGraphStore whose writes are timed as ``graph_write`` spans, like the Neo4j store's."""
+
+    def upsert_nodes(self, nodes: List[LabelledNode]) -> None:
+        with span("graph_write", nodes=len(nodes)):
+            super().upsert_nodes(nodes)
+
+    def upsert_relations(self, relations: List[Relation]) -> None:
+        with span("graph_write", triplets=len(relations)):
+            super().upsert_relations(relations)
+
+
+def create_offline_graph_store() -> SimplePropertyGraphStore:
+    """In-memory property graph store standing in for Neo4j."""
+    return OfflineGraphStore()
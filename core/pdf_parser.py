@@ -0,0 +1,133 @@
+import asyncio
+import atexit
+import math
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import List, Optional, Union
+
+try:
+    from pypdf import PdfReader
+except ImportError:  # pragma: no cover - optional local PDF extraction
+    PdfReader = None
+
+# Fewer pages than this per task costs more in re-opening the file than it saves
+MIN_PAGES_PER_TASK = 8
+
+_pool: Optional[ProcessPoolExecutor] = None
+# Worker count of ``_pool``, recorded when it is created
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def local_pdf_parsing_available() -> bool:
+    return PdfReader is not None
+
+
+class ParseSlots:
+    """
+    Process-wide bound on concurrent remote parse jobs.
+
+    The ingestion service runs one event loop per message, so an
+    ``asyncio.Semaphore`` (bound to a single loop) cannot cap parses across
+    them; this wraps a thread semaphore behind an async context manager.
+    Waiters poll the semaphore from their own loop with a capped backoff
+    rather than blocking an executor thread each, so a backlog of parses
+    cannot exhaust the default executor.
+    """
+
+    def __init__(self, limit: int, poll_interval: float = 0.01, max_poll_interval: float = 0.1):
+        self.limit = limit
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self._semaphore = threading.BoundedSemaphore(limit)
+
+    async def __aenter__(self) -> "ParseSlots":
+        delay = self.poll_interval
+        while not self._semaphore.acquire(blocking=False):
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_poll_interval)
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self._semaphore.release()
+
+
+_parse_slots: Optional[ParseSlots] = None
+
+
+def get_parse_slots(limit: int) -> ParseSlots:
+    """Shared ``ParseSlots``; the limit of the first caller wins."""
+    global _parse_slots
+    with _pool_lock:
+        if _parse_slots is None:
+            _parse_slots = ParseSlots(limit)
+        return _parse_slots
+
+
+def get_pdf_pool(max_workers: Optional[int] = None) -> ProcessPoolExecutor:
+    """Shared process pool for local PDF extraction, created on first use."""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None:
+            _pool_workers = max_workers or os.cpu_count() or 1
+            # Spawned workers start a fresh interpreter, which re-imports the
+            # parent's __main__ (minus its __main__-guarded code) before this
+            # module, but never inherits the parent's driver or executor threads
+            # mid-operation as forked ones would
+            _pool = ProcessPoolExecutor(
+                max_workers=_pool_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def shutdown_pdf_pool() -> None:
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+atexit.register(shutdown_pdf_pool)
+
+
+def _count_pages(path: str) -> int:
+    return len(PdfReader(path).pages)
+
+
+def _extract_pages(path: str, start: int, stop: int) -> List[str]:
+    reader = PdfReader(path)
+    return [(reader.pages[i].extract_text() or "") for i in range(start, stop)]
+
+
+async def extract_pdf_pages(path: Union[str, Path], max_workers: Optional[int] = None) -> List[str]:
+    """
+    Extract the text of every page of a PDF in the shared process pool.
+
+    The page range is split into one task per worker (at least
+    ``MIN_PAGES_PER_TASK`` pages each) so large files use every core, and
+    tasks from concurrently parsed files interleave on the same pool.
+
+    Returns:
+        One text per page, in page order
+    """
+    if PdfReader is None:
+        raise RuntimeError("pypdf is required for local PDF extraction")
+    loop = asyncio.get_running_loop()
+    pool = get_pdf_pool(max_workers)
+    path = str(path)
+
+    page_count = await loop.run_in_executor(pool, _count_pages, path)
+    if page_count == 0:
+        return []
+    workers = _pool_workers or 1
+    per_task = max(MIN_PAGES_PER_TASK, math.ceil(page_count / workers))
+    ranges = [(start, min(start + per_task, page_count)) for start in range(0, page_count, per_task)]
+    parts = await asyncio.gather(
+        *(loop.run_in_executor(pool, _extract_pages, path, start, stop) for start, stop in ranges)
+    )
+    return [text for part in parts for text in part]
@@ -0,0 +1,216 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from llama_index.core.graph_stores.types import PropertyGraphStore
+from llama_index.core.schema import NodeWithScore
+from llama_index.graph_stores.neo4j import Neo4jPGStore
+
+from config.settings import get_config, ComponentsConfig
+from core.cache import content_hash, normalize_text
+
+# Fallback counters for stores without a shared backend, keyed by id(graph_store)
+_local_generations: Dict[int, int] = {}
+_local_generations_lock = threading.Lock()
+
+
+class GraphGeneration:
+    """
+    Counter of committed graph writes, used to invalidate cached query results.
+
+    For Neo4j the counter lives on a ``__Meta__`` node so that the ingestion
+    worker and API processes agree on it; other stores use an in-process
+    counter. Reads are cached for ``check_interval`` seconds so the counter
+    does not add a round trip to every query.
+    """
+
+    def __init__(self, graph_store: PropertyGraphStore, check_interval: float = 1.0):
+        self.graph_store = graph_store
+        self.check_interval = check_interval
+        self._value = 0
+        self._checked_at: Optional[float] = None
+
+    def current(self) -> int:
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.check_interval:
+            return self._value
+        if isinstance(self.graph_store, Neo4jPGStore):
+            rows = self.graph_store.structured_query(
+                "MATCH (m:__Meta__ {key: 'graph'}) RETURN m.generation AS generation"
+            )
+            self._value = rows[0]["generation"] if rows else 0
+        else:
+            with _local_generations_lock:
+                self._value = _local_generations.get(id(self.graph_store), 0)
+        self._checked_at = now
+        return self._value
+
+    async def acurrent(self) -> int:
+        """Like ``current``, without blocking the event loop when the counter has to be re-read."""
+        if self._checked_at is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return self._value
+        return await asyncio.to_thread(self.current)
+
+    def bump(self) -> int:
+        """Record a committed write; call after each successful ingest."""
+        if isinstance(self.graph_store, Neo4jPGStore):
+            rows = self.graph_store.structured_query(
+                """
+                MERGE (m:__Meta__ {key: 'graph'})
+                SET m.generation = coalesce(m.generation, 0) + 1
+                RETURN m.generation AS generation
+                """
+            )
+            self._value = rows[0]["generation"]
+        else:
+            with _local_generations_lock:
+                self._value = _local_generations.get(id(self.graph_store), 0) + 1
+                _local_generations[id(self.graph_store)] = self._value
+        self._checked_at = time.monotonic()
+        return self._value
+
+
+def bump_graph_generation(graph_store: PropertyGraphStore) -> int:
+    """Invalidate cached query results for a graph after writing to it."""
+    return GraphGeneration(graph_store).bump()
+
+
+class QueryResultCache:
+    """
+    TTL + LRU cache of retrieval results, scoped to a generation.
+
+    Entries are keyed by the normalized query and the retrieval parameters.
+    The generation is any hashable value that changes whenever answers may
+    change: the graph generation, plus the versions of the derived indexes
+    retrieval reads. When it changes, every entry is dropped. In semantic
+    mode (``semantic_threshold`` > 0) a lookup that misses exactly can be
+    served by an entry with the same parameters whose query embedding has at
+    least that cosine similarity. Cached result lists are shared between
+    callers and must not be mutated.
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl_seconds: float = 300.0, semantic_threshold: float = 0.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.semantic_threshold = semantic_threshold
+        self._lock = threading.Lock()
+        # key -> (params key, expires at, unit query embedding or None, results)
+        self._entries: "OrderedDict[str, Tuple[str, float, Optional[np.ndarray], List[NodeWithScore]]]" = OrderedDict()
+        self._generation: Optional[Hashable] = None
+        self._hits = 0
+        self._semantic_hits = 0
+        self._misses = 0
+
+    @property
+    def semantic(self) -> bool:
+        return self.semantic_threshold > 0
+
+    @staticmethod
+    def params_key(similarity_top_k: int, path_depth: int, include_text: bool) -> str:
+        return content_hash(similarity_top_k, path_depth, include_text)
+
+    @staticmethod
+    def key(query: str, params_key: str) -> str:
+        return content_hash(normalize_text(query), params_key)
+
+    def get(self, key: str, generation: Hashable) -> Optional[List[NodeWithScore]]:
+        with self._lock:
+            self._check_generation(generation)
+            entry = self._entries.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                if not self.semantic:
+                    self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry[3]
+
+    def get_similar(
+        self, embedding: Sequence[float], params_key: str, generation: Hashable
+    ) -> Optional[List[NodeWithScore]]:
+        """Find results for a near-duplicate query; call after ``get`` missed."""
+        query = _unit(embedding)
+        with self._lock:
+            self._check_generation(generation)
+            now = time.monotonic()
+            best_key, best_score = None, self.semantic_threshold
+            for key, (entry_params, expires_at, entry_embedding, _) in self._entries.items():
+                if entry_params != params_key or expires_at < now or entry_embedding is None:
+                    continue
+                score = float(np.dot(entry_embedding, query))
+                if score >= best_score:
+                    best_key, best_score = key, score
+            if best_key is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(best_key)
+            self._semantic_hits += 1
+            return self._entries[best_key][3]
+
+    def put(
+        self,
+        key: str,
+        params_key: str,
+        generation: Hashable,
+        results: List[NodeWithScore],
+        embedding: Optional[Sequence[float]] = None,
+    ) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._check_generation(generation)
+            unit = _unit(embedding) if self.semantic and embedding is not None else None
+            self._entries[key] = (params_key, time.monotonic() + self.ttl_seconds, unit, results)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._semantic_hits + self._misses
+            return {
+                "hits": self._hits,
+                "semantic_hits": self._semantic_hits,
+                "misses": self._misses,
+                "hit_rate": (self._hits + self._semantic_hits) / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "generation": self._generation,
+            }
+
+    def _check_generation(self, generation: Hashable) -> None:
+        if generation != self._generation:
+            self._entries.clear()
+            self._generation = generation
+
+
+def _unit(embedding: Sequence[float]) -> np.ndarray:
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+_query_cache: Optional[QueryResultCache] = None
+_query_cache_lock = threading.Lock()
+
+
+def get_query_cache(config: Optional[ComponentsConfig] = None) -> QueryResultCache:
+    """Get the process-wide query result cache."""
+    global _query_cache
+    config = config or get_config()
+    with _query_cache_lock:
+        if _query_cache is None:
+            _query_cache = QueryResultCache(
+                max_entries=config.query_cache_max_entries,
+                ttl_seconds=config.query_cache_ttl_seconds,
+                semantic_threshold=config.query_cache_semantic_threshold,
+            )
+        return _query_cache
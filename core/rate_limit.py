@@ -0,0 +1,165 @@
+import asyncio
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+from config.settings import ComponentsConfig, get_config
+from core.metrics import RATE_LIMIT_WAIT
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+# Theoretical arrival times of the request and token limits, in wall-clock seconds
+_STATE = struct.Struct("<dd")
+
+
+def estimate_tokens(text: str) -> int:
+    """Length heuristic for costing requests before they are sent."""
+    return len(text) // 4 + 1
+
+
+class RateLimiter:
+    """
+    Requests-per-minute plus tokens-per-minute governor for a model provider.
+
+    Both limits are enforced with the generic cell rate algorithm: every
+    call reserves its slot up front (one request, plus its token cost) and
+    then sleeps until that slot, so concurrent callers are spread evenly at
+    the configured rates instead of bursting into 429s. Up to
+    ``burst_seconds`` of unused capacity can be spent at once. A call that
+    costs more tokens than that is let through and delays the calls after it.
+
+    With ``state_path`` the two arrival times live in a small file guarded by
+    ``flock``, so every process on the host that points at the same file
+    shares one budget.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        requests_per_minute: float = 0,
+        tokens_per_minute: float = 0,
+        burst_seconds: float = 1.0,
+        state_path: Optional[Union[str, Path]] = None,
+    ):
+        self.name = name
+        self.requests_per_second = requests_per_minute / 60.0
+        self.tokens_per_second = tokens_per_minute / 60.0
+        self.burst_seconds = burst_seconds
+        self.state_path = Path(state_path) if state_path is not None else None
+        self._lock = threading.Lock()
+        self._state = (0.0, 0.0)
+        self._fd: Optional[int] = None
+        if self.state_path is not None:
+            self.state_path.parent.mkdir(parents=True, exist_ok=True)
+            self._fd = os.open(self.state_path, os.O_RDWR | os.O_CREAT, 0o644)
+
+    def reserve(self, tokens: int = 0) -> float:
+        """
+        Reserve a call costing ``tokens``.
+
+        Returns:
+            Seconds to wait before making the call
+        """
+        with self._lock, self._shared_state() as state:
+            now = time.time()
+            request_tat, token_tat = state
+            start = now
+            if self.requests_per_second > 0:
+                start = max(start, request_tat - self.burst_seconds)
+            if self.tokens_per_second > 0 and tokens > 0:
+                start = max(start, token_tat - self.burst_seconds)
+            if self.requests_per_second > 0:
+                request_tat = max(request_tat, start) + 1.0 / self.requests_per_second
+            if self.tokens_per_second > 0 and tokens > 0:
+                token_tat = max(token_tat, start) + tokens / self.tokens_per_second
+            state[:] = [request_tat, token_tat]
+        return start - now
+
+    async def acquire(self, tokens: int = 0) -> None:
+        delay = self.reserve(tokens)
+        RATE_LIMIT_WAIT.observe(delay, limiter=self.name)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def acquire_sync(self, tokens: int = 0) -> None:
+        delay = self.reserve(tokens)
+        RATE_LIMIT_WAIT.observe(delay, limiter=self.name)
+        if delay > 0:
+            time.sleep(delay)
+
+    def pause(self, seconds: float) -> None:
+        """Hold every caller back for ``seconds``, e.g. after the provider answered 429."""
+        with self._lock, self._shared_state() as state:
+            resume = time.time() + seconds + self.burst_seconds
+            state[:] = [max(state[0], resume), max(state[1], resume)]
+
+    def close(self) -> None:
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+
+    @contextmanager
+    def _shared_state(self) -> Iterator[List[float]]:
+        """Read-modify-write of the arrival times, under ``flock`` when they are shared."""
+        if self._fd is None:
+            state = list(self._state)
+            yield state
+            self._state = (state[0], state[1])
+            return
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            raw = os.pread(self._fd, _STATE.size, 0)
+            state = list(_STATE.unpack(raw)) if len(raw) == _STATE.size else [0.0, 0.0]
+            yield state
+            os.pwrite(self._fd, _STATE.pack(*state), 0)
+        finally:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+
+_limiters: Dict[Tuple[str, str], Optional[RateLimiter]] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(kind: str, config: Optional[ComponentsConfig] = None) -> Optional[RateLimiter]:
+    """
+    Process-wide limiter for "llm" or "embedding" calls, or None when neither of its limits is set.
+
+    With ``rate_limit_shared`` the limiter's state lives under
+    ``<storage_dir>/rate_limits`` and is shared with every process using the
+    same storage directory.
+    """
+    config = config or get_config()
+    if kind == "llm":
+        rpm, tpm = config.llm_requests_per_minute, config.llm_tokens_per_minute
+    elif kind == "embedding":
+        rpm, tpm = config.embed_requests_per_minute, config.embed_tokens_per_minute
+    else:
+        raise ValueError(f"Unknown rate limiter kind: {kind}")
+
+    key = (kind, str(Path(config.storage_dir).resolve()))
+    with _limiters_lock:
+        if key not in _limiters:
+            limiter = None
+            if rpm > 0 or tpm > 0:
+                state_path = None
+                if config.rate_limit_shared:
+                    state_path = Path(config.storage_dir) / "rate_limits" / f"{kind}.state"
+                limiter = RateLimiter(
+                    kind,
+                    requests_per_minute=rpm,
+                    tokens_per_minute=tpm,
+                    burst_seconds=config.rate_limit_burst_seconds,
+                    state_path=state_path,
+                )
+            _limiters[key] = limiter
+        return _limiters[key]
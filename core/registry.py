@@ -0,0 +1,301 @@
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from llama_index.core.embeddings import BaseEmbedding
+from llama_index.core.llms import LLM
+from llama_index.llms.openai import OpenAI
+
+from config.settings import get_config, ComponentsConfig
+from core.adjacency import AdjacencyRefresher, AdjacencySnapshot
+from core.embeddings import EmbeddingManager
+from core.graph_store import BulkNeo4jPGStore
+from core.keyword_index import KeywordIndex, iter_graph_chunks, rows_from_chunk_upserts
+from core.near_duplicates import NearDuplicateIndex
+from core.vector_index import LocalVectorIndex, VectorIndexRefresher, CHUNK, ENTITY, rows_from_upserts
+
+
+class ClientRegistry:
+    """
+    Process-wide registry of shared model and graph store clients.
+
+    The LLM, embedding model, Neo4j graph store and (when enabled) the local
+    vector index, adjacency snapshot, keyword index and near-duplicate index are created lazily on first use and reused by every ingest
+    job and retriever in the process, so their HTTP clients, driver
+    connection pools and schema bootstrap are paid for once. The graph store is health-checked at most every
+    ``health_check_interval`` seconds and rebuilt if the check fails. A
+    replaced store is not closed under the ingests and queries still holding
+    it; its driver is closed once the last of them lets go.
+    """
+
+    def __init__(self, config: Optional[ComponentsConfig] = None, health_check_interval: float = 30.0):
+        self.config = config or get_config()
+        self.health_check_interval = health_check_interval
+        self._lock = threading.RLock()
+        self._llm: Optional[LLM] = None
+        self._embed_model: Optional[BaseEmbedding] = None
+        self._graph_store: Optional[BulkNeo4jPGStore] = None
+        self._graph_store_checked_at = 0.0
+        self._vector_index: Optional[LocalVectorIndex] = None
+        self._vector_index_refresher: Optional[VectorIndexRefresher] = None
+        self._adjacency: Optional[AdjacencySnapshot] = None
+        self._adjacency_refresher: Optional[AdjacencyRefresher] = None
+        self._keyword_index: Optional[KeywordIndex] = None
+        self._near_duplicate_index: Optional[NearDuplicateIndex] = None
+
+    @property
+    def llm(self) -> LLM:
+        """Get or create the shared LLM."""
+        with self._lock:
+            if self._llm is None:
+                self._llm = self._create_llm()
+            return self._llm
+
+    @property
+    def embed_model(self) -> BaseEmbedding:
+        """Get or create the shared embedding model."""
+        with self._lock:
+            if self._embed_model is None:
+                self._embed_model = EmbeddingManager(self.config).embedding_model
+            return self._embed_model
+
+    @property
+    def graph_store(self) -> BulkNeo4jPGStore:
+        """Get or create the shared graph store, reconnecting if it has gone unhealthy."""
+        with self._lock:
+            if self._graph_store is not None and self._graph_store_due_for_check():
+                if not self._graph_store_healthy():
+                    print("Neo4j health check failed, reconnecting")
+                    self.reset("graph_store")
+            if self._graph_store is None:
+                self._graph_store = self._create_graph_store()
+                self._graph_store_checked_at = time.monotonic()
+                if self.config.local_vector_index:
+                    self._attach_vector_index(self._graph_store)
+                if self.config.adjacency_snapshot:
+                    self._attach_adjacency(self._graph_store)
+                if self._keyword_index_enabled():
+                    self._attach_keyword_index(self._graph_store)
+            return self._graph_store
+
+    @property
+    def vector_index(self) -> Optional[LocalVectorIndex]:
+        """Get the shared local vector index, or None if it is disabled."""
+        if not self.config.local_vector_index:
+            return None
+        with self._lock:
+            if self._vector_index is None:
+                self._vector_index = LocalVectorIndex(
+                    Path(self.config.storage_dir) / "vector_index",
+                    dtype=self.config.vector_index_dtype,
+                )
+            return self._vector_index
+
+    @property
+    def adjacency(self) -> Optional[AdjacencySnapshot]:
+        """Get the shared adjacency snapshot, or None if it is disabled."""
+        if not self.config.adjacency_snapshot:
+            return None
+        with self._lock:
+            if self._adjacency is None:
+                self._adjacency = AdjacencySnapshot(
+                    Path(self.config.storage_dir) / "adjacency",
+                    max_fanout=self.config.adjacency_max_fanout,
+                    hot_entities=self.config.adjacency_hot_entities,
+                )
+            return self._adjacency
+
+    @property
+    def keyword_index(self) -> Optional[KeywordIndex]:
+        """Get the shared keyword index, or None if it is disabled."""
+        if not self._keyword_index_enabled():
+            return None
+        with self._lock:
+            if self._keyword_index is None:
+                if not self.config.keyword_index:
+                    print("RETRIEVAL_STRATEGY=hybrid needs the keyword index; enabling it")
+                self._keyword_index = KeywordIndex(Path(self.config.storage_dir) / "keyword_index.db")
+            return self._keyword_index
+
+    @property
+    def near_duplicate_index(self) -> Optional[NearDuplicateIndex]:
+        """Get the shared near-duplicate page index, or None if detection is disabled."""
+        if not self.config.near_duplicate_detection:
+            return None
+        with self._lock:
+            if self._near_duplicate_index is None:
+                self._near_duplicate_index = NearDuplicateIndex(
+                    Path(self.config.storage_dir) / "near_duplicates.db",
+                    threshold=self.config.near_duplicate_threshold,
+                    num_perm=self.config.near_duplicate_num_perm,
+                )
+            return self._near_duplicate_index
+
+    def check_health(self) -> Dict[str, Any]:
+        """
+        Report the state of each client.
+
+        Returns:
+            Dictionary with an entry per client; the graph store is actively pinged
+        """
+        with self._lock:
+            graph_store_status = "not_initialized"
+            if self._graph_store is not None:
+                graph_store_status = "healthy" if self._graph_store_healthy() else "unhealthy"
+            return {
+                "llm": "initialized" if self._llm is not None else "not_initialized",
+                "embed_model": "initialized" if self._embed_model is not None else "not_initialized",
+                "graph_store": graph_store_status,
+            }
+
+    def reset(self, name: Optional[str] = None) -> None:
+        """
+        Drop one client (or all of them) so the next access rebuilds it.
+
+        Args:
+            name: One of "llm", "embed_model", "graph_store". If None, resets all.
+        """
+        with self._lock:
+            if name in (None, "graph_store") and self._graph_store is not None:
+                # Not closed here: in-flight ingests and queries may still hold it. Neo4jPGStore
+                # closes its driver (and our read pool) when the last reference is dropped.
+                self._graph_store = None
+            if name in (None, "llm"):
+                self._llm = None
+            if name in (None, "embed_model"):
+                self._embed_model = None
+
+    def close(self) -> None:
+        with self._lock:
+            if self._graph_store is not None:
+                try:
+                    self._graph_store.close()
+                except Exception as e:
+                    print(f"Error closing Neo4j driver: {e}")
+                self._graph_store = None
+        self.reset()
+        with self._lock:
+            if self._vector_index_refresher is not None:
+                self._vector_index_refresher.stop()
+                self._vector_index_refresher = None
+            if self._adjacency_refresher is not None:
+                self._adjacency_refresher.stop()
+                self._adjacency_refresher = None
+            if self._keyword_index is not None:
+                self._keyword_index.close()
+                self._keyword_index = None
+            if self._near_duplicate_index is not None:
+                self._near_duplicate_index.close()
+                self._near_duplicate_index = None
+
+    def _attach_vector_index(self, graph_store: BulkNeo4jPGStore) -> None:
+        """Keep the local vector index in step with everything written through the graph store."""
+        if self._vector_index_refresher is None:
+            self._vector_index_refresher = VectorIndexRefresher(
+                self.vector_index, graph_store, rebuild_every=self.config.vector_index_rebuild_every
+            )
+        else:
+            self._vector_index_refresher.graph_store = graph_store
+        refresher = self._vector_index_refresher
+        graph_store.add_write_listener(
+            lambda chunk_rows, entity_rows: refresher.submit(
+                rows_from_upserts(entity_rows, ENTITY) + rows_from_upserts(chunk_rows, CHUNK)
+            )
+        )
+        graph_store.add_delete_listener(refresher.remove)
+
+    def _attach_adjacency(self, graph_store: BulkNeo4jPGStore) -> None:
+        """Rebuild the adjacency snapshot in the background after writes through the graph store."""
+        if self._adjacency_refresher is None:
+            self._adjacency_refresher = AdjacencyRefresher(
+                self.adjacency, graph_store, min_interval=self.config.adjacency_rebuild_interval
+            )
+        else:
+            self._adjacency_refresher.graph_store = graph_store
+        refresher = self._adjacency_refresher
+        graph_store.add_write_listener(lambda chunk_rows, entity_rows: refresher.mark_stale())
+        graph_store.add_delete_listener(lambda node_ids: refresher.mark_stale())
+
+    def _keyword_index_enabled(self) -> bool:
+        # Hybrid retrieval has nothing to fuse without it
+        return self.config.keyword_index or self.config.retrieval_strategy == "hybrid"
+
+    def _attach_keyword_index(self, graph_store: BulkNeo4jPGStore) -> None:
+        """Index chunk text as it is written; backfill from the graph until a backfill has completed."""
+        keyword_index = self.keyword_index
+        graph_store.add_write_listener(
+            lambda chunk_rows, entity_rows: keyword_index.add(rows_from_chunk_upserts(chunk_rows))
+        )
+        if not keyword_index.backfilled:
+            threading.Thread(
+                target=lambda: keyword_index.backfill(iter_graph_chunks(graph_store)),
+                name="keyword-index-backfill",
+                daemon=True,
+            ).start()
+
+    def _graph_store_due_for_check(self) -> bool:
+        return time.monotonic() - self._graph_store_checked_at >= self.health_check_interval
+
+    def _graph_store_healthy(self) -> bool:
+        self._graph_store_checked_at = time.monotonic()
+        try:
+            self._graph_store.client.verify_connectivity()
+            return True
+        except Exception as e:
+            print(f"Neo4j health check error: {e}")
+            return False
+
+    def _create_llm(self) -> LLM:
+        """Create LLM instance from configuration."""
+        if not self.config.openai_api_key:
+            raise ValueError(
+                "OpenAI API key is required. Set OPENAI_API_KEY environment variable."
+            )
+
+        llm = OpenAI(
+            model=self.config.llm_model,
+            temperature=self.config.llm_temperature,
+            api_key=self.config.openai_api_key,
+        )
+
+        print(f"Created LLM: {self.config.llm_model}")
+        return llm
+
+    def _create_graph_store(self) -> BulkNeo4jPGStore:
+        """Create Neo4j graph store from configuration."""
+        neo4j_settings = self.config.get_neo4j_settings()
+
+        try:
+            graph_store = BulkNeo4jPGStore(
+                username=neo4j_settings["username"],
+                password=neo4j_settings["password"],
+                url=neo4j_settings["url"],
+                database=neo4j_settings.get("database", "neo4j"),
+                write_batch_size=neo4j_settings["write_batch_size"],
+                write_parallelism=neo4j_settings["write_parallelism"],
+                write_max_retries=neo4j_settings["write_max_retries"],
+                read_parallelism=neo4j_settings["read_parallelism"],
+                # Not at connect: PropertyGraphIndex requests a refresh after each insert, which
+                # the bulk store runs once per flush, and get_schema() loads it on first use
+                refresh_schema=False,
+            )
+
+            print(f"Connected to Neo4j at {neo4j_settings['url']}")
+            return graph_store
+        except Exception as e:
+            print(f"Failed to connect to Neo4j: {e}")
+            raise
+
+
+_registry: Optional[ClientRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_registry(config: Optional[ComponentsConfig] = None) -> ClientRegistry:
+    """Get the global client registry instance."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ClientRegistry(config)
+        return _registry
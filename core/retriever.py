@@ -1,9 +1,19 @@
+from llama_index.core.async_utils import asyncio_run
 from llama_index.core.schema import NodeWithScore, QueryBundle
 from llama_index.core import  PropertyGraphIndex
 from llama_index.core.embeddings import BaseEmbedding
-from llama_index.core.indices.property_graph import VectorContextRetriever
 from abc import ABC, abstractmethod
-from typing import List
+import asyncio
+from typing import Dict, List, Optional, Tuple
+from config.settings import get_config, ComponentsConfig
+from core.adjacency import AdjacencySnapshot
+from core.batch_retrieval import BatchVectorContextRetriever
+from core.embeddings import EmbeddingManager
+from core.keyword_index import KeywordIndex
+from core.metrics import span
+from core.query_cache import GraphGeneration, QueryResultCache, get_query_cache
+from core.registry import get_registry
+from core.vector_index import LocalVectorContextRetriever, LocalVectorIndex
 
 class RetrieverStrategy(ABC):
     """Abstract base class for retrieval strategies."""
@@ -13,6 +23,18 @@ class RetrieverStrategy(ABC):
         """Retrieve nodes for the given query."""
         pass
 
+    async def aretrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        """
+        Retrieve nodes for the given query without blocking the event loop.
+
+        Strategies without a native async path run ``retrieve`` in a worker thread.
+        """
+        return await asyncio.to_thread(self.retrieve, query_bundle)
+
+    async def abatch_retrieve(self, query_bundles: List[QueryBundle]) -> List[List[NodeWithScore]]:
+        """Retrieve nodes for several queries; by default they run concurrently one by one."""
+        return list(await asyncio.gather(*(self.aretrieve(bundle) for bundle in query_bundles)))
+
     @abstractmethod
     def get_strategy_name(self) -> str:
         """Get the name of the retrieval strategy."""
@@ -27,38 +49,307 @@ class KnowledgeGraphRetrieverStrategy(RetrieverStrategy):
         embed_model: BaseEmbedding,
         similarity_top_k: int = 2,
         path_depth: int = 1,
-        include_text: bool = True
+        include_text: bool = True,
+        config: Optional[ComponentsConfig] = None,
+        vector_index: Optional[LocalVectorIndex] = None,
+        query_cache: Optional[QueryResultCache] = None,
+        adjacency: Optional[AdjacencySnapshot] = None
     ):
+        self.config = config or get_config()
         self.kg_index = kg_index
-        self.embed_model = embed_model
+        self.embed_model = EmbeddingManager(self.config).with_cache(embed_model)
         self.similarity_top_k = similarity_top_k
         self.path_depth = path_depth
         self.include_text = include_text
+        self.vector_index = vector_index or get_registry(self.config).vector_index
+        self.adjacency = adjacency or get_registry(self.config).adjacency
+        self.query_cache = query_cache
+        if self.query_cache is None and self.config.query_cache_enabled:
+            self.query_cache = get_query_cache(self.config)
+        self.generation = GraphGeneration(
+            kg_index.property_graph_store,
+            check_interval=self.config.graph_generation_check_interval,
+        )
         self._retriever = None
+        self._retriever_is_local = False
 
     @property
     def retriever(self):
-        """Get or create knowledge graph retriever."""
-        if self._retriever is None:
-            self._retriever = VectorContextRetriever(
-                self.kg_index.property_graph_store,
+        """
+        Get or create knowledge graph retriever.
+
+        Re-created when the local vector index appears, so a process that
+        started before the index was first built switches over to it.
+        """
+        use_local = self.vector_index is not None and self.vector_index.exists()
+        if self._retriever is None or use_local != self._retriever_is_local:
+            kwargs = dict(
                 embed_model=self.embed_model,
                 similarity_top_k=self.similarity_top_k,
                 path_depth=self.path_depth,
                 include_text=self.include_text,
             )
+            if self.adjacency is not None:
+                # Multi-hop expansion runs in-process over the CSR snapshot; until one
+                # has been built, expand() finds nothing and the store expands everything
+                kwargs["adjacency"] = self.adjacency
+            if not self.kg_index.property_graph_store.supports_vector_queries:
+                # Embeddings live in the index's vector store rather than on graph nodes
+                kwargs["vector_store"] = self.kg_index.vector_store
+            self._retriever_is_local = use_local
+            if use_local:
+                # Vector lookups stay in-process; only graph expansion hits the store
+                self._retriever = LocalVectorContextRetriever(
+                    self.kg_index.property_graph_store, self.vector_index, **kwargs
+                )
+            else:
+                self._retriever = BatchVectorContextRetriever(self.kg_index.property_graph_store, **kwargs)
         return self._retriever
 
     def retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
-        """Retrieve nodes using knowledge graph traversal."""
+        """Retrieve nodes using knowledge graph traversal, serving repeats from the query cache."""
         try:
-            nodes = self.retriever.retrieve(query_bundle)
+            with span("retrieve", queries=1) as retrieve_span:
+                if self.query_cache is None:
+                    nodes = self.retriever.retrieve(query_bundle)
+                else:
+                    nodes = self._retrieve_cached(query_bundle)
+                retrieve_span.add("nodes", len(nodes))
             print(f"Knowledge graph retrieval returned {len(nodes)} nodes")
             return nodes
         except Exception as e:
             print(f"Knowledge graph retrieval failed: {str(e)}")
             return []
 
+    async def aretrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        """Async variant of ``retrieve``; embedding and graph queries run off the event loop."""
+        try:
+            with span("retrieve", queries=1) as retrieve_span:
+                if self.query_cache is None:
+                    nodes = await self.retriever.aretrieve(query_bundle)
+                else:
+                    nodes = await self._aretrieve_cached(query_bundle)
+                retrieve_span.add("nodes", len(nodes))
+            print(f"Knowledge graph retrieval returned {len(nodes)} nodes")
+            return nodes
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Knowledge graph retrieval failed: {str(e)}")
+            return []
+
+    async def _aretrieve_cached(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        generation = await self._acache_generation()
+        params_key = QueryResultCache.params_key(self.similarity_top_k, self.path_depth, self.include_text)
+        key = QueryResultCache.key(query_bundle.query_str, params_key)
+
+        nodes = self.query_cache.get(key, generation)
+        if nodes is not None:
+            return nodes
+        if self.query_cache.semantic:
+            if query_bundle.embedding is None:
+                query_bundle.embedding = await self.embed_model.aget_agg_embedding_from_queries(
+                    query_bundle.embedding_strs
+                )
+            nodes = self.query_cache.get_similar(query_bundle.embedding, params_key, generation)
+            if nodes is not None:
+                return nodes
+
+        nodes = await self.retriever.aretrieve(query_bundle)
+        self.query_cache.put(key, params_key, generation, nodes, embedding=query_bundle.embedding)
+        return nodes
+
+    async def abatch_retrieve(self, query_bundles: List[QueryBundle]) -> List[List[NodeWithScore]]:
+        """
+        Retrieve nodes for several queries with shared embedding, vector search and expansion.
+
+        Cached and repeated queries are answered without touching the retriever.
+        """
+        results: List[Optional[List[NodeWithScore]]] = [None] * len(query_bundles)
+        params_key = QueryResultCache.params_key(self.similarity_top_k, self.path_depth, self.include_text)
+        generation = await self._acache_generation() if self.query_cache is not None else None
+
+        # Identical queries in the batch are retrieved once
+        pending: Dict[str, List[int]] = {}
+        for position, bundle in enumerate(query_bundles):
+            key = QueryResultCache.key(bundle.query_str, params_key)
+            if self.query_cache is not None:
+                results[position] = self.query_cache.get(key, generation)
+            if results[position] is None:
+                pending.setdefault(key, []).append(position)
+
+        if pending and self.query_cache is not None and self.query_cache.semantic:
+            bundles = [query_bundles[positions[0]] for positions in pending.values()]
+            await self.retriever.aembed_queries(bundles)
+            for key, bundle in zip(list(pending), bundles):
+                nodes = self.query_cache.get_similar(bundle.embedding, params_key, generation)
+                if nodes is not None:
+                    for position in pending.pop(key):
+                        results[position] = nodes
+
+        if pending:
+            bundles = [query_bundles[positions[0]] for positions in pending.values()]
+            try:
+                with span("retrieve", queries=len(bundles)) as retrieve_span:
+                    batch = await self.retriever.abatch_retrieve(bundles)
+                    retrieve_span.add("nodes", sum(len(nodes) for nodes in batch))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Knowledge graph batch retrieval failed: {str(e)}")
+                batch = [[] for _ in bundles]
+            else:
+                if self.query_cache is not None:
+                    for key, bundle, nodes in zip(pending, bundles, batch):
+                        self.query_cache.put(key, params_key, generation, nodes, embedding=bundle.embedding)
+            for positions, nodes in zip(pending.values(), batch):
+                for position in positions:
+                    results[position] = nodes
+
+        print(f"Knowledge graph batch retrieval answered {len(query_bundles)} queries ({len(pending)} retrieved)")
+        return results
+
+    def _retrieve_cached(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        generation = self._cache_generation()
+        params_key = QueryResultCache.params_key(self.similarity_top_k, self.path_depth, self.include_text)
+        key = QueryResultCache.key(query_bundle.query_str, params_key)
+
+        nodes = self.query_cache.get(key, generation)
+        if nodes is not None:
+            return nodes
+        if self.query_cache.semantic:
+            if query_bundle.embedding is None:
+                # The retriever reuses the embedding set on the bundle
+                query_bundle.embedding = self.embed_model.get_agg_embedding_from_queries(
+                    query_bundle.embedding_strs
+                )
+            nodes = self.query_cache.get_similar(query_bundle.embedding, params_key, generation)
+            if nodes is not None:
+                return nodes
+
+        nodes = self.retriever.retrieve(query_bundle)
+        self.query_cache.put(key, params_key, generation, nodes, embedding=query_bundle.embedding)
+        return nodes
+
+    def _cache_generation(self) -> Tuple[int, Optional[str], Optional[str]]:
+        return (self.generation.current(), *self._index_versions())
+
+    async def _acache_generation(self) -> Tuple[int, Optional[str], Optional[str]]:
+        return (await self.generation.acurrent(), *self._index_versions())
+
+    def _index_versions(self) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Versions of the local vector index and adjacency snapshot.
+
+        Both are refreshed in the background after the graph generation is
+        bumped, so results computed in between must not outlive them.
+        """
+        return (
+            self.vector_index.version if self.vector_index is not None else None,
+            self.adjacency.version if self.adjacency is not None else None,
+        )
+
     def get_strategy_name(self) -> str:
         """Get the strategy name."""
         return "knowledge_graph"
+
+
+class HybridRetrieverStrategy(RetrieverStrategy):
+    """
+    Keyword (BM25) plus knowledge graph retrieval, combined with reciprocal rank fusion.
+
+    The keyword leg finds chunks containing the query's exact terms, such as
+    part numbers and names, which embeddings tend to miss; the graph leg is a
+    ``KnowledgeGraphRetrieverStrategy``. Both legs run concurrently and their
+    rankings are fused, so the graph leg can run with a smaller
+    ``similarity_top_k`` (and less graph expansion) for the same recall.
+    """
+
+    def __init__(
+        self,
+        vector_strategy: KnowledgeGraphRetrieverStrategy,
+        keyword_index: KeywordIndex,
+        keyword_top_k: int = 10,
+        top_n: int = 10,
+        rrf_k: int = 60
+    ):
+        self.vector_strategy = vector_strategy
+        self.keyword_index = keyword_index
+        self.keyword_top_k = keyword_top_k
+        self.top_n = top_n
+        self.rrf_k = rrf_k
+        self.graph_store = vector_strategy.kg_index.property_graph_store
+
+    def retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        """Retrieve nodes with both legs and fuse their rankings."""
+        return asyncio_run(self.aretrieve(query_bundle))
+
+    async def aretrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        vector_nodes, keyword_nodes = await asyncio.gather(
+            self.vector_strategy.aretrieve(query_bundle),
+            self._akeyword_retrieve([query_bundle.query_str]),
+        )
+        nodes = reciprocal_rank_fusion([vector_nodes, keyword_nodes[0]], k=self.rrf_k, top_n=self.top_n)
+        print(f"Hybrid retrieval returned {len(nodes)} nodes")
+        return nodes
+
+    async def abatch_retrieve(self, query_bundles: List[QueryBundle]) -> List[List[NodeWithScore]]:
+        vector_batch, keyword_batch = await asyncio.gather(
+            self.vector_strategy.abatch_retrieve(query_bundles),
+            self._akeyword_retrieve([bundle.query_str for bundle in query_bundles]),
+        )
+        return [
+            reciprocal_rank_fusion([vector_nodes, keyword_nodes], k=self.rrf_k, top_n=self.top_n)
+            for vector_nodes, keyword_nodes in zip(vector_batch, keyword_batch)
+        ]
+
+    async def _akeyword_retrieve(self, queries: List[str]) -> List[List[NodeWithScore]]:
+        """BM25 hits for each query, with chunk nodes fetched from the graph store in one call."""
+        try:
+            with span("keyword_retrieve", queries=len(queries)) as keyword_span:
+                matches = await asyncio.to_thread(self.keyword_index.search_many, queries, self.keyword_top_k)
+                chunk_ids = list(dict.fromkeys(chunk_id for query_matches in matches for chunk_id, _ in query_matches))
+                nodes = await self.graph_store.aget_llama_nodes(chunk_ids) if chunk_ids else []
+                keyword_span.add("chunks", len(nodes))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Keyword retrieval failed: {str(e)}")
+            return [[] for _ in queries]
+        nodes_by_id = {node.node_id: node for node in nodes}
+        return [
+            [
+                NodeWithScore(node=nodes_by_id[chunk_id], score=score)
+                for chunk_id, score in query_matches
+                if chunk_id in nodes_by_id
+            ]
+            for query_matches in matches
+        ]
+
+    def get_strategy_name(self) -> str:
+        """Get the strategy name."""
+        return "hybrid"
+
+
+def reciprocal_rank_fusion(
+    result_lists: List[List[NodeWithScore]],
+    k: int = 60,
+    top_n: Optional[int] = None
+) -> List[NodeWithScore]:
+    """
+    Fuse ranked result lists: each node scores ``sum(1 / (k + rank))`` over the lists it appears in.
+
+    Nodes are matched by id; when a node appears in several lists, the
+    version from the earliest list is kept.
+    """
+    scores: Dict[str, float] = {}
+    nodes: Dict[str, NodeWithScore] = {}
+    for results in result_lists:
+        for rank, node in enumerate(results, start=1):
+            node_id = node.node.node_id
+            scores[node_id] = scores.get(node_id, 0.0) + 1.0 / (k + rank)
+            nodes.setdefault(node_id, node)
+    ranked = sorted(scores, key=scores.get, reverse=True)
+    if top_n is not None:
+        ranked = ranked[:top_n]
+    return [NodeWithScore(node=nodes[node_id].node, score=scores[node_id]) for node_id in ranked]
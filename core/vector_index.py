@@ -0,0 +1,572 @@
+import asyncio
+import itertools
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from llama_index.core.graph_stores.types import EntityNode, PropertyGraphStore
+from llama_index.graph_stores.neo4j import Neo4jPGStore
+
+from core.batch_retrieval import BatchVectorContextRetriever
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+ENTITY = "entity"
+CHUNK = "chunk"
+KINDS = (ENTITY, CHUNK)
+
+# Rows scored per matrix product, bounds the float32 scratch space for float16 indexes
+SCORE_BLOCK_ROWS = 65536
+# Rows per segment written by a rebuild after the first, which is sized by the expected row count
+REBUILD_SEGMENT_ROWS = 65536
+
+# Superseded versions and segments younger than this are kept for readers that just resolved CURRENT
+VERSION_GRACE_SECONDS = 60.0
+# Times a reader re-resolves CURRENT when a writer removed the version it was loading
+LOAD_ATTEMPTS = 3
+
+# (id, kind, embedding)
+IndexRow = Tuple[str, str, Sequence[float]]
+
+
+class _Segment(NamedTuple):
+    """An immutable run of index rows; its matrix may have unused capacity past ``len(ids)``."""
+
+    path: str
+    vectors: Optional[np.ndarray]
+    kinds: np.ndarray
+    ids: List[str]
+
+
+class _Version(NamedTuple):
+    """One loaded index version; swapped as a whole so readers never mix versions."""
+
+    name: str
+    # Manifest entries: {"path": segment path relative to the index directory, "dead": [row, ...]}
+    manifest: List[Dict[str, Any]]
+    segments: List[_Segment]
+    # Over all segments, in order
+    ids: List[str]
+    kinds: np.ndarray
+    live: np.ndarray
+    size: int
+
+
+class LocalVectorIndex:
+    """
+    Memory-mapped, in-process vector index over graph node embeddings.
+
+    Embeddings are stored L2-normalized as float32 or float16 ``.npy``
+    segments, memory-mapped read-only for queries, so cosine scoring is a
+    blocked matrix-vector product per segment followed by an
+    ``argpartition`` top-k. ``update`` appends its rows as a new segment and
+    tombstones the older rows they replace or remove, so it costs the size of
+    the batch rather than of the index; ``rebuild`` compacts everything back
+    into full segments. Each write produces a new version manifest and then
+    atomically swaps the ``CURRENT`` pointer, so readers in other processes
+    pick the new version up on their next query without ever seeing a
+    half-written index.
+    """
+
+    def __init__(self, directory: Path, dtype: str = "float32", reload_interval: float = 1.0):
+        if dtype not in ("float32", "float16"):
+            raise ValueError(f"Unsupported vector index dtype: {dtype}")
+        self.directory = Path(directory)
+        self.dtype = np.dtype(dtype)
+        self.reload_interval = reload_interval
+        self._lock = threading.RLock()
+        self._current: Optional[_Version] = None
+        # Segments are immutable, so they are loaded (and their id positions built) once per process
+        self._segments: Dict[str, _Segment] = {}
+        self._positions: Dict[str, Dict[str, int]] = {}
+        self._checked_at = 0.0
+
+    @property
+    def size(self) -> int:
+        current = self._load()
+        return current.size if current is not None else 0
+
+    @property
+    def version(self) -> Optional[str]:
+        current = self._load()
+        return current.name if current is not None else None
+
+    def exists(self) -> bool:
+        return (self.directory / "CURRENT").exists()
+
+    def search(
+        self,
+        embedding: Sequence[float],
+        top_k: int,
+        kind: Optional[str] = ENTITY,
+    ) -> List[Tuple[str, float]]:
+        """
+        Find the nodes most similar to an embedding.
+
+        Args:
+            embedding: Query embedding
+            top_k: Number of results
+            kind: Restrict results to "entity" or "chunk" nodes; None searches both
+
+        Returns:
+            List of (node id, score) pairs, best first. Scores are mapped to
+            ``(1 + cosine) / 2`` to match Neo4j's cosine vector index.
+        """
+        return self.search_many([embedding], top_k, kind=kind)[0]
+
+    def search_many(
+        self,
+        embeddings: Sequence[Sequence[float]],
+        top_k: int,
+        kind: Optional[str] = ENTITY,
+    ) -> List[List[Tuple[str, float]]]:
+        """
+        Batched ``search``: all queries are scored with one matrix product per block.
+
+        Returns:
+            One (node id, score) list per embedding, best first
+        """
+        current = self._load()
+        if current is None or not current.size or top_k <= 0 or not len(embeddings):
+            return [[] for _ in embeddings]
+        ids = current.ids
+
+        queries = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        queries /= norms
+
+        # (num queries, num rows)
+        scores = np.empty((len(queries), len(ids)), dtype=np.float32)
+        offset = 0
+        for segment in current.segments:
+            for start in range(0, len(segment.ids), SCORE_BLOCK_ROWS):
+                block = segment.vectors[start:start + SCORE_BLOCK_ROWS]
+                np.dot(
+                    queries,
+                    block.astype(np.float32, copy=False).T,
+                    out=scores[:, offset + start:offset + start + len(block)],
+                )
+            offset += len(segment.ids)
+        mask = ~current.live
+        if kind is not None:
+            mask |= current.kinds != KINDS.index(kind)
+        scores[:, mask] = -np.inf
+        candidates = len(ids) - int(np.count_nonzero(mask))
+
+        top_k = min(top_k, candidates)
+        if top_k == 0:
+            return [[] for _ in embeddings]
+        top = np.argpartition(-scores, top_k - 1, axis=1)[:, :top_k]
+        results = []
+        for row, row_top in enumerate(top):
+            row_top = row_top[np.argsort(-scores[row, row_top])]
+            results.append([(ids[i], float((1.0 + scores[row, i]) / 2.0)) for i in row_top])
+        return results
+
+    def rebuild(self, rows: Iterable[IndexRow], count: Optional[int] = None) -> int:
+        """
+        Replace the index contents.
+
+        Args:
+            rows: (id, kind, embedding) rows, streamed into new segments
+            count: Expected number of rows. Only sizes the first segment;
+                rows beyond it go into further segments, and fewer rows
+                leave unused capacity
+
+        Returns:
+            Number of rows written
+        """
+        rows = iter(rows)
+        with self._write_lock():
+            manifest: List[Dict[str, Any]] = []
+            written = 0
+            capacity = count or REBUILD_SEGMENT_ROWS
+            try:
+                while True:
+                    segment = self._write_segment(rows, capacity)
+                    if segment is None:
+                        break
+                    manifest.append({"path": segment, "dead": []})
+                    written += len(self._segment(segment).ids)
+                    capacity = REBUILD_SEGMENT_ROWS
+                self._publish(manifest)
+            except BaseException:
+                for entry in manifest:
+                    shutil.rmtree(self.directory / entry["path"], ignore_errors=True)
+                raise
+        print(f"Vector index rebuilt: {written} rows in {len(manifest)} segments")
+        return written
+
+    def update(self, upserts: Iterable[IndexRow] = (), removals: Iterable[str] = ()) -> int:
+        """
+        Add or replace rows and drop removed ids.
+
+        The rows are appended as one new segment; rows they replace and
+        removed rows are tombstoned in the segments that hold them.
+
+        Returns:
+            Number of live rows in the new version
+        """
+        incoming: Dict[str, IndexRow] = {row[0]: row for row in upserts}
+        removed: Set[str] = set(removals) - set(incoming)
+        if not incoming and not removed:
+            return self.size
+
+        with self._write_lock():
+            # Re-read under the lock so concurrent writers do not drop each other's rows
+            current = self._load(force=True)
+            targets = set(incoming) | removed
+            manifest: List[Dict[str, Any]] = []
+            for entry, segment in zip(current.manifest if current else [], current.segments if current else []):
+                dead = set(entry["dead"])
+                positions = self._segment_positions(segment)
+                dead.update(positions[node_id] for node_id in targets if node_id in positions)
+                if len(dead) < len(segment.ids):
+                    manifest.append({"path": entry["path"], "dead": sorted(dead)})
+            segment = self._write_segment(iter(incoming.values()), len(incoming)) if incoming else None
+            if segment is not None:
+                manifest.append({"path": segment, "dead": []})
+            self._publish(manifest)
+            return self._current.size if self._current is not None else 0
+
+    def _write_segment(self, rows: Iterator[IndexRow], capacity: int) -> Optional[str]:
+        """
+        Write up to ``capacity`` rows from ``rows`` as a new segment.
+
+        Returns:
+            The segment's path relative to the index directory, or None if ``rows`` was exhausted
+        """
+        first = next(rows, None)
+        if first is None:
+            return None
+        path = f"segments/s{time.time_ns()}-{uuid.uuid4().hex[:8]}"
+        segment_dir = self.directory / path
+        segment_dir.mkdir(parents=True)
+        try:
+            ids: List[str] = []
+            kinds = np.zeros(capacity, dtype=np.uint8)
+            vectors = np.lib.format.open_memmap(
+                segment_dir / "vectors.npy", mode="w+", dtype=self.dtype, shape=(capacity, len(first[2]))
+            )
+            for node_id, kind, embedding in itertools.chain([first], itertools.islice(rows, capacity - 1)):
+                vector = np.asarray(embedding, dtype=np.float32)
+                norm = np.linalg.norm(vector)
+                vectors[len(ids)] = vector / norm if norm else vector
+                kinds[len(ids)] = KINDS.index(kind)
+                ids.append(node_id)
+            vectors.flush()
+            del vectors
+            np.save(segment_dir / "kinds.npy", kinds[:len(ids)])
+            with open(segment_dir / "ids.json", "w") as f:
+                json.dump(ids, f)
+        except BaseException:
+            shutil.rmtree(segment_dir, ignore_errors=True)
+            raise
+        return path
+
+    def _publish(self, manifest: List[Dict[str, Any]]) -> None:
+        """Write a version manifest and point ``CURRENT`` at it; call under the write lock."""
+        version = f"v{time.time_ns()}-{uuid.uuid4().hex[:8]}"
+        version_dir = self.directory / version
+        version_dir.mkdir()
+        with open(version_dir / "manifest.json", "w") as f:
+            json.dump({"segments": manifest}, f)
+
+        previous = self._current.name if self._current is not None else None
+        pointer = self.directory / f"CURRENT.{version}"
+        pointer.write_text(version)
+        os.replace(pointer, self.directory / "CURRENT")
+        self._remove_old_versions(keep={version, previous})
+        self._load(force=True)
+        print(f"Vector index version {version}: {self._current.size} rows in {len(manifest)} segments")
+
+    def _load(self, force: bool = False) -> Optional[_Version]:
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.reload_interval:
+            return self._current
+        self._checked_at = now
+        for attempt in range(LOAD_ATTEMPTS):
+            try:
+                version = (self.directory / "CURRENT").read_text().strip()
+            except FileNotFoundError:
+                return self._current
+            if self._current is not None and version == self._current.name:
+                return self._current
+            try:
+                manifest = self._read_manifest(version)
+                segments = [self._segment(entry["path"]) for entry in manifest]
+                break
+            except FileNotFoundError:
+                # Removed by a writer since CURRENT was read; the pointer has moved on
+                if attempt == LOAD_ATTEMPTS - 1:
+                    raise
+        live = []
+        for entry, segment in zip(manifest, segments):
+            segment_live = np.ones(len(segment.ids), dtype=bool)
+            segment_live[entry["dead"]] = False
+            live.append(segment_live)
+        current = _Version(
+            name=version,
+            manifest=manifest,
+            segments=segments,
+            ids=[node_id for segment in segments for node_id in segment.ids],
+            kinds=np.concatenate([segment.kinds for segment in segments]) if segments else np.zeros(0, np.uint8),
+            live=np.concatenate(live) if live else np.zeros(0, bool),
+            size=sum(int(np.count_nonzero(segment_live)) for segment_live in live),
+        )
+        with self._lock:
+            self._current = current
+            paths = {entry["path"] for entry in manifest}
+            for path in list(self._segments):
+                if path not in paths:
+                    self._segments.pop(path, None)
+                    self._positions.pop(path, None)
+        return current
+
+    def _read_manifest(self, version: str) -> List[Dict[str, Any]]:
+        version_dir = self.directory / version
+        try:
+            with open(version_dir / "manifest.json") as f:
+                return json.load(f)["segments"]
+        except FileNotFoundError:
+            if not (version_dir / "ids.json").exists():
+                raise
+            # Versions written before segments hold their rows directly
+            return [{"path": version, "dead": []}]
+
+    def _segment(self, path: str) -> _Segment:
+        with self._lock:
+            segment = self._segments.get(path)
+        if segment is not None:
+            return segment
+        segment_dir = self.directory / path
+        with open(segment_dir / "ids.json") as f:
+            ids = json.load(f)
+        kinds = np.load(segment_dir / "kinds.npy")
+        vectors = np.load(segment_dir / "vectors.npy", mmap_mode="r")[:len(ids)] if ids else None
+        segment = _Segment(path=path, vectors=vectors, kinds=kinds, ids=ids)
+        with self._lock:
+            self._segments[path] = segment
+        return segment
+
+    def _segment_positions(self, segment: _Segment) -> Dict[str, int]:
+        with self._lock:
+            positions = self._positions.get(segment.path)
+            if positions is None:
+                positions = {node_id: row for row, node_id in enumerate(segment.ids)}
+                self._positions[segment.path] = positions
+            return positions
+
+    def _remove_old_versions(self, keep: Set[Optional[str]]) -> None:
+        # Readers still holding an older mapping keep it alive until they reload. Recent
+        # versions stay too, so a reader in another process that resolved CURRENT during
+        # a burst of writes still finds the version and its segments.
+        cutoff = time.time() - VERSION_GRACE_SECONDS
+        kept_versions = {version for version in keep if version is not None}
+        for path in self.directory.glob("v*"):
+            if path.is_dir() and _modified_after(path, cutoff):
+                kept_versions.add(path.name)
+        referenced = set()
+        for version in kept_versions:
+            try:
+                referenced.update(entry["path"] for entry in self._read_manifest(version))
+            except FileNotFoundError:
+                continue
+        for path in self.directory.glob("v*"):
+            if path.is_dir() and path.name not in kept_versions and path.name not in referenced:
+                shutil.rmtree(path, ignore_errors=True)
+        for path in self.directory.glob("segments/*"):
+            if path.is_dir() and f"segments/{path.name}" not in referenced and not _modified_after(path, cutoff):
+                shutil.rmtree(path, ignore_errors=True)
+
+    @contextmanager
+    def _write_lock(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with open(self.directory / "lock", "w") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _modified_after(path: Path, cutoff: float) -> bool:
+    try:
+        return path.stat().st_mtime > cutoff
+    except FileNotFoundError:
+        return False
+
+
+def count_graph_embeddings(graph_store: PropertyGraphStore) -> Optional[int]:
+    """Number of embedded nodes in the graph, if the store can count them cheaply."""
+    if isinstance(graph_store, Neo4jPGStore):
+        rows = graph_store.structured_query(
+            "MATCH (n:__Node__) WHERE n.embedding IS NOT NULL RETURN count(n) AS count"
+        )
+        return rows[0]["count"] if rows else 0
+    return None
+
+
+def iter_graph_embeddings(graph_store: PropertyGraphStore, batch_size: int = 5000) -> Iterator[IndexRow]:
+    """
+    Stream the embeddings stored on graph nodes.
+
+    Args:
+        graph_store: Graph store to read from
+        batch_size: Rows fetched per Neo4j query
+
+    Yields:
+        (id, kind, embedding) rows
+    """
+    if isinstance(graph_store, Neo4jPGStore):
+        after = ""
+        while True:
+            rows = graph_store.structured_query(
+                """
+                MATCH (n:__Node__) WHERE n.embedding IS NOT NULL AND n.id > $after
+                RETURN n.id AS id, n:__Entity__ AS is_entity, n.embedding AS embedding
+                ORDER BY n.id LIMIT $limit
+                """,
+                param_map={"after": after, "limit": batch_size},
+            )
+            if not rows:
+                return
+            for row in rows:
+                yield row["id"], ENTITY if row["is_entity"] else CHUNK, row["embedding"]
+            after = rows[-1]["id"]
+        return
+
+    for node in graph_store.get():
+        if node.embedding is not None:
+            yield node.id, ENTITY if isinstance(node, EntityNode) else CHUNK, node.embedding
+
+
+def rows_from_upserts(rows: Iterable[Dict[str, Any]], kind: str) -> List[IndexRow]:
+    """Index rows for upserted graph store rows that carry an embedding."""
+    return [(row["id"], kind, row["embedding"]) for row in rows if row.get("embedding") is not None]
+
+
+class VectorIndexRefresher:
+    """
+    Keeps a ``LocalVectorIndex`` in step with the graph on a background thread.
+
+    Upserted rows and removed node ids are queued and applied in coalesced
+    batches so ingests never wait on index writes. The index is rebuilt from
+    the graph store when it does not exist yet and after every
+    ``rebuild_every`` incremental updates, which compacts its segments and
+    drops nodes deleted from the graph without going through ``remove``.
+    """
+
+    def __init__(self, index: LocalVectorIndex, graph_store: PropertyGraphStore, rebuild_every: int = 100):
+        self.index = index
+        self.graph_store = graph_store
+        self.rebuild_every = rebuild_every
+        # (rows to upsert, ids to remove)
+        self._queue: "queue.Queue[Optional[Tuple[List[IndexRow], List[str]]]]" = queue.Queue()
+        self._updates = 0
+        self._rebuild_requested = not index.exists()
+        self._thread = threading.Thread(target=self._run, name="vector-index", daemon=True)
+        self._thread.start()
+        if self._rebuild_requested:
+            self._queue.put(([], []))
+
+    def submit(self, rows: List[IndexRow]) -> None:
+        """Queue rows to be added to (or replaced in) the index."""
+        if rows:
+            self._queue.put((rows, []))
+
+    def remove(self, node_ids: List[str]) -> None:
+        """Queue node ids to be dropped from the index."""
+        if node_ids:
+            self._queue.put(([], list(node_ids)))
+
+    def request_rebuild(self) -> None:
+        """Queue a full rebuild from the graph store."""
+        self._rebuild_requested = True
+        self._queue.put(([], []))
+
+    def stop(self, timeout: float = 10.0) -> None:
+        self._queue.put(None)
+        self._thread.join(timeout=timeout)
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            upserts: Dict[str, IndexRow] = {}
+            removals: Set[str] = set()
+            stop = False
+            # Coalesce everything already queued into one new index version, in queue order
+            while item is not None:
+                rows, node_ids = item
+                for row in rows:
+                    upserts[row[0]] = row
+                    removals.discard(row[0])
+                for node_id in node_ids:
+                    upserts.pop(node_id, None)
+                    removals.add(node_id)
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                stop = item is None
+            try:
+                self._apply(list(upserts.values()), removals)
+            except Exception as e:
+                print(f"Vector index update failed: {e}")
+            if stop:
+                return
+
+    def _apply(self, rows: List[IndexRow], removals: Set[str]) -> None:
+        if self._rebuild_requested or self._updates >= self.rebuild_every:
+            start = time.perf_counter()
+            # The graph already holds the queued changes; the count only sizes the first segment
+            written = self.index.rebuild(
+                iter_graph_embeddings(self.graph_store), count_graph_embeddings(self.graph_store)
+            )
+            # Only now: a failed rebuild is retried on the next batch instead of serving a partial index
+            self._rebuild_requested = False
+            self._updates = 0
+            print(f"Rebuilt vector index with {written} rows in {time.perf_counter() - start:.2f}s")
+            return
+        if rows or removals:
+            self._updates += 1
+            self.index.update(upserts=rows, removals=removals)
+
+
+class LocalVectorContextRetriever(BatchVectorContextRetriever):
+    """
+    ``VectorContextRetriever`` whose vector step runs against a ``LocalVectorIndex``.
+
+    Only graph expansion of the returned entity ids goes to the graph store
+    (or the adjacency snapshot, when one is configured).
+    """
+
+    def __init__(self, graph_store: PropertyGraphStore, vector_index: LocalVectorIndex, **kwargs: Any):
+        super().__init__(graph_store, **kwargs)
+        self._vector_index = vector_index
+
+    def _vector_search(self, embedding: List[float]) -> List[Tuple[str, float]]:
+        return self._vector_index.search(embedding, self._similarity_top_k)
+
+    async def _avector_search(self, embedding: List[float]) -> List[Tuple[str, float]]:
+        # The blocked matrix products release the GIL
+        return await asyncio.to_thread(self._vector_index.search, embedding, self._similarity_top_k)
+
+    async def _abatch_vector_search(self, embeddings: List[List[float]]) -> List[List[Tuple[str, float]]]:
+        return await asyncio.to_thread(self._vector_index.search_many, embeddings, self._similarity_top_k)
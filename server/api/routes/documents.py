@@ -1,9 +1,11 @@
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException
-from server.minio_client.client import MinioClient
-from server.rabbitmq.client import RabbitMQ
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Request
+from starlette.concurrency import run_in_threadpool
+from server.minio_client.client import MinioClient, HashingReader, DEFAULT_PART_SIZE
 from server.core.ingest import ingest_file
+from core.metrics import span
+from server.core.jobs import QueueFullError, encode_message, estimate_tokens, get_job_store
 from typing import Optional
-import tempfile
+import asyncio
 import time
 
 import os
@@ -11,63 +13,171 @@ import re
 
 router = APIRouter(prefix="/documents", tags=["documents"])
 
+# Zero-byte marker objects mapping a content hash to its canonical object name
+HASH_INDEX_PREFIX = "_index/sha256/"
+
 @router.post("/process")
 async def process_document(
+    request: Request,
     file: UploadFile = File(...),
     title: Optional[str] = Form(None),
-    description: Optional[str] = Form(None)
+    description: Optional[str] = Form(None),
+    tenant: Optional[str] = Form(None),
+    priority: Optional[str] = Form(None)
 ):
+    with span("upload", bytes=file.size or 0):
+        return await _admit_document(request, file, title, description, tenant, priority)
+
+async def _admit_document(request, file, title, description, tenant, priority):
+    """Store the upload, record its job and dispatch it unless the job is deferred."""
+    filename = file.filename or "unnamed_file"
+    tenant = tenant or request.headers.get("x-tenant-id")
+    estimated_tokens = estimate_tokens(file.size, filename)
+    job_store = get_job_store()
     try:
-        url = await push_document_to_minio(file)
+        # Refuse before uploading anything when the backlog is already full
+        await run_in_threadpool(job_store.check_capacity, estimated_tokens)
+        url, sha256 = await push_document_to_minio(file)
         print(url)
-        rabbitmq_client = RabbitMQ()
-        queue_name = "documents_to_process"
-        rabbitmq_client.publish(queue_name, url)
-        rabbitmq_client.close()
+        job, dispatch = await run_in_threadpool(
+            job_store.admit, url, filename, tenant, priority, estimated_tokens, sha256
+        )
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+
+    if dispatch:
+        queue_name = "documents_to_process"
+        try:
+            with span("queue_publish"):
+                await request.app.state.rabbitmq_publisher.publish(queue_name, encode_message(job["job_id"], url))
+        except Exception as e:
+            # Leaving the job queued without a token would hold its URL until a worker's sweep re-dispatched it
+            await run_in_threadpool(job_store.cancel, job["job_id"])
+            if isinstance(e, asyncio.TimeoutError):
+                raise HTTPException(status_code=503, detail="Timed out queueing document for processing")
+            raise HTTPException(status_code=503, detail=f"Could not queue document for processing: {e}")
+        await run_in_threadpool(job_store.mark_dispatched, job["job_id"])
+
+    if job["state"] == "deferred":
+        message = "Document uploaded; processing is deferred until the ingestion backlog drains"
+    else:
+        message = "Document uploaded and sent for processing"
     return {
         "filename": file.filename,
         "content_type": file.content_type,
         "title": title,
         "description": description,
-        "message": "Document uploaded and sent for processing",
-        "url": url
+        "message": message,
+        "url": url,
+        "sha256": sha256,
+        "job_id": job["job_id"],
+        "status": job["state"],
+        "priority": job["priority"],
+    }
+
+@router.get("/{job_id}/status")
+async def document_status(job_id: str):
+    job = await run_in_threadpool(get_job_store().get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"No ingestion job {job_id}")
+    return {
+        "job_id": job["job_id"],
+        "status": job["state"],
+        "filename": job["filename"],
+        "url": job["url"],
+        "tenant": job["tenant"],
+        "priority": job["priority"],
+        "queue_position": job.get("queue_position"),
+        "attempts": job["attempts"],
+        "error": job["error"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
     }
 
 async def push_document_to_minio(file: UploadFile):
-    URL = os.getenv("MINIO_URL", "s3:9000")
-    USER = os.getenv("MINIO_USER", "guestuser")
-    PASS = os.getenv("MINIO_PASSWORD", "supersecret123")
     BUCKET_NAME = "documents"
+    PART_SIZE = int(os.getenv("MINIO_PART_SIZE", DEFAULT_PART_SIZE))
 
-    minio_client = MinioClient(URL, USER, PASS)
+    minio_client = MinioClient.from_env()
+    # Return URL accessible from outside Docker
+    external_url = os.getenv("MINIO_EXTERNAL_URL", "localhost:9000")
 
-    if not minio_client.client.bucket_exists(BUCKET_NAME):
-        minio_client.create_bucket(BUCKET_NAME)
+    if not await run_in_threadpool(minio_client.client.bucket_exists, BUCKET_NAME):
+        await run_in_threadpool(minio_client.create_bucket, BUCKET_NAME)
 
     object_name = _normalize_filename(file.filename or "unnamed_file")
 
-    existing_objects = [obj.object_name for obj in minio_client.list_objects(BUCKET_NAME)]
-    if object_name in existing_objects:
+    # Hash the spooled upload before touching the bucket, so an edited file
+    # re-uploaded under the same name replaces the stored object
+    await file.seek(0)
+    sha256 = await run_in_threadpool(_hash_stream, file.file, PART_SIZE)
+    await file.seek(0)
+
+    if await run_in_threadpool(_object_sha256, minio_client, BUCKET_NAME, object_name) == sha256:
         print(f"Duplicate file found: {object_name}, skipping upload")
-        # Return URL accessible from outside Docker
-        external_url = os.getenv("MINIO_EXTERNAL_URL", "localhost:9000")
-        return f"http://{external_url}/{BUCKET_NAME}/{object_name}"
+        return f"http://{external_url}/{BUCKET_NAME}/{object_name}", sha256
 
-    suffix = os.path.splitext(file.filename or "")[1]
-    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-        tmp.write(await file.read())
-        tmp_path = tmp.name
+    canonical_name = await run_in_threadpool(_find_object_by_hash, minio_client, BUCKET_NAME, sha256)
+    if canonical_name is not None and canonical_name != object_name:
+        print(f"Duplicate content found: {object_name} matches {canonical_name}, skipping upload")
+        return f"http://{external_url}/{BUCKET_NAME}/{canonical_name}", sha256
 
-    try:
-        minio_client.upload_file(BUCKET_NAME, object_name, tmp_path)
-    finally:
-        os.remove(tmp_path)
+    # Stream the upload part by part; an object of the same name with other content is overwritten
+    reader = HashingReader(file.file)
+    with span("minio_put") as put_span:
+        await run_in_threadpool(
+            minio_client.upload_stream,
+            BUCKET_NAME,
+            object_name,
+            reader,
+            length=file.size if file.size is not None else -1,
+            part_size=PART_SIZE,
+            content_type=file.content_type,
+            metadata={"sha256": sha256},
+        )
+        put_span.add("bytes", reader.bytes_read)
+    if reader.hexdigest() != sha256:
+        raise ValueError(f"Upload of {object_name} changed while it was being stored")
+    print(f"Uploaded {object_name} ({reader.bytes_read} bytes, sha256 {sha256})")
 
-    # Return URL accessible from outside Docker
-    external_url = os.getenv("MINIO_EXTERNAL_URL", "localhost:9000")
-    return f"http://{external_url}/{BUCKET_NAME}/{object_name}"
+    await run_in_threadpool(
+        minio_client.put_marker, BUCKET_NAME, _hash_index_key(sha256), {"object-name": object_name}
+    )
+    return f"http://{external_url}/{BUCKET_NAME}/{object_name}", sha256
+
+def _hash_index_key(sha256: str) -> str:
+    return f"{HASH_INDEX_PREFIX}{sha256}"
+
+def _find_object_by_hash(minio_client: MinioClient, bucket_name: str, sha256: str) -> Optional[str]:
+    """Look up the canonical object for a content hash with a single stat call."""
+    marker = minio_client.stat_object(bucket_name, _hash_index_key(sha256))
+    if marker is None:
+        return None
+    canonical_name = marker.metadata.get("x-amz-meta-object-name")
+    if not canonical_name:
+        return None
+    # Ignore markers whose object has since been deleted or overwritten with other content;
+    # objects stored before uploads were hashed were never overwritten
+    info = minio_client.stat_object(bucket_name, canonical_name)
+    if info is not None and info.metadata.get("x-amz-meta-sha256") in (None, sha256):
+        return canonical_name
+    return None
+
+def _object_sha256(minio_client: MinioClient, bucket_name: str, object_name: str) -> Optional[str]:
+    """Content hash recorded on an object at upload, or None if it is missing or predates hashing."""
+    info = minio_client.stat_object(bucket_name, object_name)
+    if info is None:
+        return None
+    return info.metadata.get("x-amz-meta-sha256")
+
+def _hash_stream(stream, chunk_size: int) -> str:
+    reader = HashingReader(stream)
+    while reader.read(chunk_size):
+        pass
+    return reader.hexdigest()
 
 def _normalize_filename(original_name: str, lowercase: bool = True) -> str:
     base, ext = os.path.splitext(original_name)
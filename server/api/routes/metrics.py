@@ -0,0 +1,10 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from core.metrics import METRICS_CONTENT_TYPE, render_metrics
+
+router = APIRouter(tags=["metrics"])
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Stage span histograms of this API process in the Prometheus text format."""
+    return PlainTextResponse(render_metrics(), media_type=METRICS_CONTENT_TYPE)
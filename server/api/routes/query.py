@@ -0,0 +1,110 @@
+from fastapi import APIRouter, HTTPException
+from llama_index.core.schema import QueryBundle
+from pydantic import BaseModel, Field
+from starlette.concurrency import run_in_threadpool
+from config.settings import get_config
+from server.core.query import get_retriever_strategy
+from typing import List, Optional
+import asyncio
+import time
+
+router = APIRouter(tags=["query"])
+
+# Bounds in-flight retrievals per worker process; waiting for a slot counts toward the timeout
+_query_slots = asyncio.Semaphore(get_config().query_max_concurrency)
+
+
+class QueryRequest(BaseModel):
+    query: str = Field(..., min_length=1)
+    similarity_top_k: Optional[int] = Field(None, ge=1, le=100)
+    path_depth: Optional[int] = Field(None, ge=1, le=5)
+    include_text: Optional[bool] = None
+    timeout: Optional[float] = Field(None, gt=0, description="Per-request timeout in seconds")
+
+
+class BatchQueryRequest(BaseModel):
+    queries: List[str] = Field(..., min_length=1, max_length=256)
+    similarity_top_k: Optional[int] = Field(None, ge=1, le=100)
+    path_depth: Optional[int] = Field(None, ge=1, le=5)
+    include_text: Optional[bool] = None
+    timeout: Optional[float] = Field(None, gt=0, description="Timeout for the whole batch in seconds")
+
+
+def _serialize_nodes(nodes):
+    return [
+        {
+            "id": node.node.node_id,
+            "score": node.score,
+            "text": node.node.get_content(),
+            "metadata": node.node.metadata,
+        }
+        for node in nodes
+    ]
+
+
+@router.post("/query")
+async def query_graph(request: QueryRequest):
+    config = get_config()
+    timeout = min(request.timeout or config.query_timeout_seconds, config.query_timeout_seconds)
+    start = time.perf_counter()
+
+    # First use connects to Neo4j; keep that off the event loop too
+    strategy = await run_in_threadpool(
+        get_retriever_strategy,
+        config,
+        request.similarity_top_k,
+        request.path_depth,
+        request.include_text,
+    )
+
+    async def retrieve():
+        async with _query_slots:
+            return await strategy.aretrieve(QueryBundle(query_str=request.query))
+
+    try:
+        nodes = await asyncio.wait_for(retrieve(), timeout)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail=f"Query timed out after {timeout:.1f}s")
+
+    return {
+        "query": request.query,
+        "strategy": strategy.get_strategy_name(),
+        "results": _serialize_nodes(nodes),
+        "took_ms": round((time.perf_counter() - start) * 1000, 1),
+    }
+
+
+@router.post("/query/batch")
+async def query_graph_batch(request: BatchQueryRequest):
+    if any(not query.strip() for query in request.queries):
+        raise HTTPException(status_code=400, detail="Queries must not be empty")
+    config = get_config()
+    timeout = min(request.timeout or config.query_timeout_seconds, config.query_timeout_seconds)
+    start = time.perf_counter()
+
+    strategy = await run_in_threadpool(
+        get_retriever_strategy,
+        config,
+        request.similarity_top_k,
+        request.path_depth,
+        request.include_text,
+    )
+
+    async def retrieve():
+        # A batch costs one embedding request and a few graph round trips, so it takes one slot
+        async with _query_slots:
+            return await strategy.abatch_retrieve([QueryBundle(query_str=query) for query in request.queries])
+
+    try:
+        batch = await asyncio.wait_for(retrieve(), timeout)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail=f"Batch query timed out after {timeout:.1f}s")
+
+    return {
+        "strategy": strategy.get_strategy_name(),
+        "results": [
+            {"query": query, "results": _serialize_nodes(nodes)}
+            for query, nodes in zip(request.queries, batch)
+        ],
+        "took_ms": round((time.perf_counter() - start) * 1000, 1),
+    }
@@ -1,9 +1,15 @@
 from llama_index.core.indices.property_graph import ImplicitPathExtractor, SimpleLLMPathExtractor
 from llama_index.core import PropertyGraphIndex, StorageContext
-from llama_index.embeddings.openai import OpenAIEmbedding
-from llama_index.graph_stores.neo4j import Neo4jPGStore
 from core.document_processor import DocumentProcessor
-from llama_index.llms.openai import OpenAI
+from core.embeddings import EmbeddingManager
+from core.extractors import with_extraction_cache
+from core.graph_store import buffered_writes
+from core.incremental import IncrementalUpdater
+from core.local_storage import persist_storage_context
+from core.near_duplicates import DuplicateFilter, link_duplicates
+from core.metrics import span
+from core.query_cache import bump_graph_generation
+from core.registry import get_registry
 from config.settings import get_config
 from pathlib import Path
 import tempfile
@@ -12,7 +18,6 @@ import asyncio
 import concurrent.futures
 from server.minio_client.client import MinioClient
 
-PERSIST_DIR = "./storage"
 async def ingest_file(file):
     try:
         with tempfile.TemporaryDirectory() as temp_dir:
@@ -30,25 +35,13 @@ async def ingest_file(file):
     return {"message": "File ingested successfully"}
 
 def get_graph_store(config):
-    """Initialize and return Neo4j graph store."""
-    return Neo4jPGStore(
-        username=config.neo4j_username,
-        password=config.neo4j_password,
-        url=config.neo4j_url,
-    )
+    """Return the shared Neo4j graph store."""
+    return get_registry(config).graph_store
 
 def setup_models(config):
-    """Initialize and return LLM and embedding models."""
-    llm = OpenAI(
-        model=config.llm_model,
-        temperature=config.llm_temperature,
-        api_key=config.openai_api_key
-    )
-    embed_model = OpenAIEmbedding(
-        model=config.embedding_model,
-        api_key=config.openai_api_key
-    )
-    return llm, embed_model
+    """Return the shared LLM and embedding models."""
+    registry = get_registry(config)
+    return registry.llm, registry.embed_model
 
 async def build_knowledge_graph(file, config):
     print("Building knowledge graph...")
@@ -65,30 +58,91 @@ async def build_knowledge_graph(file, config):
         print(f"Loaded {len(all_docs)} documents from {file.filename}")
         sub_docs = processor.split_documents_into_pages(all_docs)
         print(f"Total pages after splitting: {len(sub_docs)}")
-        loop = asyncio.get_event_loop()
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            index = await loop.run_in_executor(
-                executor,
-                lambda: PropertyGraphIndex.from_documents(
+        registry = get_registry(config)
+        updater = IncrementalUpdater(
+            graph_store,
+            keyword_index=registry.keyword_index,
+            duplicate_index=registry.near_duplicate_index,
+        )
+        sub_docs, stale_pages = updater.plan(sub_docs)
+        updater.delete_pages(stale_pages)
+        if stale_pages:
+            bump_graph_generation(graph_store)
+        if not sub_docs:
+            _persist_removed_pages(file.filename, stale_pages, config)
+            print(f"✓ {file.filename} is unchanged, nothing to re-index")
+            return
+
+        # Near-duplicate pages are linked to their canonical page instead of being embedded and extracted
+        duplicate_filter = None
+        duplicates = []
+        if registry.near_duplicate_index is not None:
+            duplicate_filter = DuplicateFilter(registry.near_duplicate_index, min_words=config.near_duplicate_min_words)
+            sub_docs, duplicates = duplicate_filter.filter(sub_docs)
+            if not sub_docs:
+                link_duplicates(graph_store, duplicates)
+                bump_graph_generation(graph_store)
+                _persist_removed_pages(file.filename, stale_pages, config)
+                print(f"✓ {file.filename} only has near-duplicate pages, linked {len(duplicates)}")
+                return
+
+        def build_index():
+            # Buffer graph writes on the executor thread and flush them in bulk
+            with buffered_writes(graph_store):
+                return PropertyGraphIndex.from_documents(
                     sub_docs,
                     embed_model=embed_model,
                     kg_extractors=[
                         ImplicitPathExtractor(),
-                        SimpleLLMPathExtractor(
-                            llm=llm,
-                            num_workers=config.num_workers,
-                            max_paths_per_chunk=config.max_paths_per_chunk,
+                        with_extraction_cache(
+                            SimpleLLMPathExtractor(
+                                llm=llm,
+                                num_workers=config.num_workers,
+                                max_paths_per_chunk=config.max_paths_per_chunk,
+                            ),
+                            config,
                         ),
                     ],
                     property_graph_store=graph_store,
                     show_progress=config.show_progress,
                 )
+
+        loop = asyncio.get_event_loop()
+        with concurrent.futures.ThreadPoolExecutor() as executor:
+            with span("build_index", pages=len(sub_docs)):
+                index = await loop.run_in_executor(executor, build_index)
+        if duplicate_filter is not None:
+            link_duplicates(graph_store, duplicates)
+            duplicate_filter.commit()
+        bump_graph_generation(graph_store)
+        with span("persist"):
+            persisted_to = persist_storage_context(
+                index.storage_context,
+                file.filename,
+                config.local_persist_mode,
+                config.storage_dir,
+                compact_threshold=config.persist_compact_shards,
+                removed_pages=stale_pages,
             )
-        if not os.path.exists(PERSIST_DIR):
-            os.makedirs(PERSIST_DIR)
-        index.storage_context.persist(persist_dir=PERSIST_DIR)
 
-        print(f"✓ Knowledge graph built and persisted to {PERSIST_DIR}")
+        if persisted_to is not None:
+            print(f"✓ Knowledge graph built and persisted to {persisted_to}")
+        else:
+            print("✓ Knowledge graph built (local persistence disabled)")
         print(f"✓ Neo4j available at {config.neo4j_url}")
+        print(f"✓ Embedding cache: {EmbeddingManager(config).get_cache_stats()}")
     else:
         print(f"Unsupported file type: {file_extension}")
+
+def _persist_removed_pages(filename, stale_pages, config):
+    """Drop removed pages from the sharded local snapshot when no new pages of the file are persisted."""
+    # An empty storage context would overwrite a full snapshot
+    if stale_pages and config.local_persist_mode == "sharded":
+        persist_storage_context(
+            StorageContext.from_defaults(),
+            filename,
+            config.local_persist_mode,
+            config.storage_dir,
+            compact_threshold=config.persist_compact_shards,
+            removed_pages=stale_pages,
+        )
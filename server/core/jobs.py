@@ -0,0 +1,403 @@
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+from config.settings import ComponentsConfig, get_config
+
+# Priority classes, most urgent first
+PRIORITIES = {"interactive": 0, "normal": 1, "bulk": 2}
+PRIORITY_NAMES = {value: name for name, value in PRIORITIES.items()}
+
+DEFERRED = "deferred"
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+ACTIVE_STATES = (DEFERRED, QUEUED, RUNNING)
+
+DEFAULT_TENANT = "default"
+
+_COLUMNS = (
+    "job_id, url, filename, tenant, priority, state, estimated_tokens, attempts, "
+    "error, sha256, created_at, started_at, heartbeat_at, finished_at, queued_at, dispatched_at"
+)
+
+
+class QueueFullError(Exception):
+    """Raised when an upload is refused because the ingestion backlog is over its hard limit."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def estimate_tokens(size: Optional[int], filename: str) -> int:
+    """Rough token count of a file from its size; PDF bytes are mostly layout, fonts and images."""
+    if not size or size < 0:
+        return 0
+    return size // 16 if filename.lower().endswith(".pdf") else size // 4
+
+
+def encode_message(job_id: str, url: str) -> str:
+    return json.dumps({"job_id": job_id, "url": url})
+
+
+def decode_message(message: str) -> Tuple[Optional[str], str]:
+    """(job id, url) of a queue message; plain-URL messages from before the job table have no job id."""
+    try:
+        payload = json.loads(message)
+    except ValueError:
+        return None, message
+    if not isinstance(payload, dict):
+        return None, message
+    return payload.get("job_id"), payload["url"]
+
+
+class JobStore:
+    """
+    Persistent ingestion job table, shared by the API and the workers through SQLite.
+
+    The API admits uploads into the table and publishes one queue message per
+    dispatched job. A message is only a token: whichever worker receives it
+    claims the most deserving queued job, which is the job in the most urgent
+    priority class (jobs gain a class per ``ingest_priority_aging_seconds`` waited so they
+    never starve), then of the tenant with the fewest running jobs and the
+    longest since it was last served, then the oldest. Jobs over the soft
+    backlog limits are held as deferred, without a token, until the backlog
+    drains; uploads over the hard limits are refused.
+
+    A job is marked dispatched once its token has been published. Queued jobs
+    whose token was never published, because the publish failed or its
+    publisher died, are found by ``undispatched`` and given a new one.
+    """
+
+    def __init__(self, db_path: Union[str, Path], config: Optional[ComponentsConfig] = None):
+        self.config = config or get_config()
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        # Autocommit mode, so BEGIN IMMEDIATE can serialize claims across processes
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "job_id TEXT PRIMARY KEY, url TEXT NOT NULL, filename TEXT, tenant TEXT NOT NULL, "
+            "priority INTEGER NOT NULL, state TEXT NOT NULL, estimated_tokens INTEGER NOT NULL DEFAULT 0, "
+            "attempts INTEGER NOT NULL DEFAULT 0, error TEXT, sha256 TEXT, created_at REAL NOT NULL, "
+            "started_at REAL, heartbeat_at REAL, finished_at REAL, queued_at REAL, dispatched_at REAL)"
+        )
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "dispatched_at" not in columns:
+            # Tables from before dispatch tracking; their jobs' tokens were published with them
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN queued_at REAL")
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN dispatched_at REAL")
+            self._conn.execute("UPDATE jobs SET queued_at = created_at, dispatched_at = created_at")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs(state, priority, created_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_url ON jobs(url)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS tenants (tenant TEXT PRIMARY KEY, last_claimed_at REAL NOT NULL)"
+        )
+
+    def admit(
+        self,
+        url: str,
+        filename: str,
+        tenant: Optional[str] = None,
+        priority: Optional[str] = None,
+        estimated_tokens: int = 0,
+        sha256: Optional[str] = None,
+        enforce_limits: bool = True,
+    ) -> Tuple[Dict[str, Any], bool]:
+        """
+        Record an upload as a job, applying admission control.
+
+        An upload of an object that already has an active job returns that
+        job instead of queueing it twice. The priority class defaults to one
+        picked by size; a requested class can lower it but not raise it.
+
+        Returns:
+            (job, whether a queue message must be published for it)
+
+        Raises:
+            QueueFullError: The backlog is over ``ingest_max_queue_depth`` or
+                ``ingest_max_token_backlog``
+        """
+        tenant = tenant or DEFAULT_TENANT
+        level = self._priority_for(estimated_tokens)
+        if priority is not None:
+            if priority not in PRIORITIES:
+                raise ValueError(f"Unknown priority {priority!r}, expected one of {', '.join(PRIORITIES)}")
+            level = max(level, PRIORITIES[priority])
+
+        with self._transaction() as conn:
+            existing = conn.execute(
+                f"SELECT {_COLUMNS} FROM jobs WHERE url = ? AND state IN (?, ?, ?) ORDER BY created_at LIMIT 1",
+                (url, *ACTIVE_STATES),
+            ).fetchone()
+            if existing is not None:
+                return self._job(existing), False
+
+            state = QUEUED
+            if enforce_limits:
+                _, _, dispatched_depth, dispatched_tokens = self._check_limits(conn, estimated_tokens)
+                over_soft_limit = (
+                    dispatched_depth >= self.config.ingest_defer_queue_depth
+                    or dispatched_tokens + estimated_tokens > self.config.ingest_defer_token_backlog
+                )
+                # Small interactive uploads are never held back behind bulk work
+                if over_soft_limit and level != PRIORITIES["interactive"]:
+                    state = DEFERRED
+
+            job_id = uuid.uuid4().hex
+            now = time.time()
+            conn.execute(
+                "INSERT INTO jobs (job_id, url, filename, tenant, priority, state, estimated_tokens, sha256, "
+                "created_at, queued_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, url, filename, tenant, level, state, estimated_tokens, sha256, now,
+                 now if state == QUEUED else None),
+            )
+            job = self._job(conn.execute(f"SELECT {_COLUMNS} FROM jobs WHERE job_id = ?", (job_id,)).fetchone())
+        return job, state == QUEUED
+
+    def check_capacity(self, estimated_tokens: int = 0) -> None:
+        """Raise ``QueueFullError`` if an upload of this size would be refused right now."""
+        with self._lock:
+            self._check_limits(self._conn, estimated_tokens)
+
+    def claim_next(self) -> Optional[Dict[str, Any]]:
+        """
+        Move the most deserving queued job to running.
+
+        Returns:
+            The claimed job, or None when nothing is queued
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute(
+                """
+                SELECT j.job_id, j.tenant FROM jobs j
+                LEFT JOIN (
+                    SELECT tenant, COUNT(*) AS running FROM jobs WHERE state = ? GROUP BY tenant
+                ) r ON r.tenant = j.tenant
+                LEFT JOIN tenants t ON t.tenant = j.tenant
+                WHERE j.state = ?
+                ORDER BY MAX(j.priority - CAST((? - j.created_at) / ? AS INTEGER), 0),
+                         COALESCE(r.running, 0),
+                         COALESCE(t.last_claimed_at, 0),
+                         j.created_at
+                LIMIT 1
+                """,
+                (RUNNING, QUEUED, now, self.config.ingest_priority_aging_seconds),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE jobs SET state = ?, attempts = attempts + 1, started_at = ?, heartbeat_at = ?, error = NULL "
+                "WHERE job_id = ?",
+                (RUNNING, now, now, row["job_id"]),
+            )
+            conn.execute(
+                "INSERT INTO tenants (tenant, last_claimed_at) VALUES (?, ?) "
+                "ON CONFLICT(tenant) DO UPDATE SET last_claimed_at = excluded.last_claimed_at",
+                (row["tenant"], now),
+            )
+            return self._job(conn.execute(f"SELECT {_COLUMNS} FROM jobs WHERE job_id = ?", (row["job_id"],)).fetchone())
+
+    def requeue_expired(self) -> List[Dict[str, Any]]:
+        """
+        Queue running jobs whose heartbeat is older than ``ingest_job_lease_seconds``.
+
+        Such jobs belonged to a worker that died or gave up on them. The
+        token that dispatched them was redelivered while the lease still
+        looked live and has been spent, so each needs a new queue message.
+
+        Returns:
+            The requeued jobs
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            rows = conn.execute(
+                f"SELECT {_COLUMNS} FROM jobs WHERE state = ? AND heartbeat_at < ?",
+                (RUNNING, now - self.config.ingest_job_lease_seconds),
+            ).fetchall()
+            conn.executemany(
+                "UPDATE jobs SET state = ?, queued_at = ?, dispatched_at = NULL WHERE job_id = ?",
+                [(QUEUED, now, row["job_id"]) for row in rows],
+            )
+        return [{**self._job(row), "state": QUEUED, "queued_at": now, "dispatched_at": None} for row in rows]
+
+    def undispatched(self, older_than: float) -> List[Dict[str, Any]]:
+        """
+        Queued jobs that have waited ``older_than`` seconds without their token being published.
+
+        Returns:
+            The jobs; each needs a queue message
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {_COLUMNS} FROM jobs WHERE state = ? AND dispatched_at IS NULL AND queued_at < ? "
+                "ORDER BY priority, created_at",
+                (QUEUED, time.time() - older_than),
+            ).fetchall()
+        return [self._job(row) for row in rows]
+
+    def mark_dispatched(self, job_id: str) -> None:
+        """Record that a queue message for the job has been published."""
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET dispatched_at = ? WHERE job_id = ? AND state = ?", (time.time(), job_id, QUEUED)
+            )
+
+    def heartbeat(self, job_id: str) -> None:
+        with self._transaction() as conn:
+            conn.execute("UPDATE jobs SET heartbeat_at = ? WHERE job_id = ? AND state = ?", (time.time(), job_id, RUNNING))
+
+    def finish(self, job_id: str) -> None:
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET state = ?, finished_at = ? WHERE job_id = ?", (DONE, time.time(), job_id)
+            )
+
+    def fail(self, job_id: str, error: str, retry: bool = False) -> None:
+        """Record a failed attempt; with ``retry`` the job goes back to the queue."""
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET state = ?, error = ?, finished_at = ? WHERE job_id = ?",
+                (QUEUED if retry else FAILED, error, None if retry else time.time(), job_id),
+            )
+
+    def cancel(self, job_id: str) -> None:
+        """Drop a job whose queue message could not be published."""
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM jobs WHERE job_id = ? AND state IN (?, ?)", (job_id, DEFERRED, QUEUED))
+
+    def promote_deferred(self) -> List[Dict[str, Any]]:
+        """
+        Queue deferred jobs, most urgent and oldest first, while the backlog is under its soft limits.
+
+        Returns:
+            The promoted jobs; each needs a queue message
+        """
+        promoted = []
+        now = time.time()
+        with self._transaction() as conn:
+            _, _, depth, tokens = self._backlog(conn)
+            rows = conn.execute(
+                f"SELECT {_COLUMNS} FROM jobs WHERE state = ? ORDER BY priority, created_at", (DEFERRED,)
+            ).fetchall()
+            for row in rows:
+                if depth >= self.config.ingest_defer_queue_depth:
+                    break
+                # Always let one job through an empty queue, however large
+                if depth and tokens + row["estimated_tokens"] > self.config.ingest_defer_token_backlog:
+                    break
+                conn.execute(
+                    "UPDATE jobs SET state = ?, queued_at = ? WHERE job_id = ?", (QUEUED, now, row["job_id"])
+                )
+                depth += 1
+                tokens += row["estimated_tokens"]
+                promoted.append({**self._job(row), "state": QUEUED, "queued_at": now})
+        return promoted
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """A job with its place in the queue (``queue_position``, 1-based) while it waits."""
+        with self._lock:
+            row = self._conn.execute(f"SELECT {_COLUMNS} FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            job = self._job(row)
+            if row["state"] in (QUEUED, DEFERRED):
+                # Approximate: ignores aging and tenant fairness
+                ahead = self._conn.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE state IN (?, ?) AND "
+                    "(priority < ? OR (priority = ? AND created_at < ?))",
+                    (QUEUED, DEFERRED, row["priority"], row["priority"], row["created_at"]),
+                ).fetchone()[0]
+                job["queue_position"] = ahead + 1
+        return job
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT state, COUNT(*) AS jobs, COALESCE(SUM(estimated_tokens), 0) AS tokens FROM jobs "
+                "WHERE state IN (?, ?, ?) GROUP BY state",
+                ACTIVE_STATES,
+            ).fetchall()
+        return {row["state"]: {"jobs": row["jobs"], "estimated_tokens": row["tokens"]} for row in rows}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _priority_for(self, estimated_tokens: int) -> int:
+        if estimated_tokens <= self.config.ingest_interactive_tokens:
+            return PRIORITIES["interactive"]
+        if estimated_tokens <= self.config.ingest_bulk_tokens:
+            return PRIORITIES["normal"]
+        return PRIORITIES["bulk"]
+
+    def _check_limits(self, conn: sqlite3.Connection, estimated_tokens: int) -> Tuple[int, int, int, int]:
+        backlog = self._backlog(conn)
+        depth, tokens = backlog[0], backlog[1]
+        if depth >= self.config.ingest_max_queue_depth or tokens + estimated_tokens > self.config.ingest_max_token_backlog:
+            raise QueueFullError(
+                f"Ingestion backlog is full ({depth} jobs, ~{tokens} tokens)",
+                retry_after=self.config.ingest_retry_after_seconds,
+            )
+        return backlog
+
+    @staticmethod
+    def _backlog(conn: sqlite3.Connection) -> Tuple[int, int, int, int]:
+        """(active jobs, their tokens, dispatched jobs, their tokens); dispatched excludes deferred."""
+        rows = conn.execute(
+            "SELECT state, COUNT(*), COALESCE(SUM(estimated_tokens), 0) FROM jobs WHERE state IN (?, ?, ?) "
+            "GROUP BY state",
+            ACTIVE_STATES,
+        ).fetchall()
+        depth = tokens = dispatched_depth = dispatched_tokens = 0
+        for state, jobs, job_tokens in rows:
+            depth += jobs
+            tokens += job_tokens
+            if state != DEFERRED:
+                dispatched_depth += jobs
+                dispatched_tokens += job_tokens
+        return depth, tokens, dispatched_depth, dispatched_tokens
+
+    @staticmethod
+    def _job(row: sqlite3.Row) -> Dict[str, Any]:
+        job = dict(row)
+        job["priority"] = PRIORITY_NAMES.get(job["priority"], job["priority"])
+        return job
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """``BEGIN IMMEDIATE`` ... ``COMMIT``, taking SQLite's write lock up front."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+
+_job_store: Optional[JobStore] = None
+_job_store_lock = threading.Lock()
+
+
+def get_job_store(config: Optional[ComponentsConfig] = None) -> JobStore:
+    """Process-wide job store in ``<storage_dir>/jobs.db``."""
+    global _job_store
+    with _job_store_lock:
+        if _job_store is None:
+            config = config or get_config()
+            _job_store = JobStore(Path(config.storage_dir) / "jobs.db", config)
+        return _job_store
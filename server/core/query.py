@@ -0,0 +1,81 @@
+import threading
+from typing import Dict, Optional, Tuple
+
+from llama_index.core import PropertyGraphIndex
+
+from config.settings import get_config, ComponentsConfig
+from core.registry import get_registry
+from core.retriever import HybridRetrieverStrategy, KnowledgeGraphRetrieverStrategy, RetrieverStrategy
+
+_kg_index: Optional[PropertyGraphIndex] = None
+_strategies: Dict[Tuple[int, int, bool], RetrieverStrategy] = {}
+_lock = threading.Lock()
+
+
+def get_kg_index(config: Optional[ComponentsConfig] = None) -> PropertyGraphIndex:
+    """
+    Return an index over the existing graph, built from the shared clients.
+
+    The graph store is resolved through the registry on every call, so its
+    health check runs for queries too. When the registry has rebuilt the
+    store, the index and the strategies bound to the old one are replaced.
+    """
+    global _kg_index
+    config = config or get_config()
+    registry = get_registry(config)
+    graph_store = registry.graph_store
+    with _lock:
+        if _kg_index is None or _kg_index.property_graph_store is not graph_store:
+            _kg_index = PropertyGraphIndex.from_existing(
+                property_graph_store=graph_store,
+                llm=registry.llm,
+                embed_model=registry.embed_model,
+            )
+            _strategies.clear()
+        return _kg_index
+
+
+def get_retriever_strategy(
+    config: Optional[ComponentsConfig] = None,
+    similarity_top_k: Optional[int] = None,
+    path_depth: Optional[int] = None,
+    include_text: Optional[bool] = None,
+) -> RetrieverStrategy:
+    """
+    Return the shared retriever strategy for a set of retrieval parameters.
+
+    Unset parameters fall back to the configured defaults. With
+    ``retrieval_strategy="hybrid"`` the knowledge graph strategy is fused
+    with BM25 keyword hits; the registry enables the keyword index for it.
+    """
+    config = config or get_config()
+    params = (
+        similarity_top_k if similarity_top_k is not None else config.similarity_top_k,
+        path_depth if path_depth is not None else config.path_depth,
+        include_text if include_text is not None else config.include_text,
+    )
+    kg_index = get_kg_index(config)
+    with _lock:
+        # Another request may have replaced the index since it was resolved
+        if params not in _strategies or kg_index is not _kg_index:
+            registry = get_registry(config)
+            strategy = KnowledgeGraphRetrieverStrategy(
+                kg_index,
+                registry.embed_model,
+                similarity_top_k=params[0],
+                path_depth=params[1],
+                include_text=params[2],
+                config=config,
+            )
+            if config.retrieval_strategy == "hybrid" and registry.keyword_index is not None:
+                strategy = HybridRetrieverStrategy(
+                    strategy,
+                    registry.keyword_index,
+                    keyword_top_k=config.keyword_top_k,
+                    top_n=config.hybrid_top_n,
+                    rrf_k=config.rrf_k,
+                )
+            if kg_index is not _kg_index:
+                return strategy
+            _strategies[params] = strategy
+        return _strategies[params]
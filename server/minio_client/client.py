@@ -1,19 +1,82 @@
+import hashlib
+import io
+import os
 from minio import Minio
+from minio.error import S3Error
+
+DEFAULT_PART_SIZE = 5 * 1024 * 1024  # smallest part size S3 multipart accepts
+
+
+class HashingReader:
+    """File-like wrapper that hashes bytes as they are read from the underlying stream."""
+
+    def __init__(self, stream, algorithm="sha256"):
+        self.stream = stream
+        self.hash = hashlib.new(algorithm)
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        chunk = self.stream.read(size)
+        self.hash.update(chunk)
+        self.bytes_read += len(chunk)
+        return chunk
+
+    def hexdigest(self):
+        return self.hash.hexdigest()
+
 
 class MinioClient:
     def __init__(self, endpoint, access_key, secret_key):
         self.endpoint = endpoint
         self.client = Minio(endpoint, access_key=access_key, secret_key=secret_key, secure=False)
 
+    @classmethod
+    def from_env(cls):
+        return cls(
+            os.getenv("MINIO_URL", "s3:9000"),
+            os.getenv("MINIO_USER", "guestuser"),
+            os.getenv("MINIO_PASSWORD", "supersecret123"),
+        )
+
     def create_bucket(self, bucket_name):
         self.client.make_bucket(bucket_name)
 
     def upload_file(self, bucket_name, object_name, file_path):
         self.client.fput_object(bucket_name, object_name, file_path)
 
+    def upload_stream(self, bucket_name, object_name, stream, length=-1, part_size=DEFAULT_PART_SIZE,
+                      content_type="application/octet-stream", metadata=None):
+        """Upload from a readable stream, holding at most one part in memory at a time."""
+        return self.client.put_object(
+            bucket_name,
+            object_name,
+            stream,
+            length,
+            content_type=content_type or "application/octet-stream",
+            metadata=metadata,
+            part_size=part_size,
+            num_parallel_uploads=1,
+        )
+
     def download_file(self, bucket_name, object_name, file_path):
         self.client.fget_object(bucket_name, object_name, file_path)
 
+    def stat_object(self, bucket_name, object_name):
+        """Return object info, or None if the object does not exist."""
+        try:
+            return self.client.stat_object(bucket_name, object_name)
+        except S3Error as e:
+            if e.code in ("NoSuchKey", "NoSuchObject", "ResourceNotFound"):
+                return None
+            raise
+
+    def object_exists(self, bucket_name, object_name):
+        return self.stat_object(bucket_name, object_name) is not None
+
+    def put_marker(self, bucket_name, object_name, metadata):
+        """Write an empty object that only carries metadata."""
+        self.client.put_object(bucket_name, object_name, io.BytesIO(b""), 0, metadata=metadata)
+
     def list_objects(self, bucket_name):
         return self.client.list_objects(bucket_name)
 
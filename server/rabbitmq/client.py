@@ -2,6 +2,17 @@ import pika
 import os
 
 
+def get_connection_parameters():
+    credentials = pika.PlainCredentials(
+        os.getenv("RABBITMQ_USER", "guest"), os.getenv("RABBITMQ_PASSWORD", "guest")
+    )
+    return pika.ConnectionParameters(
+        host=os.getenv("RABBITMQ_HOST", "localhost"),
+        port=int(os.getenv("RABBITMQ_PORT", 5672)),
+        credentials=credentials,
+    )
+
+
 class RabbitMQ:
     def __init__(self):
         self.user = os.getenv("RABBITMQ_USER", "guest")
@@ -13,22 +24,20 @@ class RabbitMQ:
         self.connect()
 
     def connect(self):
-        credentials = pika.PlainCredentials(self.user, self.password)
-        parameters = pika.ConnectionParameters(
-            host=self.host, port=self.port, credentials=credentials
-        )
-        self.connection = pika.BlockingConnection(parameters)
+        self.connection = pika.BlockingConnection(get_connection_parameters())
         self.channel = self.connection.channel()
 
     def close(self):
         if self.connection and not self.connection.is_closed:
             self.connection.close()
 
-    def consume(self, queue_name, callback):
+    def consume(self, queue_name, callback, auto_ack=True, prefetch_count=None):
         if not self.channel:
             raise Exception("Connection is not established.")
+        if prefetch_count:
+            self.channel.basic_qos(prefetch_count=prefetch_count)
         self.channel.basic_consume(
-            queue=queue_name, on_message_callback=callback, auto_ack=True
+            queue=queue_name, on_message_callback=callback, auto_ack=auto_ack
         )
         self.channel.start_consuming()
 
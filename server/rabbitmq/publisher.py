@@ -0,0 +1,215 @@
+import asyncio
+import concurrent.futures
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+import pika
+from pika.exceptions import ConnectionWrongStateError
+
+from server.rabbitmq.client import get_connection_parameters
+
+
+class RabbitMQPublisher:
+    """
+    Long-lived, non-blocking RabbitMQ publisher.
+
+    A single SelectConnection runs its I/O loop on a background thread and
+    keeps a pool of channels in publisher-confirm mode. ``publish`` hands the
+    message to that thread and awaits the broker confirm without blocking the
+    event loop; confirms are tracked per delivery tag so the broker can ack
+    many messages at once. Messages that were not confirmed when the
+    connection dropped are re-sent after reconnecting.
+    """
+
+    def __init__(self, channel_count=None, reconnect_delay=5.0, confirm_timeout=10.0):
+        self.channel_count = channel_count or int(os.getenv("RABBITMQ_PUBLISH_CHANNELS", 4))
+        self.reconnect_delay = reconnect_delay
+        self.confirm_timeout = confirm_timeout
+        self._parameters = get_connection_parameters()
+        self._connection = None
+        self._thread = None
+        self._stopping = False
+        self._stop_event = threading.Event()
+        self._outbox = deque()
+        self._channels = []
+        self._channel_cycle = None
+        self._declared = {}
+        self._delivery_tags = {}
+        self._unconfirmed = {}
+
+    @property
+    def is_connected(self):
+        return bool(self._channels) and self._connection is not None and self._connection.is_open
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopping = False
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="rabbitmq-publisher", daemon=True)
+        self._thread.start()
+
+    def stop(self, drain_timeout=5.0):
+        """Wait briefly for outstanding confirms, then close the connection."""
+        deadline = time.monotonic() + drain_timeout
+        while self.is_connected and self._has_pending() and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+        self._stopping = True
+        self._stop_event.set()
+        connection = self._connection
+        if connection is not None:
+            try:
+                connection.ioloop.add_callback_threadsafe(self._close_connection)
+            except Exception:
+                pass
+        if self._thread is not None:
+            self._thread.join(timeout=drain_timeout)
+            self._thread = None
+
+    async def publish(self, queue_name, message, timeout=None):
+        """Publish a persistent message and wait until the broker confirms it."""
+        future = concurrent.futures.Future()
+        self._outbox.append((queue_name, message, future))
+        self._schedule_drain()
+        await asyncio.wait_for(asyncio.wrap_future(future), timeout or self.confirm_timeout)
+        print(f"Sent message to queue {queue_name}: {message}")
+
+    def _has_pending(self):
+        if any(not future.done() for _, _, future in list(self._outbox)):
+            return True
+        return any(pending for pending in list(self._unconfirmed.values()))
+
+    # Everything below runs on the I/O loop thread.
+
+    def _run(self):
+        while not self._stopping:
+            print("🔌 Publisher connecting to RabbitMQ...")
+            self._connection = pika.SelectConnection(
+                parameters=self._parameters,
+                on_open_callback=self._on_connection_open,
+                on_open_error_callback=self._on_connection_open_error,
+                on_close_callback=self._on_connection_closed,
+            )
+            self._connection.ioloop.start()
+            if not self._stopping:
+                self._stop_event.wait(self.reconnect_delay)
+
+    def _schedule_drain(self):
+        connection = self._connection
+        if connection is None or not self._channels:
+            # Picked up once a channel opens
+            return
+        try:
+            connection.ioloop.add_callback_threadsafe(self._drain)
+        except (ConnectionWrongStateError, AttributeError, RuntimeError):
+            pass
+
+    def _on_connection_open(self, connection):
+        print("✅ Publisher connected to RabbitMQ")
+        for _ in range(self.channel_count):
+            connection.channel(on_open_callback=self._on_channel_open)
+
+    def _on_connection_open_error(self, connection, error):
+        print(f"❌ Publisher connection failed: {error}")
+        connection.ioloop.stop()
+
+    def _on_connection_closed(self, connection, reason):
+        if not self._stopping:
+            print(f"❌ Publisher connection closed: {reason}")
+        for channel in list(self._channels):
+            self._requeue_unconfirmed(channel.channel_number)
+        self._channels = []
+        self._channel_cycle = None
+        connection.ioloop.stop()
+
+    def _on_channel_open(self, channel):
+        channel.add_on_close_callback(self._on_channel_closed)
+        channel.confirm_delivery(
+            ack_nack_callback=self._on_delivery_confirmation,
+            callback=lambda _frame: self._on_channel_ready(channel),
+        )
+
+    def _on_channel_ready(self, channel):
+        number = channel.channel_number
+        self._declared[number] = set()
+        self._delivery_tags[number] = itertools.count(1)
+        self._unconfirmed[number] = OrderedDict()
+        self._channels.append(channel)
+        self._channel_cycle = itertools.cycle(list(self._channels))
+        self._drain()
+
+    def _on_channel_closed(self, channel, reason):
+        if channel not in self._channels:
+            return
+        self._channels.remove(channel)
+        self._channel_cycle = itertools.cycle(list(self._channels)) if self._channels else None
+        self._requeue_unconfirmed(channel.channel_number)
+        connection = self._connection
+        if not self._stopping and connection is not None and connection.is_open:
+            print(f"⚠️ Publisher channel {channel.channel_number} closed: {reason}, reopening")
+            connection.channel(on_open_callback=self._on_channel_open)
+
+    def _drain(self):
+        while self._outbox and self._channel_cycle is not None:
+            queue_name, message, future = self._outbox.popleft()
+            if future.done():
+                continue
+            channel = next(self._channel_cycle)
+            number = channel.channel_number
+            try:
+                if queue_name not in self._declared[number]:
+                    channel.queue_declare(queue=queue_name, durable=True)
+                    self._declared[number].add(queue_name)
+                channel.basic_publish(
+                    exchange="",
+                    routing_key=queue_name,
+                    body=message,
+                    properties=pika.BasicProperties(
+                        delivery_mode=2,  # make message persistent
+                    ),
+                )
+            except Exception:
+                self._outbox.appendleft((queue_name, message, future))
+                return
+            tag = next(self._delivery_tags[number])
+            self._unconfirmed[number][tag] = (queue_name, message, future)
+
+    def _on_delivery_confirmation(self, frame):
+        method = frame.method
+        # Delivery tags are numbered per channel
+        number = frame.channel_number
+        pending = self._unconfirmed.get(number)
+        if pending is None:
+            return
+        if method.multiple:
+            tags = [tag for tag in pending if tag <= method.delivery_tag]
+        else:
+            tags = [method.delivery_tag] if method.delivery_tag in pending else []
+        acked = isinstance(method, pika.spec.Basic.Ack)
+        for tag in tags:
+            _, _, future = pending.pop(tag)
+            try:
+                if acked:
+                    future.set_result(True)
+                else:
+                    future.set_exception(RuntimeError("Message was rejected by RabbitMQ"))
+            except concurrent.futures.InvalidStateError:
+                # The publisher gave up waiting (timeout or cancellation)
+                pass
+
+    def _requeue_unconfirmed(self, number):
+        pending = self._unconfirmed.pop(number, None) or {}
+        for item in reversed(list(pending.values())):
+            self._outbox.appendleft(item)
+        self._declared.pop(number, None)
+        self._delivery_tags.pop(number, None)
+
+    def _close_connection(self):
+        if self._connection is not None and self._connection.is_open:
+            self._connection.close()
+        elif self._connection is not None:
+            self._connection.ioloop.stop()
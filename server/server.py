@@ -1,11 +1,29 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from server.api.routes import health
 from server.api.routes.documents import router as documents_router
+from server.api.routes.metrics import router as metrics_router
+from server.api.routes.query import router as query_router
+from server.rabbitmq.publisher import RabbitMQPublisher
 
-app = FastAPI(title="My API Server")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    publisher = RabbitMQPublisher()
+    publisher.start()
+    app.state.rabbitmq_publisher = publisher
+    try:
+        yield
+    finally:
+        publisher.stop()
+
+
+app = FastAPI(title="My API Server", lifespan=lifespan)
 
 app.include_router(health.router, prefix="/api/v1", tags=["health"])
 app.include_router(documents_router, prefix="/api/v1")
+app.include_router(query_router, prefix="/api/v1")
+app.include_router(metrics_router, prefix="/api/v1")
 
 
 @app.get("/")
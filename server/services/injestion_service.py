@@ -1,20 +1,64 @@
 import sys
 import time
 import os
+import asyncio
+import functools
+import multiprocessing
+import signal
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import urlparse, unquote
+import pika
+from starlette.datastructures import UploadFile
+from config.settings import get_config
+from core.metrics import span, start_metrics_server
+from core.registry import get_registry
+from server.core.ingest import build_knowledge_graph
+from server.core.jobs import decode_message, encode_message, get_job_store
+from server.minio_client.client import MinioClient
 from server.rabbitmq.client import RabbitMQ
 
+MAX_IN_FLIGHT = int(os.getenv("INGESTION_MAX_IN_FLIGHT", 2))
+PREFETCH_COUNT = int(os.getenv("INGESTION_PREFETCH", MAX_IN_FLIGHT))
+
+# Set on SIGTERM/SIGINT: stop taking deliveries, finish the ones in flight, then exit
+_stop_requested = threading.Event()
+
 def start_listener(queue_name):
     rabbitmq = None
+    # Prefetch keeps at most PREFETCH_COUNT unacked deliveries on this consumer,
+    # which in turn bounds the work queued on the executor.
+    executor = ThreadPoolExecutor(max_workers=MAX_IN_FLIGHT, thread_name_prefix="ingest")
+    # Delivery tag -> future of the deliveries handed to the executor on the current connection
+    in_flight = {}
+    drained = True
 
-    while True:
+    while not _stop_requested.is_set():
         try:
             print("🔌 Connecting to RabbitMQ...")
             rabbitmq = RabbitMQ()
+            in_flight.clear()
             print(f"📋 Declaring queue {queue_name}...")
             rabbitmq.channel.queue_declare(queue=queue_name, durable=True)
+            # Deferred jobs whose backlog drained while no worker was running
+            _dispatch_deferred(rabbitmq.channel, get_job_store(), queue_name)
+            _watch_for_stop(rabbitmq)
+            _sweep_jobs(rabbitmq, get_job_store(), queue_name, get_config().ingest_job_lease_seconds / 2)
             print(f"👂 Listening for messages on queue {queue_name}")
-            print("✅ Successfully connected and listening...")
-            rabbitmq.consume(queue_name=queue_name, callback=_message_callback)
+            print(f"✅ Successfully connected and listening (prefetch={PREFETCH_COUNT}, in-flight={MAX_IN_FLIGHT})...")
+            rabbitmq.consume(
+                queue_name=queue_name,
+                callback=functools.partial(
+                    _message_callback, executor=executor, queue_name=queue_name, in_flight=in_flight
+                ),
+                auto_ack=False,
+                prefetch_count=PREFETCH_COUNT,
+            )
+            if _stop_requested.is_set():
+                drained = _drain(rabbitmq, in_flight, get_config().ingest_drain_timeout_seconds)
+                rabbitmq = None
         except Exception as e:
             print(f"❌ Error: {e}")
             import traceback
@@ -22,24 +66,308 @@ def start_listener(queue_name):
             if rabbitmq:
                 rabbitmq.close()
             rabbitmq = None
+            if _stop_requested.is_set():
+                break
             print("💤 Sleeping 5 seconds before retry...")
-            time.sleep(5)
+            _stop_requested.wait(5)
+    executor.shutdown(wait=drained, cancel_futures=True)
+    return drained
+
+def _watch_for_stop(rabbitmq, interval=0.5):
+    """Stop consuming from the connection thread once a stop is requested; signal handlers only set the flag."""
+    def check():
+        if _stop_requested.is_set():
+            rabbitmq.channel.stop_consuming()
+        else:
+            rabbitmq.connection.call_later(interval, check)
+    rabbitmq.connection.call_later(interval, check)
+
+def _sweep_jobs(rabbitmq, job_store, queue_name, interval):
+    """
+    Periodically publish tokens for jobs that lost theirs.
+
+    That is jobs whose worker stopped heartbeating, and queued jobs whose
+    token was never published (a failed publish, or a publisher that died
+    between queueing the job and publishing).
+    """
+    def sweep():
+        try:
+            expired = job_store.requeue_expired()
+            # Give publishes that are still on their way an interval to land
+            undispatched = job_store.undispatched(interval)
+        except Exception as e:
+            print(f"⚠️ Could not sweep ingestion jobs: {e}")
+            expired, undispatched = [], []
+        for job in expired:
+            print(f"♻️ Lease of job {job['job_id']} expired, queueing it again")
+        for job in undispatched:
+            print(f"♻️ Job {job['job_id']} has no queue message, dispatching it again")
+        _publish_tokens(rabbitmq.channel, expired + undispatched, queue_name)
+        if not _stop_requested.is_set():
+            rabbitmq.connection.call_later(interval, sweep)
+    sweep()
+
+def _drain(rabbitmq, in_flight, timeout):
+    """
+    Finish the deliveries in flight and deliver their acks, then close the connection.
+
+    Returns:
+        False if deliveries were still running when ``timeout`` ran out
+    """
+    # Deliveries still waiting for an executor thread go back to the queue for other workers
+    for tag, future in list(in_flight.items()):
+        if future.cancel():
+            in_flight.pop(tag, None)
+            rabbitmq.channel.basic_nack(delivery_tag=tag, requeue=True)
+    print(f"⏳ Draining {len(in_flight)} in-flight deliveries (timeout {timeout:.0f}s)...")
+    deadline = time.monotonic() + timeout
+    # Acks are marshalled onto this thread, so keep servicing the connection while jobs finish
+    while in_flight and time.monotonic() < deadline:
+        rabbitmq.connection.process_data_events(time_limit=0.5)
+    rabbitmq.connection.process_data_events(time_limit=0)
+    if in_flight:
+        print(f"⚠️ Drain timed out with {len(in_flight)} deliveries unfinished; they will be redelivered")
+    else:
+        print("✅ Drained all in-flight deliveries")
+    rabbitmq.close()
+    return not in_flight
 
-def _message_callback(ch, method, properties, body):
-    """Callback function to process received messages"""
+def _message_callback(ch, method, properties, body, executor, queue_name, in_flight):
+    """Hand a delivery to the worker pool; it is acked once the graph write has finished."""
     try:
         message = body.decode('utf-8')
         print(f"📨 Received message: {message}")
+        tag = method.delivery_tag
+        future = executor.submit(_process_message, ch, method, message, queue_name)
+        in_flight[tag] = future
+        future.add_done_callback(lambda _: in_flight.pop(tag, None))
+    except Exception as e:
+        print(f"❌ Error dispatching message: {e}")
+        ch.basic_nack(delivery_tag=method.delivery_tag, requeue=not method.redelivered)
 
-        print(f"🔄 Processing document URL: {message}")
+def _process_message(ch, method, message, queue_name):
+    """
+    Runs on a worker thread. Channel calls are marshalled back to the connection thread.
 
-        # TODO: Add actual ingestion logic here
-        # This is where you would call the ingest logic
+    A message is a dispatch token rather than a specific document: the worker
+    claims whichever queued job the job store schedules next.
+    """
+    connection = ch.connection
+    config = get_config()
+    try:
+        job_store = get_job_store(config)
+        job_id, url = decode_message(message)
+        if job_id is None:
+            # Published before the job table existed; its token is this message
+            legacy_job, _ = job_store.admit(url, Path(url).name, enforce_limits=False)
+            job_store.mark_dispatched(legacy_job["job_id"])
+        job = job_store.claim_next()
+    except Exception as e:
+        print(f"❌ Error claiming a job for message {message}: {e}")
+        connection.add_callback_threadsafe(
+            functools.partial(ch.basic_nack, delivery_tag=method.delivery_tag, requeue=not method.redelivered)
+        )
+        return
 
-        print(f"✅ Successfully processed message: {message}")
+    if job is None:
+        # Also the fate of a dead worker's redelivered token; the lease sweep re-dispatches its job
+        print(f"📭 No queued job for message {message}")
+        connection.add_callback_threadsafe(functools.partial(ch.basic_ack, delivery_tag=method.delivery_tag))
+        return
 
+    heartbeat_stop = threading.Event()
+    heartbeat = threading.Thread(
+        target=_heartbeat,
+        args=(job_store, job["job_id"], heartbeat_stop, config.ingest_job_lease_seconds / 3),
+        name=f"heartbeat-{job['job_id'][:8]}",
+        daemon=True,
+    )
+    heartbeat.start()
+    try:
+        print(f"🔄 Processing job {job['job_id']} ({job['priority']}, tenant {job['tenant']}): {job['url']}")
+        with span("ingest"):
+            ingest_object(job["url"])
+        heartbeat_stop.set()
+        job_store.finish(job["job_id"])
+        print(f"✅ Successfully processed job {job['job_id']}")
+        connection.add_callback_threadsafe(
+            functools.partial(ch.basic_ack, delivery_tag=method.delivery_tag)
+        )
     except Exception as e:
-        print(f"❌ Error processing message: {e}")
+        heartbeat_stop.set()
+        # Retry via redelivery of the token until the job runs out of attempts, then drop it
+        retry = job["attempts"] < config.ingest_max_attempts
+        job_store.fail(job["job_id"], str(e), retry=retry)
+        print(f"❌ Error processing job {job['job_id']}: {e} (retry={retry})")
+        connection.add_callback_threadsafe(
+            functools.partial(ch.basic_nack, delivery_tag=method.delivery_tag, requeue=retry)
+        )
+    finally:
+        heartbeat_stop.set()
+        _dispatch_deferred(ch, job_store, queue_name)
+
+def _heartbeat(job_store, job_id, stop, interval):
+    while not stop.wait(interval):
+        try:
+            job_store.heartbeat(job_id)
+        except Exception as e:
+            print(f"⚠️ Heartbeat failed for job {job_id}: {e}")
+
+def _dispatch_deferred(ch, job_store, queue_name):
+    """Queue deferred jobs the shrinking backlog now has room for."""
+    try:
+        promoted = job_store.promote_deferred()
+    except Exception as e:
+        print(f"⚠️ Could not promote deferred jobs: {e}")
+        return
+    for job in promoted:
+        print(f"⏩ Dispatching deferred job {job['job_id']}")
+    _publish_tokens(ch, promoted, queue_name)
+
+def _publish_tokens(ch, jobs, queue_name):
+    """Publish a dispatch token per job; safe to call from any thread."""
+    for job in jobs:
+        try:
+            ch.connection.add_callback_threadsafe(functools.partial(_publish_token, ch, job, queue_name))
+        except Exception as e:
+            print(f"⚠️ Could not dispatch job {job['job_id']}, the sweep will retry: {e}")
+
+def _publish_token(ch, job, queue_name):
+    """Runs on the connection thread; a job stays undispatched unless its token went out."""
+    try:
+        ch.basic_publish(
+            exchange="",
+            routing_key=queue_name,
+            body=encode_message(job["job_id"], job["url"]),
+            properties=pika.BasicProperties(delivery_mode=2),
+        )
+        get_job_store().mark_dispatched(job["job_id"])
+    except Exception as e:
+        print(f"⚠️ Could not dispatch job {job['job_id']}, the sweep will retry: {e}")
+
+def ingest_object(url):
+    """Download the object named by a MinIO URL and build its knowledge graph."""
+    bucket_name, object_name = _parse_object_url(url)
+    minio_client = MinioClient.from_env()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        file_path = os.path.join(temp_dir, Path(object_name).name)
+        minio_client.download_file(bucket_name, object_name, file_path)
+        with open(file_path, "rb") as f:
+            upload = UploadFile(file=f, filename=Path(object_name).name)
+            asyncio.run(build_knowledge_graph(upload, config=get_config()))
+
+def _parse_object_url(url):
+    path = unquote(urlparse(url).path).lstrip("/")
+    bucket_name, _, object_name = path.partition("/")
+    if not bucket_name or not object_name:
+        raise ValueError(f"Not a MinIO object URL: {url}")
+    return bucket_name, object_name
+
+def run_worker(queue_name, worker_index=0):
+    """Consume and ingest until SIGTERM/SIGINT, then drain in-flight deliveries and exit."""
+    signal.signal(signal.SIGTERM, _request_stop)
+    signal.signal(signal.SIGINT, _request_stop)
+    config = get_config()
+    metrics_port = config.ingest_metrics_port + worker_index
+    try:
+        start_metrics_server(metrics_port)
+        print(f"📈 Serving metrics on :{metrics_port}/api/v1/metrics")
+    except OSError as e:
+        print(f"⚠️ Could not serve metrics on :{metrics_port}: {e}")
+
+    print(f"👂 Starting listener for queue: {queue_name}")
+    try:
+        drained = start_listener(queue_name)
+    finally:
+        get_registry().close()
+    if not drained:
+        # Ingest threads cannot be interrupted; their jobs are requeued once the lease expires
+        print("👋 Worker stopped with unfinished jobs")
+        os._exit(1)
+    print("👋 Worker stopped")
+
+def _request_stop(signum, frame):
+    if not _stop_requested.is_set():
+        print(f"🛑 Received signal {signum}, draining in-flight jobs...")
+    _stop_requested.set()
+
+def available_cores():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+def worker_count(config):
+    """Worker processes to run: ``ingest_worker_processes``, or one per available core when 0."""
+    if config.ingest_worker_processes > 0:
+        return config.ingest_worker_processes
+    return available_cores()
+
+def supervise(queue_name, workers):
+    """
+    Run ``workers`` forked worker processes, each with its own consumer and prefetch.
+
+    Crashed workers are restarted with exponential backoff. On SIGTERM/SIGINT
+    the signal is forwarded so every worker drains its in-flight jobs, and the
+    supervisor exits once they have all stopped.
+    """
+    config = get_config()
+    context = multiprocessing.get_context("fork")
+    # Split the cores between the workers' local PDF parser pools
+    pdf_parser_workers = config.pdf_parser_workers or max(1, available_cores() // workers)
+
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.set())
+    signal.signal(signal.SIGINT, lambda signum, frame: stopping.set())
+
+    def start(index):
+        process = context.Process(
+            target=_worker_main,
+            args=(queue_name, index, pdf_parser_workers),
+            name=f"ingest-worker-{index}",
+        )
+        process.start()
+        print(f"🧵 Started worker {index} (pid {process.pid})")
+        return process
+
+    processes = {index: start(index) for index in range(workers)}
+    failures = {index: 0 for index in range(workers)}
+    restart_at = {}
+    started_at = {index: time.monotonic() for index in range(workers)}
+
+    while not stopping.wait(1.0):
+        for index, process in list(processes.items()):
+            if process.is_alive() or index in restart_at:
+                continue
+            # A worker that ran for a while before dying gets a fresh backoff
+            failures[index] = 1 if time.monotonic() - started_at[index] > 60 else failures[index] + 1
+            delay = min(60.0, 2.0 ** (failures[index] - 1))
+            print(f"💥 Worker {index} (pid {process.pid}) exited with code {process.exitcode}, restarting in {delay:.0f}s")
+            restart_at[index] = time.monotonic() + delay
+        for index, at in list(restart_at.items()):
+            if time.monotonic() >= at:
+                del restart_at[index]
+                processes[index] = start(index)
+                started_at[index] = time.monotonic()
+
+    print(f"🛑 Stopping {len(processes)} workers...")
+    for process in processes.values():
+        if process.is_alive():
+            os.kill(process.pid, signal.SIGTERM)
+    deadline = time.monotonic() + config.ingest_drain_timeout_seconds + 10
+    for process in processes.values():
+        process.join(max(0.0, deadline - time.monotonic()))
+        if process.is_alive():
+            print(f"⚠️ Worker {process.name} did not drain in time, killing it")
+            process.kill()
+            process.join()
+
+def _worker_main(queue_name, worker_index, pdf_parser_workers):
+    config = get_config()
+    if config.pdf_parser_workers is None:
+        config.pdf_parser_workers = pdf_parser_workers
+    run_worker(queue_name, worker_index)
 
 def main():
     """Entry point for the ingestion service"""
@@ -59,11 +387,12 @@ def main():
         print(f"  - RABBITMQ_PORT: {os.getenv('RABBITMQ_PORT', 'not set')}")
         print(f"  - RABBITMQ_USER: {os.getenv('RABBITMQ_USER', 'not set')}")
 
-        print(f"👂 Starting listener for queue: {queue_name}")
-        start_listener(queue_name)
-
-    except KeyboardInterrupt:
-        print("\n🛑 Shutting down ingestion service...")
+        workers = worker_count(get_config())
+        if workers > 1:
+            print(f"🧑‍🏭 Supervising {workers} worker processes")
+            supervise(queue_name, workers)
+        else:
+            run_worker(queue_name)
         print("👋 Goodbye!")
         sys.exit(0)
     except Exception as e:
@@ -0,0 +1,166 @@
+import time
+
+import pytest
+from llama_index.core.graph_stores import SimplePropertyGraphStore
+from llama_index.core.graph_stores.types import EntityNode, Relation, TRIPLET_SOURCE_KEY
+
+import core.adjacency as adjacency
+from core.adjacency import AdjacencySnapshot, build_adjacency_snapshot, iter_graph_edges
+
+
+def edge(source, rel_type, target, source_chunk=None, target_chunk=None):
+    return (source, "PERSON", source_chunk, rel_type, target, "PERSON", target_chunk)
+
+
+def triplet_keys(triplets):
+    return [(source.id, relation.label, target.id) for source, relation, target in triplets]
+
+
+# a -KNOWS-> b -KNOWS-> c -KNOWS-> d, and e -LIKES-> a
+CHAIN = [
+    edge("a", "KNOWS", "b", "chunk-a", "chunk-b"),
+    edge("b", "KNOWS", "c"),
+    edge("c", "KNOWS", "d"),
+    edge("e", "LIKES", "a"),
+]
+
+
+@pytest.fixture
+def snapshot(tmp_path):
+    return AdjacencySnapshot(tmp_path / "adjacency", reload_interval=0)
+
+
+def test_empty_before_first_build(snapshot):
+    assert not snapshot.exists()
+    assert snapshot.version is None
+    assert snapshot.expand(["a"]) == {}
+    assert snapshot.warm(2) == 0
+
+
+def test_build_round_trip(snapshot):
+    assert snapshot.build(CHAIN) == 4
+    assert snapshot.exists()
+    assert snapshot.size == 5
+    assert "a" in snapshot and "z" not in snapshot
+
+    [(source, relation, target)] = snapshot.expand(["d"], depth=1)["d"]
+    assert (source.id, relation.label, target.id) == ("c", "KNOWS", "d")
+    assert source.label == "PERSON"
+
+
+def test_expansion_is_undirected_and_nearest_first(snapshot):
+    snapshot.build(CHAIN)
+    assert triplet_keys(snapshot.expand(["a"], depth=1)["a"]) == [("a", "KNOWS", "b"), ("e", "LIKES", "a")]
+    assert triplet_keys(snapshot.expand(["a"], depth=2)["a"]) == [
+        ("a", "KNOWS", "b"),
+        ("e", "LIKES", "a"),
+        ("b", "KNOWS", "c"),
+    ]
+    assert len(snapshot.expand(["a"], depth=3)["a"]) == 4
+
+
+def test_expand_skips_unknown_ids(snapshot):
+    snapshot.build(CHAIN)
+    assert set(snapshot.expand(["a", "missing"], depth=1)) == {"a"}
+
+
+def test_expand_limit_and_ignored_relations(snapshot):
+    snapshot.build(CHAIN)
+    assert len(snapshot.expand(["a"], depth=3, limit=2)["a"]) == 2
+    assert triplet_keys(snapshot.expand(["a"], depth=1, ignore_rels=["LIKES"])["a"]) == [("a", "KNOWS", "b")]
+    # Ignoring a type the snapshot does not know is harmless
+    assert len(snapshot.expand(["a"], depth=1, ignore_rels=["MENTIONS"])["a"]) == 2
+
+
+def test_fanout_is_bounded_per_hop(tmp_path):
+    snapshot = AdjacencySnapshot(tmp_path / "adjacency", max_fanout=3, reload_interval=0)
+    snapshot.build([edge("hub", "KNOWS", f"n{i}") for i in range(10)])
+    assert len(snapshot.expand(["hub"], depth=1, limit=30)["hub"]) == 3
+
+
+def test_duplicate_rows_are_stored_once(snapshot):
+    assert snapshot.build(CHAIN + CHAIN[:2]) == 4
+
+
+def test_triplet_source_ids_are_kept(snapshot):
+    snapshot.build(CHAIN)
+    [(source, _, target)] = snapshot.expand(["a"], depth=1, ignore_rels=["LIKES"])["a"]
+    assert source.properties == {TRIPLET_SOURCE_KEY: "chunk-a"}
+    assert target.properties == {TRIPLET_SOURCE_KEY: "chunk-b"}
+
+
+def test_hot_neighborhoods_are_memoized(tmp_path):
+    snapshot = AdjacencySnapshot(tmp_path / "adjacency", hot_entities=1, reload_interval=0)
+    snapshot.build(CHAIN)
+    assert snapshot.warm(2) == 1
+    first = snapshot.expand(["a"], depth=2)
+    assert snapshot.expand(["a"], depth=2) == first
+    assert snapshot._load().hot_cache
+
+
+def test_warm_parameters_apply_to_later_versions(tmp_path):
+    snapshot = AdjacencySnapshot(tmp_path / "adjacency", hot_entities=1, reload_interval=0)
+    snapshot.warm(2)
+    snapshot.build(CHAIN)
+    current = snapshot._load()
+    # Warmed on a background thread as the version loads
+    deadline = time.monotonic() + 5
+    while not current.hot_cache and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert current.hot_cache
+
+
+def test_readers_pick_up_new_versions(tmp_path):
+    writer = AdjacencySnapshot(tmp_path / "adjacency")
+    reader = AdjacencySnapshot(tmp_path / "adjacency", reload_interval=0)
+    writer.build(CHAIN[:1])
+    assert "c" not in reader
+    writer.build(CHAIN)
+    assert "c" in reader
+
+
+def test_old_versions_are_kept_for_the_grace_period(snapshot, monkeypatch):
+    for _ in range(4):
+        snapshot.build(CHAIN)
+    assert len(list(snapshot.directory.glob("v*"))) == 4
+
+    monkeypatch.setattr(adjacency, "VERSION_GRACE_SECONDS", -1)
+    snapshot.build(CHAIN)
+    assert len(list(snapshot.directory.glob("v*"))) == 2
+
+
+def test_reader_retries_when_its_version_is_removed(tmp_path, monkeypatch):
+    monkeypatch.setattr(adjacency, "VERSION_GRACE_SECONDS", -1)
+    writer = AdjacencySnapshot(tmp_path / "adjacency")
+    reader = AdjacencySnapshot(tmp_path / "adjacency", reload_interval=0)
+    writer.build(CHAIN[:1])
+    load_json = adjacency.json.load
+    raced = []
+
+    def racing_load(f):
+        if not raced:
+            # Two rebuilds land between reading CURRENT and reading the version
+            raced.append(True)
+            writer.build(CHAIN[:2])
+            writer.build(CHAIN)
+        return load_json(f)
+
+    monkeypatch.setattr(adjacency.json, "load", racing_load)
+    assert "d" in reader
+
+
+def test_snapshot_from_simple_graph_store(snapshot):
+    graph_store = SimplePropertyGraphStore()
+    alice = EntityNode(name="alice", label="PERSON")
+    bob = EntityNode(name="bob", label="PERSON")
+    graph_store.upsert_nodes([alice, bob])
+    graph_store.upsert_relations([Relation(label="KNOWS", source_id=alice.id, target_id=bob.id)])
+
+    assert list(iter_graph_edges(graph_store)) == [("alice", "PERSON", None, "KNOWS", "bob", "PERSON", None)]
+    assert build_adjacency_snapshot(graph_store, snapshot) == 1
+    assert triplet_keys(snapshot.expand(["bob"], depth=1)["bob"]) == [("alice", "KNOWS", "bob")]
+
+
+def test_unsupported_graph_store():
+    with pytest.raises(ValueError):
+        list(iter_graph_edges(object()))
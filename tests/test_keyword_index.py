@@ -0,0 +1,165 @@
+import threading
+
+import pytest
+from llama_index.core.graph_stores import SimplePropertyGraphStore
+from llama_index.core.graph_stores.types import ChunkNode, EntityNode
+
+from core.keyword_index import KeywordIndex, iter_graph_chunks, rows_from_chunk_upserts
+
+ROWS = [
+    ("c1", "The XR-7 pump replaced the XR-7 valve", "a::1"),
+    ("c2", "A long note about pumps, valves, seals and the XR-7 in passing among many other words", "a::1"),
+    ("c3", "Nothing relevant here", "b::1"),
+]
+
+
+def ids(matches):
+    return [chunk_id for chunk_id, _ in matches]
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = KeywordIndex(tmp_path / "keywords.db")
+    yield index
+    index.close()
+
+
+def test_search_round_trip(index):
+    assert index.search("XR-7") == []
+    assert index.add(ROWS) == 3
+    assert len(index) == 3
+
+    matches = index.search("XR-7")
+    # More occurrences in a shorter chunk rank first
+    assert ids(matches) == ["c1", "c2"]
+    assert all(score > 0 for _, score in matches)
+    assert matches[0][1] > matches[1][1]
+
+
+def test_query_terms_are_or_matched_and_case_folded(index):
+    index.add(ROWS)
+    assert set(ids(index.search("nothing PUMP"))) == {"c1", "c3"}
+    assert ids(index.search("relevant", top_k=0)) == []
+    assert index.search("  --  ") == []
+
+
+def test_quotes_in_queries_are_escaped(index):
+    index.add(ROWS)
+    assert ids(index.search('"xr AND pump')) == ["c1", "c2"]
+
+
+def test_add_replaces_the_same_chunk_id(index):
+    index.add(ROWS)
+    index.add([("c1", "Entirely different words", "a::1")])
+    assert len(index) == 3
+    assert ids(index.search("XR-7")) == ["c2"]
+    assert ids(index.search("different")) == ["c1"]
+
+
+def test_rows_without_text_are_skipped(index):
+    assert index.add([("c1", "", "a::1"), ("c2", "some text", None)]) == 1
+    assert len(index) == 1
+
+
+def test_add_in_batches(index):
+    rows = ((f"c{i}", f"word{i} common", None) for i in range(25))
+    assert index.add(rows, batch_size=10) == 25
+    assert ids(index.search("word17")) == ["c17"]
+    assert len(index.search("common", top_k=100)) == 25
+
+
+def test_remove(index):
+    index.add(ROWS)
+    index.remove(["c1", "missing"])
+    assert len(index) == 2
+    assert ids(index.search("XR-7")) == ["c2"]
+
+
+def test_remove_documents(index):
+    index.add(ROWS)
+    index.remove_documents(["a::1"])
+    assert len(index) == 1
+    assert index.search("XR-7") == []
+    assert ids(index.search("relevant")) == ["c3"]
+
+
+def test_rebuild_replaces_contents(index):
+    index.add(ROWS)
+    assert index.rebuild([("d1", "fresh pump text", None)]) == 1
+    assert len(index) == 1
+    assert ids(index.search("pump XR-7")) == ["d1"]
+
+
+def test_search_many(index):
+    index.add(ROWS)
+    assert [ids(matches) for matches in index.search_many(["relevant", "missing"], top_k=5)] == [["c3"], []]
+
+
+def test_backfilled_marker_persists(tmp_path):
+    index = KeywordIndex(tmp_path / "keywords.db")
+    assert not index.backfilled
+    assert index.backfill(iter(ROWS)) == 3
+    assert index.backfilled
+    index.close()
+
+    reopened = KeywordIndex(tmp_path / "keywords.db")
+    assert reopened.backfilled
+    assert len(reopened) == 3
+    reopened.close()
+
+
+def test_interrupted_backfill_leaves_the_marker_unset(index):
+    def failing_rows():
+        yield from ROWS
+        raise RuntimeError("graph store went away")
+
+    with pytest.raises(RuntimeError):
+        index.backfill(failing_rows())
+    assert not index.backfilled
+    # Running it again replaces rows rather than duplicating them
+    index.backfill(ROWS)
+    assert index.backfilled and len(index) == 3
+
+
+def test_searches_run_alongside_writes(index):
+    index.add([("seed", "token seed", None)])
+    stop = threading.Event()
+    seen, errors = [], []
+
+    def read():
+        while not stop.is_set():
+            try:
+                seen.append(len(index.search("token", top_k=1000)))
+            except Exception as e:
+                errors.append(e)
+
+    reader = threading.Thread(target=read)
+    reader.start()
+    for start in range(0, 200, 20):
+        index.add([(f"c{i}", f"token {i}", None) for i in range(start, start + 20)])
+    stop.set()
+    reader.join()
+
+    assert errors == []
+    assert seen and all(1 <= count <= 201 for count in seen)
+    assert len(index.search("token", top_k=1000)) == 201
+
+
+def test_rows_from_chunk_upserts():
+    rows = [
+        {"id": "c1", "text": "hello", "properties": {"ref_doc_id": "a::1"}},
+        {"id": "c2", "text": None, "properties": None},
+    ]
+    assert rows_from_chunk_upserts(rows) == [("c1", "hello", "a::1"), ("c2", "", None)]
+
+
+def test_iter_graph_chunks_from_simple_graph_store():
+    graph_store = SimplePropertyGraphStore()
+    graph_store.upsert_nodes(
+        [
+            ChunkNode(id_="c1", text="hello", properties={"ref_doc_id": "a::1"}),
+            ChunkNode(id_="c2", text=""),
+            EntityNode(name="alice", label="PERSON"),
+        ]
+    )
+    assert list(iter_graph_chunks(graph_store)) == [("c1", "hello", "a::1")]
@@ -0,0 +1,183 @@
+import random
+
+import numpy as np
+import pytest
+from llama_index.core.graph_stores import SimplePropertyGraphStore
+from llama_index.core.graph_stores.types import ChunkNode
+from llama_index.core.schema import Document
+
+from core.incremental import IncrementalUpdater
+from core.near_duplicates import DUPLICATE_OF, DuplicateFilter, NearDuplicateIndex, link_duplicates, lsh_parameters
+
+
+def words(seed, count=200):
+    rng = random.Random(seed)
+    return [f"w{rng.randrange(5000)}" for _ in range(count)]
+
+
+def text(seed, count=200):
+    return " ".join(words(seed, count))
+
+
+def edited(seed, changes, count=200):
+    """The text of ``seed`` with ``changes`` words replaced."""
+    terms = words(seed, count)
+    for position in range(0, changes * (count // changes), count // changes):
+        terms[position] = "edited"
+    return " ".join(terms)
+
+
+def page(page_id, body, filename="a.md"):
+    return Document(id_=page_id, text=body, metadata={"filename": filename, "page_hash": str(hash(body))})
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = NearDuplicateIndex(tmp_path / "duplicates.db", threshold=0.8)
+    yield index
+    index.close()
+
+
+@pytest.mark.parametrize("threshold", [0.5, 0.8, 0.9, 0.95])
+def test_lsh_parameters_fit_the_signature(threshold):
+    bands, rows = lsh_parameters(threshold, 128)
+    assert bands * rows <= 128
+    # The band split puts the S-curve's midpoint near the threshold
+    assert abs((1 / bands) ** (1 / rows) - threshold) < 0.15
+
+
+def test_stricter_thresholds_use_longer_bands():
+    assert lsh_parameters(0.95, 128)[1] > lsh_parameters(0.5, 128)[1]
+
+
+def test_signatures_are_stable_across_instances(index, tmp_path):
+    other = NearDuplicateIndex(tmp_path / "other.db", threshold=0.8)
+    assert np.array_equal(index.signature(text(1)), other.signature(text(1)))
+    other.close()
+
+
+def test_similarity_estimates(index):
+    base = index.signature(text(1))
+    assert np.mean(base == index.signature(text(1))) == 1.0
+    assert np.mean(base == index.signature(edited(1, 2))) > 0.8
+    assert np.mean(base == index.signature(text(2))) < 0.1
+
+
+def test_query_round_trip(index):
+    assert index.query(index.signature(text(1))) is None
+    assert index.add([("a::1", "a.md", index.signature(text(1))), ("a::2", "a.md", index.signature(text(2)))]) == 2
+    assert len(index) == 2
+
+    match = index.query(index.signature(edited(1, 2)))
+    assert match[0] == "a::1" and match[1] >= 0.8
+    assert index.query(index.signature(text(3))) is None
+    assert index.query(index.signature(text(1)), exclude=["a::1"]) is None
+
+
+def test_add_replaces_and_remove_drops(index):
+    index.add([("a::1", "a.md", index.signature(text(1)))])
+    index.add([("a::1", "a.md", index.signature(text(2)))])
+    assert len(index) == 1
+    assert index.query(index.signature(text(1))) is None
+    assert index.query(index.signature(text(2)))[0] == "a::1"
+
+    index.remove_documents(["a::1", "missing"])
+    assert len(index) == 0
+    assert index.query(index.signature(text(2))) is None
+
+
+def test_threshold_change_rebuckets_signatures(tmp_path):
+    index = NearDuplicateIndex(tmp_path / "duplicates.db", threshold=0.8)
+    index.add([("a::1", "a.md", index.signature(text(1)))])
+    index.close()
+
+    stricter = NearDuplicateIndex(tmp_path / "duplicates.db", threshold=0.95)
+    assert len(stricter) == 1
+    assert stricter.query(stricter.signature(text(1)))[0] == "a::1"
+    stricter.close()
+
+
+def test_signature_settings_change_clears_the_index(tmp_path):
+    index = NearDuplicateIndex(tmp_path / "duplicates.db", num_perm=128)
+    index.add([("a::1", "a.md", index.signature(text(1)))])
+    index.close()
+
+    resized = NearDuplicateIndex(tmp_path / "duplicates.db", num_perm=64)
+    assert len(resized) == 0
+    resized.close()
+
+
+def test_filter_against_the_index_and_the_batch(index):
+    index.add([("old::1", "old.md", index.signature(text(1)))])
+    duplicate_filter = DuplicateFilter(index, min_words=20)
+    pages = [page("a::1", edited(1, 2)), page("a::2", text(2)), page("a::3", edited(2, 2)), page("a::4", "too short")]
+
+    unique, duplicates = duplicate_filter.filter(pages)
+    assert [p.id_ for p in unique] == ["a::2", "a::4"]
+    assert [(p.id_, canonical) for p, canonical, _ in duplicates] == [("a::1", "old::1"), ("a::3", "a::2")]
+
+    # Canonical pages are only indexed once committed
+    assert index.query(index.signature(text(2))) is None
+    assert duplicate_filter.commit() == 1
+    assert index.query(index.signature(text(2)))[0] == "a::2"
+
+
+def test_filter_does_not_match_a_page_against_its_own_signature(index):
+    index.add([("a::1", "a.md", index.signature(text(1)))])
+    unique, duplicates = DuplicateFilter(index, min_words=20).filter([page("a::1", text(1))])
+    assert [p.id_ for p in unique] == ["a::1"] and duplicates == []
+
+
+def canonical_graph(index):
+    """A graph holding canonical page a::1 and its near-duplicate b::1 from another file."""
+    graph_store = SimplePropertyGraphStore()
+    properties = {"ref_doc_id": "a::1", "filename": "a.md", "page_hash": "h1"}
+    graph_store.upsert_nodes([ChunkNode(id_="a::1-chunk", text=text(1), properties=properties)])
+    index.add([("a::1", "a.md", index.signature(text(1)))])
+    metadata = {"filename": "b.md", "page_number": 1, "page_hash": "hb"}
+    duplicate = Document(id_="b::1", text=edited(1, 2), metadata=metadata)
+    link_duplicates(graph_store, [(duplicate, "a::1", 0.9)])
+    return graph_store
+
+
+def test_link_duplicates_stores_the_page_without_extracting_it(index):
+    graph_store = canonical_graph(index)
+    [node] = graph_store.get(ids=["b::1::duplicate"])
+    assert node.text == edited(1, 2)
+    assert node.properties["duplicate_of"] == "a::1"
+    assert node.properties["filename"] == "b.md"
+    [(_, relation, target)] = graph_store.get_triplets(relation_names=[DUPLICATE_OF])
+    assert target.id == "a::1-chunk"
+
+
+def test_changing_a_canonical_page_promotes_duplicates_in_other_files(index):
+    graph_store = canonical_graph(index)
+    updater = IncrementalUpdater(graph_store, duplicate_index=index)
+
+    to_ingest, stale = updater.plan([page("a::1", text(9))])
+    assert [p.id_ for p in to_ingest] == ["a::1", "b::1"]
+    assert sorted(stale) == ["a::1", "b::1"]
+    promoted = to_ingest[1]
+    assert promoted.text == edited(1, 2)
+    assert promoted.metadata == {"filename": "b.md", "page_number": 1, "page_hash": "hb"}
+
+    updater.delete_pages(stale)
+    assert len(index) == 0
+    duplicate_filter = DuplicateFilter(index, min_words=20)
+    unique, duplicates = duplicate_filter.filter(to_ingest)
+    assert [p.id_ for p in unique] == ["a::1", "b::1"] and duplicates == []
+    duplicate_filter.commit()
+    assert index.query(index.signature(edited(1, 2)))[0] == "b::1"
+
+
+def test_removing_a_canonical_page_promotes_its_duplicates(index):
+    graph_store = canonical_graph(index)
+    to_ingest, stale = IncrementalUpdater(graph_store).plan([page("a::2", text(5))])
+    assert [p.id_ for p in to_ingest] == ["a::2", "b::1"]
+    assert sorted(stale) == ["a::1", "b::1"]
+
+
+def test_unchanged_canonical_page_leaves_duplicates_alone(index):
+    graph_store = canonical_graph(index)
+    unchanged = Document(id_="a::1", text=text(1), metadata={"filename": "a.md", "page_hash": "h1"})
+    assert IncrementalUpdater(graph_store).plan([unchanged]) == ([], [])
@@ -0,0 +1,176 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import core.rate_limit as rate_limit
+from config.settings import ComponentsConfig
+from core.rate_limit import RateLimiter, estimate_tokens, get_rate_limiter
+
+
+class FakeClock:
+    """Stands in for the ``time`` module; sleeping advances the clock instead of blocking."""
+
+    def __init__(self, now=1000.0):
+        self.now = now
+        self.slept = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limit, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def clean_limiters(monkeypatch):
+    monkeypatch.setattr(rate_limit, "_limiters", {})
+
+
+def delays(limiter, calls, tokens=0):
+    return [limiter.reserve(tokens) for _ in range(calls)]
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 1
+    assert estimate_tokens("x" * 400) == 101
+
+
+def test_unlimited_limiter_never_waits(clock):
+    assert delays(RateLimiter("test"), 100, tokens=10_000) == [0.0] * 100
+
+
+def test_requests_are_spread_at_the_configured_rate(clock):
+    limiter = RateLimiter("test", requests_per_minute=60, burst_seconds=1.0)
+    # One second of burst lets a second call through at once, then calls are a second apart
+    assert delays(limiter, 5) == pytest.approx([0.0, 0.0, 1.0, 2.0, 3.0])
+
+
+def test_burst_refills_while_idle(clock):
+    limiter = RateLimiter("test", requests_per_minute=120, burst_seconds=2.0)
+    assert delays(limiter, 6) == pytest.approx([0.0, 0.0, 0.0, 0.0, 0.0, 0.5])
+    clock.now += 10
+    assert delays(limiter, 5) == pytest.approx([0.0, 0.0, 0.0, 0.0, 0.0])
+
+
+def test_token_limit(clock):
+    limiter = RateLimiter("test", tokens_per_minute=600, burst_seconds=1.0)
+    assert delays(limiter, 3, tokens=20) == pytest.approx([0.0, 1.0, 3.0])
+    # Calls without a token cost are not held back by the token limit
+    assert limiter.reserve(0) == 0.0
+
+
+def test_oversized_call_delays_the_calls_after_it(clock):
+    limiter = RateLimiter("test", tokens_per_minute=600, burst_seconds=1.0)
+    assert limiter.reserve(100) == 0.0
+    assert limiter.reserve(1) == pytest.approx(9.0)
+
+
+def test_the_stricter_limit_wins(clock):
+    limiter = RateLimiter("test", requests_per_minute=600, tokens_per_minute=600, burst_seconds=1.0)
+    assert delays(limiter, 3, tokens=10) == pytest.approx([0.0, 0.0, 1.0])
+
+
+def test_pause_holds_every_caller_back(clock):
+    limiter = RateLimiter("test", requests_per_minute=60, tokens_per_minute=600, burst_seconds=1.0)
+    limiter.pause(5)
+    assert limiter.reserve(0) == pytest.approx(5.0)
+    assert limiter.reserve(10) == pytest.approx(6.0)
+
+
+def test_acquire_sleeps_until_the_reserved_slot(clock):
+    limiter = RateLimiter("test", requests_per_minute=60, burst_seconds=0.0)
+    for _ in range(3):
+        limiter.acquire_sync()
+    assert clock.slept == pytest.approx([1.0, 1.0])
+    assert clock.now == pytest.approx(1002.0)
+
+
+def test_async_acquire(clock, monkeypatch):
+    slept = []
+
+    async def sleep(seconds):
+        slept.append(seconds)
+
+    monkeypatch.setattr(rate_limit, "asyncio", SimpleNamespace(sleep=sleep))
+    limiter = RateLimiter("test", requests_per_minute=60, burst_seconds=0.0)
+
+    async def calls():
+        for _ in range(3):
+            await limiter.acquire()
+
+    asyncio.run(calls())
+    assert slept == pytest.approx([1.0, 2.0])
+
+
+def test_concurrent_callers_get_distinct_slots(clock):
+    limiter = RateLimiter("test", requests_per_minute=60, burst_seconds=0.0)
+    reserved = []
+    threads = [threading.Thread(target=lambda: reserved.extend(delays(limiter, 25))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(reserved) == pytest.approx([float(i) for i in range(100)])
+
+
+def test_limiters_sharing_a_state_file_share_one_budget(clock, tmp_path):
+    state_path = tmp_path / "rate_limits" / "llm.state"
+    first = RateLimiter("test", requests_per_minute=60, burst_seconds=0.0, state_path=state_path)
+    second = RateLimiter("test", requests_per_minute=60, burst_seconds=0.0, state_path=state_path)
+    assert [first.reserve(), second.reserve(), first.reserve(), second.reserve()] == pytest.approx([0, 1, 2, 3])
+
+    first.close()
+    second.close()
+    reopened = RateLimiter("test", requests_per_minute=60, burst_seconds=0.0, state_path=state_path)
+    assert reopened.reserve() == pytest.approx(4.0)
+    reopened.close()
+
+
+def test_get_rate_limiter_without_limits(tmp_path, clean_limiters):
+    assert get_rate_limiter("llm", ComponentsConfig(_env_file=None, storage_dir=tmp_path)) is None
+
+
+def test_get_rate_limiter_is_cached_per_kind_and_storage(tmp_path, clean_limiters):
+    config = ComponentsConfig(
+        _env_file=None,
+        storage_dir=tmp_path / "a",
+        llm_requests_per_minute=60,
+        embed_tokens_per_minute=1000,
+        rate_limit_burst_seconds=3.0,
+    )
+    llm = get_rate_limiter("llm", config)
+    assert llm.requests_per_second == 1.0 and llm.tokens_per_second == 0
+    assert llm.burst_seconds == 3.0 and llm.state_path is None
+    assert get_rate_limiter("llm", config) is llm
+
+    embedding = get_rate_limiter("embedding", config)
+    assert embedding is not llm and embedding.tokens_per_second == pytest.approx(1000 / 60)
+
+    elsewhere = ComponentsConfig(_env_file=None, storage_dir=tmp_path / "b", llm_requests_per_minute=60)
+    assert get_rate_limiter("llm", elsewhere) is not llm
+
+
+def test_shared_rate_limiter_state_lives_under_storage(tmp_path, clean_limiters):
+    config = ComponentsConfig(
+        _env_file=None, storage_dir=tmp_path, llm_requests_per_minute=60, rate_limit_shared=True
+    )
+    limiter = get_rate_limiter("llm", config)
+    assert limiter.state_path == tmp_path / "rate_limits" / "llm.state"
+    limiter.reserve()
+    assert limiter.state_path.stat().st_size == rate_limit._STATE.size
+    limiter.close()
+
+
+def test_unknown_rate_limiter_kind(tmp_path):
+    with pytest.raises(ValueError):
+        get_rate_limiter("vision", ComponentsConfig(_env_file=None, storage_dir=tmp_path))
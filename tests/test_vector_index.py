@@ -0,0 +1,182 @@
+import threading
+
+import numpy as np
+import pytest
+
+import core.vector_index as vector_index
+from core.vector_index import CHUNK, ENTITY, LocalVectorIndex
+
+
+def vector(seed, dimensions=8):
+    return np.random.default_rng(seed).standard_normal(dimensions).tolist()
+
+
+def rows(count, kind=ENTITY, prefix="n"):
+    return [(f"{prefix}{i}", kind, vector(i)) for i in range(count)]
+
+
+@pytest.fixture
+def index(tmp_path):
+    return LocalVectorIndex(tmp_path / "vectors", reload_interval=0)
+
+
+def test_search_round_trip(index):
+    assert not index.exists()
+    assert index.search(vector(0), 3) == []
+
+    assert index.rebuild(rows(20)) == 20
+    assert index.exists()
+    assert index.size == 20
+    matches = index.search(vector(7), 3)
+    assert matches[0][0] == "n7"
+    assert matches[0][1] == pytest.approx(1.0, abs=1e-5)
+    assert [score for _, score in matches] == sorted((score for _, score in matches), reverse=True)
+
+
+def test_search_filters_by_kind(index):
+    index.rebuild(rows(5) + rows(5, kind=CHUNK, prefix="c"))
+    assert {node_id for node_id, _ in index.search(vector(1), 10)} == {f"n{i}" for i in range(5)}
+    assert {node_id for node_id, _ in index.search(vector(1), 10, kind=CHUNK)} == {f"c{i}" for i in range(5)}
+    assert len(index.search(vector(1), 10, kind=None)) == 10
+
+
+def test_search_many_matches_search(index):
+    index.rebuild(rows(30))
+    queries = [vector(3), vector(11), vector(29)]
+    for batched, single in zip(index.search_many(queries, 4), (index.search(query, 4) for query in queries)):
+        assert [node_id for node_id, _ in batched] == [node_id for node_id, _ in single]
+        assert [score for _, score in batched] == pytest.approx([score for _, score in single], abs=1e-5)
+
+
+@pytest.mark.parametrize("count", [3, 1000])
+def test_rebuild_with_wrong_count_hint(index, count):
+    assert index.rebuild(rows(10), count=count) == 10
+    assert index.size == 10
+    assert index.search(vector(9), 1)[0][0] == "n9"
+
+
+def test_rebuild_spills_into_further_segments(index, monkeypatch):
+    monkeypatch.setattr(vector_index, "REBUILD_SEGMENT_ROWS", 4)
+    index.rebuild(rows(10), count=3)
+    assert len(index._load(force=True).segments) == 3
+    assert {node_id for node_id, _ in index.search(vector(0), 10)} == {f"n{i}" for i in range(10)}
+
+
+def test_float16_index(tmp_path):
+    index = LocalVectorIndex(tmp_path / "vectors", dtype="float16", reload_interval=0)
+    index.rebuild(rows(10))
+    assert index.search(vector(4), 1)[0][0] == "n4"
+
+
+def test_unsupported_dtype(tmp_path):
+    with pytest.raises(ValueError):
+        LocalVectorIndex(tmp_path / "vectors", dtype="int8")
+
+
+def test_update_appends_segment_and_tombstones_replaced_rows(index):
+    index.rebuild(rows(10))
+    assert index.update([("n3", ENTITY, vector(100)), ("new", ENTITY, vector(101))]) == 11
+
+    current = index._load(force=True)
+    assert len(current.segments) == 2
+    assert current.manifest[0]["dead"] == [3]
+    assert index.search(vector(100), 1)[0][0] == "n3"
+    assert index.search(vector(101), 1)[0][0] == "new"
+    # The old embedding of n3 no longer matches anything exactly
+    assert index.search(vector(3), 1)[0][1] < 0.99
+
+
+def test_update_removes_ids(index):
+    index.rebuild(rows(5))
+    assert index.update(removals=["n0", "n4", "missing"]) == 3
+    assert {node_id for node_id, _ in index.search(vector(0), 10)} == {"n1", "n2", "n3"}
+
+
+def test_update_upsert_wins_over_removal(index):
+    index.rebuild(rows(3))
+    index.update([("n1", ENTITY, vector(50))], removals=["n1"])
+    assert index.search(vector(50), 1)[0][0] == "n1"
+
+
+def test_fully_dead_segments_are_dropped(index):
+    index.rebuild(rows(2))
+    index.update([("a", ENTITY, vector(10))])
+    index.update(removals=["a"])
+    current = index._load(force=True)
+    assert len(current.segments) == 1
+    assert index.size == 2
+
+
+def test_readers_pick_up_new_versions(tmp_path):
+    writer = LocalVectorIndex(tmp_path / "vectors")
+    reader = LocalVectorIndex(tmp_path / "vectors", reload_interval=0)
+    writer.rebuild(rows(3))
+    first = reader.version
+    writer.update([("late", ENTITY, vector(42))])
+    assert reader.version != first
+    assert reader.search(vector(42), 1)[0][0] == "late"
+
+
+def test_concurrent_writers_keep_each_others_rows(tmp_path):
+    LocalVectorIndex(tmp_path / "vectors").rebuild(rows(1))
+    writers = [LocalVectorIndex(tmp_path / "vectors") for _ in range(2)]
+
+    def write(writer, prefix):
+        for i in range(10):
+            writer.update([(f"{prefix}{i}", ENTITY, vector(1000 + i))])
+
+    threads = [threading.Thread(target=write, args=(writer, prefix)) for writer, prefix in zip(writers, "ab")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert LocalVectorIndex(tmp_path / "vectors").size == 21
+
+
+def test_old_versions_are_kept_for_the_grace_period(index, monkeypatch):
+    index.rebuild(rows(2))
+    for i in range(4):
+        index.update([(f"u{i}", ENTITY, vector(200 + i))])
+    assert len(list(index.directory.glob("v*"))) == 5
+
+    monkeypatch.setattr(vector_index, "VERSION_GRACE_SECONDS", -1)
+    index.update([("last", ENTITY, vector(300))])
+    # Only the current and previous versions survive once the grace period is over
+    assert len(list(index.directory.glob("v*"))) == 2
+    assert index.size == 7
+
+
+def test_reader_retries_when_its_version_is_removed(tmp_path, monkeypatch):
+    monkeypatch.setattr(vector_index, "VERSION_GRACE_SECONDS", -1)
+    writer = LocalVectorIndex(tmp_path / "vectors")
+    reader = LocalVectorIndex(tmp_path / "vectors", reload_interval=0)
+    writer.rebuild(rows(2))
+    read_manifest = reader._read_manifest
+    raced = []
+
+    def racing_read_manifest(version):
+        if not raced:
+            # Two writes land between reading CURRENT and reading the manifest
+            raced.append(version)
+            writer.update([("x", ENTITY, vector(70))])
+            writer.update([("y", ENTITY, vector(71))])
+        return read_manifest(version)
+
+    monkeypatch.setattr(reader, "_read_manifest", racing_read_manifest)
+    assert reader.search(vector(71), 1)[0][0] == "y"
+    assert not (tmp_path / "vectors" / raced[0]).exists()
+    assert reader.size == 4
+
+
+def test_reads_versions_written_before_segments(index):
+    legacy = index.directory / "v0-legacy"
+    legacy.mkdir(parents=True)
+    (legacy / "ids.json").write_text('["old"]')
+    np.save(legacy / "kinds.npy", np.zeros(1, dtype=np.uint8))
+    embedding = np.asarray([vector(5)], dtype=np.float32)
+    np.save(legacy / "vectors.npy", embedding / np.linalg.norm(embedding))
+    (index.directory / "CURRENT").write_text("v0-legacy")
+
+    assert index.search(vector(5), 1)[0][0] == "old"
+    index.update([("new", ENTITY, vector(6))])
+    assert {node_id for node_id, _ in index.search(vector(5), 5)} == {"old", "new"}